@@ -0,0 +1,5 @@
+"""Code shared by the gcpworkshop and googlehackaton projects.
+
+Both projects depend on this package as an editable path dependency, so
+there is one copy of each module to change.
+"""
@@ -0,0 +1,152 @@
+"""Model cascades: try the cheapest model first and escalate only when needed.
+
+A cascade runs a task on its cheapest model tier and judges the answer in
+one of two ways:
+
+- Structured tasks return a self-reported confidence. The answer is kept if
+  the confidence reaches the threshold.
+- Free-text tasks are checked by the caller, for example for empty,
+  truncated or incomplete output. An answer that fails a check is rejected
+  with the reason.
+
+A rejected or low-confidence answer is retried on the next, larger tier.
+The last tier's answer is always returned, so callers must handle a
+missing (None) result from it.
+
+Inputs larger than ``CASCADE_MAX_CHEAP_TOKENS`` skip straight to the last
+tier, since cheap models are least reliable on long contexts and the failed
+attempt would cost the most there.
+
+Each cascade counts its calls, escalations and escalation reasons, so the
+escalation rate can be watched and the threshold tuned.
+"""
+import os
+import threading
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+CASCADE_THRESHOLD = float(os.environ.get("CASCADE_THRESHOLD", 0.7))
+CASCADE_MAX_CHEAP_TOKENS = int(os.environ.get("CASCADE_MAX_CHEAP_TOKENS", 8000))
+
+# Model tiers per task, cheapest first
+CASCADES: Dict[str, List[str]] = {
+    "relevance": ["gemini-2.0-flash-lite-001", "gemini-2.5-flash-preview-05-20"],
+    "report": ["gemini-2.5-flash-preview-05-20", "gemini-2.5-pro-preview-05-06"],
+    "extraction": ["gemini-2.5-flash-preview-05-20", "gemini-2.5-pro-preview-05-06"],
+}
+
+
+class CascadeResult(NamedTuple):
+    result: Any
+    model_name: str
+    confidence: float
+    escalations: int
+    # Why the returned answer failed its check, if it did
+    rejected: Optional[str] = None
+
+
+def _verdict(outcome: Tuple) -> Tuple[Any, Optional[float], Optional[str]]:
+    result, confidence, *rejected = outcome
+    return result, confidence, rejected[0] if rejected else None
+
+
+class ModelCascade:
+    """Runs one task through increasingly capable model tiers.
+
+    Args:
+        task: Task name, used for stats.
+        tiers: Model names, cheapest first.
+        threshold: Minimum confidence to accept an answer before the last tier.
+        max_cheap_tokens: Inputs above this many tokens go straight to the last tier.
+    """
+
+    def __init__(self, task: str, tiers: List[str], threshold: float = CASCADE_THRESHOLD,
+                 max_cheap_tokens: int = CASCADE_MAX_CHEAP_TOKENS):
+        self.task = task
+        self.tiers = tiers
+        self.threshold = threshold
+        self.max_cheap_tokens = max_cheap_tokens
+        self.calls = 0
+        self.escalations = 0
+        self.reasons: Counter = Counter()
+        self.answered_by: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def _start(self, input_tokens: int) -> int:
+        with self._lock:
+            self.calls += 1
+            if input_tokens > self.max_cheap_tokens and len(self.tiers) > 1:
+                self.escalations += 1
+                self.reasons["large_input"] += 1
+                return len(self.tiers) - 1
+        return 0
+
+    def _accept(self, tier: int, confidence: Optional[float], rejected: Optional[str]) -> bool:
+        if tier == len(self.tiers) - 1:
+            return True
+        if rejected is None and confidence is not None and confidence >= self.threshold:
+            return True
+        with self._lock:
+            self.escalations += 1
+            self.reasons[rejected or ("no_answer" if confidence is None else "low_confidence")] += 1
+        return False
+
+    def _done(self, tier: int, first: int, result: Any, confidence: Optional[float],
+              rejected: Optional[str]) -> CascadeResult:
+        model_name = self.tiers[tier]
+        with self._lock:
+            self.answered_by[model_name] += 1
+        return CascadeResult(result, model_name, confidence if confidence is not None else 0.0, tier - first, rejected)
+
+    def run(self, attempt: Callable[[str], Tuple], input_tokens: int = 0) -> CascadeResult:
+        """Run ``attempt(model_name)`` tier by tier until an answer is accepted.
+
+        Args:
+            attempt: Runs the task on one model and returns (result, confidence)
+                or (result, confidence, rejected). A confidence of None means
+                no usable answer. ``rejected`` names the failed check of a
+                checked answer; answers that pass their checks use confidence 1.0.
+            input_tokens: Approximate input size, used to skip cheap tiers.
+        """
+        first = self._start(input_tokens)
+        for tier in range(first, len(self.tiers)):
+            result, confidence, rejected = _verdict(attempt(self.tiers[tier]))
+            if self._accept(tier, confidence, rejected):
+                return self._done(tier, first, result, confidence, rejected)
+
+    async def arun(self, attempt: Callable[[str], Awaitable[Tuple]], input_tokens: int = 0) -> CascadeResult:
+        """Async version of ``run`` for coroutine attempts."""
+        first = self._start(input_tokens)
+        for tier in range(first, len(self.tiers)):
+            result, confidence, rejected = _verdict(await attempt(self.tiers[tier]))
+            if self._accept(tier, confidence, rejected):
+                return self._done(tier, first, result, confidence, rejected)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "escalations": self.escalations,
+                "escalation_rate": self.escalations / self.calls if self.calls else 0.0,
+                "reasons": dict(self.reasons),
+                "answered_by": dict(self.answered_by),
+            }
+
+
+_CASCADES: Dict[str, ModelCascade] = {}
+_CASCADES_LOCK = threading.Lock()
+
+
+def cascade(task: str) -> ModelCascade:
+    """Return the process-wide cascade for a task in CASCADES."""
+    with _CASCADES_LOCK:
+        if task not in _CASCADES:
+            _CASCADES[task] = ModelCascade(task, CASCADES[task])
+        return _CASCADES[task]
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    """Escalation stats of every cascade in use."""
+    with _CASCADES_LOCK:
+        cascades = list(_CASCADES.values())
+    return {c.task: c.stats() for c in cascades}
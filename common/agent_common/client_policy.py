@@ -0,0 +1,299 @@
+"""Shared rate limiting, adaptive concurrency and retry policy for outbound APIs.
+
+Every external call goes through the ``ClientPolicy`` of its provider:
+
+- A token bucket caps the request rate.
+- An AIMD limiter caps concurrency. The limit grows by about one per round
+  of successful calls and halves on 429s or overload errors. It also backs
+  off gently when latency exceeds the provider's target.
+- Failed calls are retried with full-jitter exponential backoff. A global
+  retry budget allows only a fraction of calls to be retried, so an outage
+  does not turn into a retry storm.
+
+Used by both gcpworkshop and googlehackaton.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+# HTTP statuses worth retrying, and those meaning the provider is overloaded
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+OVERLOAD_STATUSES = frozenset({429, 503})
+
+# Exception class names (requests, google-api-core, builtins) treated the same
+# way, matched by name so neither library has to be imported here
+RETRY_EXCEPTIONS = frozenset({
+    "ConnectionError", "Timeout", "ConnectTimeout", "ReadTimeout", "TimeoutError",
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "DeadlineExceeded",
+    "InternalServerError", "BadGateway",
+})
+OVERLOAD_EXCEPTIONS = frozenset({"ResourceExhausted", "TooManyRequests", "ServiceUnavailable"})
+
+# Per-provider defaults: requests per second, burst, initial and maximum
+# concurrency, and the latency (seconds) above which concurrency backs off
+PROVIDERS: Dict[str, Dict[str, Any]] = {
+    "vertex": {"rate": 10.0, "burst": 10, "concurrency": 8, "max_concurrency": 32, "latency_target": 30.0},
+    "imagen": {"rate": 1.0, "burst": 2, "concurrency": 2, "max_concurrency": 4, "latency_target": 60.0},
+    "tavily": {"rate": 2.0, "burst": 5, "concurrency": 4, "max_concurrency": 8, "latency_target": 10.0},
+    "google_search": {"rate": 1.0, "burst": 5, "concurrency": 4, "max_concurrency": 8, "latency_target": 10.0},
+    "entur": {"rate": 20.0, "burst": 20, "concurrency": 8, "max_concurrency": 32, "latency_target": 5.0},
+    "supabase": {"rate": 10.0, "burst": 10, "concurrency": 8, "max_concurrency": 16, "latency_target": 10.0},
+}
+DEFAULT_PROVIDER = {"rate": 5.0, "burst": 5, "concurrency": 4, "max_concurrency": 16, "latency_target": None}
+
+MAX_ATTEMPTS = int(os.environ.get("CLIENT_MAX_ATTEMPTS", 4))
+BACKOFF_BASE_SECONDS = float(os.environ.get("CLIENT_BACKOFF_BASE", 0.5))
+BACKOFF_CAP_SECONDS = float(os.environ.get("CLIENT_BACKOFF_CAP", 20))
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at ``rate`` tokens per second."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take ``tokens`` if available.
+
+        Returns:
+            0.0 on success, otherwise the seconds to wait before trying again.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+
+class AIMDLimiter:
+    """Concurrency limit with additive increase and multiplicative decrease."""
+
+    def __init__(self, initial: int, maximum: int, minimum: int = 1, latency_target: Optional[float] = None):
+        self.limit = float(initial)
+        self.maximum = maximum
+        self.minimum = minimum
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.in_flight < max(self.minimum, int(self.limit)):
+                self.in_flight += 1
+                return True
+            return False
+
+    def cancel(self):
+        """Give back a slot that was not used for a call, leaving the limit unchanged."""
+        with self._lock:
+            self.in_flight -= 1
+
+    def release(self, latency: float, overloaded: bool = False):
+        with self._lock:
+            self.in_flight -= 1
+            if overloaded:
+                self.limit = max(self.minimum, self.limit / 2)
+            elif self.latency_target is not None and latency > self.latency_target:
+                self.limit = max(self.minimum, self.limit * 0.9)
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+
+class RetryBudget:
+    """Allows retries for at most ``ratio`` of calls, plus a small steady reserve.
+
+    Every call deposits ``ratio`` tokens and every retry withdraws one. The
+    reserve refills at ``min_per_second`` so a quiet process can still retry.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 1.0, cap: float = 50.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.cap = cap
+        self._balance = cap / 5
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._balance = min(self.cap, self._balance + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def deposit(self):
+        with self._lock:
+            self._refill()
+            self._balance = min(self.cap, self._balance + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        with self._lock:
+            self._refill()
+            if self._balance >= 1.0:
+                self._balance -= 1.0
+                return True
+            return False
+
+
+# One retry budget shared by every provider in the process
+RETRY_BUDGET = RetryBudget(
+    ratio=float(os.environ.get("CLIENT_RETRY_RATIO", 0.2)),
+    min_per_second=float(os.environ.get("CLIENT_RETRY_MIN_PER_SECOND", 1.0)),
+)
+
+
+def classify(result: Any = None, error: Optional[BaseException] = None):
+    """Return (retryable, overloaded) for a call outcome."""
+    if error is not None:
+        name = type(error).__name__
+        code = getattr(error, "code", None) or getattr(error, "status_code", None)
+        code = code if isinstance(code, int) else None
+        retryable = name in RETRY_EXCEPTIONS or code in RETRY_STATUSES
+        return retryable, name in OVERLOAD_EXCEPTIONS or code in OVERLOAD_STATUSES
+    status = getattr(result, "status_code", None)
+    if isinstance(status, int):
+        return status in RETRY_STATUSES, status in OVERLOAD_STATUSES
+    return False, False
+
+
+class ClientPolicy:
+    """Rate limit, concurrency limit and retry policy for one provider.
+
+    Args:
+        name: Provider name, used for stats.
+        rate, burst: Token bucket settings.
+        concurrency, max_concurrency: Initial and maximum AIMD limit.
+        latency_target: Seconds above which a call counts as a congestion signal.
+        max_attempts: Attempts per call, including the first.
+        retry_budget: Budget shared with the other providers.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float, concurrency: int, max_concurrency: int,
+                 latency_target: Optional[float] = None, max_attempts: int = MAX_ATTEMPTS,
+                 retry_budget: RetryBudget = RETRY_BUDGET):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.limiter = AIMDLimiter(concurrency, max_concurrency, latency_target=latency_target)
+        self.max_attempts = max_attempts
+        self.retry_budget = retry_budget
+        self.stats = {"calls": 0, "retries": 0, "overloaded": 0, "budget_exhausted": 0, "failures": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _admission_wait(self) -> Optional[float]:
+        """Seconds to wait before trying again, or None once admitted.
+
+        The concurrency slot is taken before the rate token, so a caller
+        queued behind a full limiter does not use up the rate budget without
+        making a request.
+        """
+        if not self.limiter.try_acquire():
+            return 0.01
+        wait = self.bucket.try_acquire()
+        if wait > 0:
+            self.limiter.cancel()
+            return wait
+        return None
+
+    def _should_retry(self, attempt: int, retryable: bool) -> bool:
+        if not retryable or attempt + 1 >= self.max_attempts:
+            return False
+        if not self.retry_budget.try_withdraw():
+            self._count("budget_exhausted")
+            return False
+        self._count("retries")
+        return True
+
+    @staticmethod
+    def backoff(attempt: int) -> float:
+        """Full-jitter exponential backoff for the given attempt."""
+        return random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+    def _finish(self, start: float, result: Any = None, error: Optional[BaseException] = None):
+        retryable, overloaded = classify(result, error)
+        self.limiter.release(time.monotonic() - start, overloaded)
+        if overloaded:
+            self._count("overloaded")
+        return retryable
+
+    def call(self, func: Callable, *args, **kwargs):
+        """Call ``func`` under the policy, retrying retryable failures.
+
+        A response with a retryable status code is returned as is once the
+        attempts or the retry budget run out, so callers keep their own
+        status handling. A retryable exception is raised at that point.
+        """
+        self._count("calls")
+        self.retry_budget.deposit()
+        for attempt in range(self.max_attempts):
+            while (wait := self._admission_wait()) is not None:
+                time.sleep(wait)
+            start = time.monotonic()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if not self._should_retry(attempt, self._finish(start, error=e)):
+                    self._count("failures")
+                    raise
+            else:
+                if not self._should_retry(attempt, self._finish(start, result=result)):
+                    return result
+            time.sleep(self.backoff(attempt))
+
+    async def acall(self, func: Callable, *args, **kwargs):
+        """Async version of ``call`` for coroutine functions."""
+        self._count("calls")
+        self.retry_budget.deposit()
+        for attempt in range(self.max_attempts):
+            while (wait := self._admission_wait()) is not None:
+                await asyncio.sleep(wait)
+            start = time.monotonic()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                if not self._should_retry(attempt, self._finish(start, error=e)):
+                    self._count("failures")
+                    raise
+            else:
+                if not self._should_retry(attempt, self._finish(start, result=result)):
+                    return result
+            await asyncio.sleep(self.backoff(attempt))
+
+
+_POLICIES: Dict[str, ClientPolicy] = {}
+_POLICIES_LOCK = threading.Lock()
+
+
+def policy(name: str) -> ClientPolicy:
+    """Return the process-wide policy for a provider.
+
+    Settings come from PROVIDERS and can be overridden with environment
+    variables such as ``VERTEX_RATE``, ``VERTEX_BURST`` and ``VERTEX_CONCURRENCY``.
+    """
+    with _POLICIES_LOCK:
+        if name not in _POLICIES:
+            settings = dict(PROVIDERS.get(name, DEFAULT_PROVIDER))
+            prefix = name.upper()
+            settings["rate"] = float(os.environ.get(f"{prefix}_RATE", settings["rate"]))
+            settings["burst"] = float(os.environ.get(f"{prefix}_BURST", settings["burst"]))
+            settings["concurrency"] = int(os.environ.get(f"{prefix}_CONCURRENCY", settings["concurrency"]))
+            _POLICIES[name] = ClientPolicy(name, **settings)
+        return _POLICIES[name]
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    """Counters and current concurrency limit of every policy in use."""
+    with _POLICIES_LOCK:
+        return {name: dict(p.stats, concurrency_limit=round(p.limiter.limit, 2), in_flight=p.limiter.in_flight)
+                for name, p in _POLICIES.items()}
@@ -0,0 +1,49 @@
+"""Cold start import budgets.
+
+A web app pays for everything its entry module imports before it can serve
+the first page. ``import_budget`` imports a module in a fresh interpreter and
+reports how long that took, and which of the modules that should only load
+on first use got loaded anyway. The gcpworkshop benchmark (``benchmark.py
+imports``) and googlehackaton's import_budget.py check their apps with it.
+"""
+import json
+import subprocess
+import sys
+from typing import Any, Dict, Iterable
+
+
+def import_budget(module: str, budget: float, lazy_modules: Iterable[str], cwd: str) -> Dict[str, Any]:
+    """Import ``module`` in a fresh interpreter and check its cold start cost.
+
+    Args:
+        module: Module to import
+        budget: Maximum import time in seconds
+        lazy_modules: Modules that must not be loaded by the import
+        cwd: Directory the interpreter runs in, usually the module's project
+
+    Returns:
+        dict: Import time, the lazy modules that were loaded eagerly, and
+            whether the import stayed within ``budget`` without loading any.
+    """
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "print(json.dumps({'seconds': time.perf_counter() - start, 'modules': sorted(sys.modules)}))\n"
+    )
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=cwd)
+    measured = json.loads(output.stdout.strip().splitlines()[-1])
+    eager = [name for name in lazy_modules if name in measured["modules"]]
+    return {
+        "module": module,
+        "seconds": measured["seconds"],
+        "budget": budget,
+        "eager_modules": eager,
+        "ok": measured["seconds"] <= budget and not eager,
+    }
+
+
+def print_result(result: Dict[str, Any]):
+    print(f"import {result['module']}: {result['seconds']:.2f}s (budget {result['budget']:.2f}s)")
+    if result["eager_modules"]:
+        print(f"Loaded at import time but should be lazy: {', '.join(result['eager_modules'])}")
@@ -0,0 +1,141 @@
+"""Local SQLite store of fetched and analyzed news articles.
+
+The background ingester (see ingest.py) writes every article it fetches,
+along with its analysis for each watchlist query:
+
+- relevance
+- sentiment
+- the map-reduce digest
+
+``web_search_report`` reads the analyses back, so articles that were
+already analyzed for a query are not fetched or sent to the LLM again.
+Article text is indexed with SQLite FTS5 for full-text search.
+"""
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Tavily time ranges as maximum article ages in seconds
+TIME_RANGE_SECONDS = {
+    "day": 24 * 3600,
+    "week": 7 * 24 * 3600,
+    "month": 31 * 24 * 3600,
+    "year": 366 * 24 * 3600,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    url TEXT PRIMARY KEY,
+    title TEXT,
+    snippet TEXT,
+    content TEXT,
+    fetched_at REAL
+);
+CREATE TABLE IF NOT EXISTS analyses (
+    query TEXT,
+    url TEXT,
+    relevant INTEGER,
+    sentiment TEXT,
+    digest TEXT,
+    analyzed_at REAL,
+    PRIMARY KEY (query, url)
+);
+CREATE INDEX IF NOT EXISTS analyses_recent ON analyses (query, relevant, analyzed_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS article_index USING fts5(url UNINDEXED, title, content);
+"""
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class ArticleStore:
+    """Fetched articles and their per-query analyses in one SQLite file.
+
+    Args:
+        path: SQLite file, or ":memory:" for a throwaway store.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def add_article(self, url: str, title: str, snippet: str, content: str):
+        """Store an article's extracted text and index it for full-text search."""
+        with self._lock:
+            replaced = self._db.execute("SELECT 1 FROM articles WHERE url = ?", (url,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO articles (url, title, snippet, content, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (url, title, snippet, content, time.time()),
+            )
+            if replaced:
+                self._db.execute("DELETE FROM article_index WHERE url = ?", (url,))
+            self._db.execute("INSERT INTO article_index (url, title, content) VALUES (?, ?, ?)", (url, title, content))
+            self._db.commit()
+
+    def add_analysis(self, query: str, url: str, relevant: bool, sentiment: Optional[str] = None,
+                     digest: Optional[Dict[str, Any]] = None):
+        """Store the analysis of an article for one query."""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO analyses (query, url, relevant, sentiment, digest, analyzed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (normalize_query(query), url, int(relevant), sentiment,
+                 json.dumps(digest) if digest is not None else None, time.time()),
+            )
+            self._db.commit()
+
+    def article(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM articles WHERE url = ?", (url,)).fetchone()
+        return dict(row) if row else None
+
+    def analysis(self, query: str, url: str) -> Optional[Dict[str, Any]]:
+        """Return the stored analysis of ``url`` for ``query``, joined with the article."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT a.url, a.title, a.snippet, a.content, n.relevant, n.sentiment, n.digest, n.analyzed_at "
+                "FROM analyses n JOIN articles a ON a.url = n.url WHERE n.query = ? AND n.url = ?",
+                (normalize_query(query), url),
+            ).fetchone()
+        return self._analysis_row(row) if row else None
+
+    def recent(self, query: str, max_age: float, limit: int = 10) -> List[Dict[str, Any]]:
+        """Relevant analyzed articles for ``query`` from the last ``max_age`` seconds, newest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT a.url, a.title, a.snippet, a.content, n.relevant, n.sentiment, n.digest, n.analyzed_at "
+                "FROM analyses n JOIN articles a ON a.url = n.url "
+                "WHERE n.query = ? AND n.relevant = 1 AND a.fetched_at >= ? "
+                "ORDER BY a.fetched_at DESC LIMIT ?",
+                (normalize_query(query), time.time() - max_age, limit),
+            ).fetchall()
+        return [self._analysis_row(row) for row in rows]
+
+    def search(self, text: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Full-text search over article titles and content, best matches first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT url, title, snippet(article_index, 2, '', '', ' ... ', 20) AS excerpt "
+                "FROM article_index WHERE article_index MATCH ? ORDER BY rank LIMIT ?",
+                (text, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    @staticmethod
+    def _analysis_row(row) -> Dict[str, Any]:
+        analysis = dict(row)
+        analysis["relevant"] = bool(analysis["relevant"])
+        analysis["digest"] = json.loads(analysis["digest"]) if analysis["digest"] else None
+        return analysis
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
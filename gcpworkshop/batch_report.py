@@ -0,0 +1,186 @@
+"""Batch report generation for many companies at once.
+
+The morning run covers a list of queries. Running them one by one through
+``web_search_report`` would search, fetch and analyze the same article once
+per company that mentions it. This command runs up to ``--concurrency``
+reports at a time. All of them share one ReportCaches (see report_cache.py),
+single-flight caches for:
+
+- searches
+- article extraction
+- LLM calls
+
+An article relevant to several companies is fetched and parsed once, and
+identical prompts such as its sentiment analysis are answered once. When
+two reports need the same missing entry at the same time, one computes it
+and the other waits for that result.
+
+The provider rate limits in client_policy.py apply across all reports.
+Each report's span carries a ``search_cache``, ``fetch_cache`` or
+``llm_cache`` attribute of "hit", "shared" or "miss". Shared means the
+result was computed once for two reports at the same time.
+
+Output, per query:
+
+- ``<slug>.md``: the report
+- ``<slug>.png``: its header image
+- ``<slug>.trace.json``: its Chrome trace
+
+``summary.json`` holds per-query timing and totals, plus cache, rate
+limiter and cascade stats.
+
+Usage:
+    python batch_report.py companies.txt [--out reports] [--concurrency 4] [--time day] [--num-results 10]
+                           [--parse-workers N]
+    python batch_report.py --query "Rema 1000" --query "Equinor" [--out reports]
+
+The query file has one query per line; blank lines and lines starting with
+# are ignored.
+"""
+import argparse
+import base64
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from agent_common import cascade
+from agent_common import client_policy
+import context_budget
+import graph
+from ingest import load_watchlist
+from report_cache import ReportCaches
+
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", 4))
+
+
+def slugify(query: str) -> str:
+    return re.sub(r"[^a-z0-9æøå]+", "-", query.lower()).strip("-") or "report"
+
+
+def unique_slugs(queries: List[str]) -> Dict[str, str]:
+    """Map each query to a file name slug, numbering queries that slugify alike."""
+    slugs, used = {}, set()
+    for query in queries:
+        slug, n = slugify(query), 1
+        while slug in used:
+            n += 1
+            slug = f"{slugify(query)}-{n}"
+        slugs[query] = slug
+        used.add(slug)
+    return slugs
+
+
+def write_report(out_dir: str, slug: str, result: Dict[str, Any]) -> Dict[str, str]:
+    """Write a report's Markdown, header image and trace, and return the file names."""
+    files = {"report": f"{slug}.md"}
+    with open(os.path.join(out_dir, files["report"]), "w") as f:
+        f.write(result["report"])
+    if result.get("header_image"):
+        files["header_image"] = f"{slug}.png"
+        with open(os.path.join(out_dir, files["header_image"]), "wb") as f:
+            f.write(base64.b64decode(result["header_image"]))
+    if result.get("trace"):
+        files["trace"] = f"{slug}.trace.json"
+        with open(os.path.join(out_dir, files["trace"]), "w") as f:
+            json.dump(result["trace"], f)
+    return files
+
+
+def _trace_totals(trace: Dict[str, Any]) -> Dict[str, Any]:
+    spans = [event for event in trace.get("traceEvents", []) if event["ph"] == "X"]
+    return {
+        "articles": sum(1 for event in spans if event["name"] == "article" and event["args"].get("accepted")),
+        "input_tokens": sum(event["args"].get("input_tokens", 0) for event in spans),
+        "output_tokens": sum(event["args"].get("output_tokens", 0) for event in spans),
+    }
+
+
+def run_batch(queries: List[str], out_dir: str, concurrency: int = BATCH_CONCURRENCY, num_results: int = 10,
+              time_range: str = "day") -> Dict[str, Any]:
+    """
+    Generate a report for every query and write them to ``out_dir``.
+
+    Args:
+        queries: Queries, one report each; duplicates are dropped
+        out_dir: Output directory, created if missing
+        concurrency: Reports generated at the same time
+        num_results: Search results per query
+        time_range: Tavily time range
+
+    Returns:
+        The timing summary also written to ``out_dir/summary.json``
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    queries = list(dict.fromkeys(queries))
+    slugs = unique_slugs(queries)
+    cascades_before = cascade.stats()
+    caches = ReportCaches()
+
+    def one_report(query):
+        start = time.perf_counter()
+        entry = {"query": query}
+        try:
+            result = graph.web_search_report(query, num_results, time=time_range, caches=caches)
+            entry.update(status="ok", files=write_report(out_dir, slugs[query], result), **_trace_totals(result.get("trace", {})))
+        except Exception as e:
+            print(f"Error generating report for '{query}': {str(e)}")
+            entry.update(status="error", error=str(e))
+        entry["seconds"] = time.perf_counter() - start
+        print(f"[{entry['status']}] {query} in {entry['seconds']:.1f}s")
+        return entry
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        entries = list(pool.map(one_report, queries))
+    wall = time.perf_counter() - start
+
+    seconds = sorted(entry["seconds"] for entry in entries)
+    summary = {
+        "queries": len(queries),
+        "succeeded": sum(1 for entry in entries if entry["status"] == "ok"),
+        "concurrency": concurrency,
+        "wall_s": wall,
+        "report_s": {"p50": seconds[len(seconds) // 2], "max": seconds[-1]} if seconds else {},
+        "input_tokens": sum(entry.get("input_tokens", 0) for entry in entries),
+        "output_tokens": sum(entry.get("output_tokens", 0) for entry in entries),
+        "caches": caches.stats(),
+        "client_policy": client_policy.stats(),
+        "cascades": {task: {key: stats[key] - cascades_before.get(task, {}).get(key, 0)
+                            for key in ("calls", "escalations")} for task, stats in cascade.stats().items()},
+        "reports": entries,
+    }
+    with open(os.path.join(out_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=1)
+    return summary
+
+
+def print_summary(summary: Dict[str, Any]):
+    print(f"\n{summary['succeeded']}/{summary['queries']} reports in {summary['wall_s']:.1f}s "
+          f"(concurrency {summary['concurrency']}), {summary['input_tokens']} input tokens")
+    for entry in sorted(summary["reports"], key=lambda entry: -entry["seconds"]):
+        print(f"  {entry['query']:<30} {entry['status']:<6} {entry['seconds']:>7.1f}s  {entry.get('articles', 0)} articles")
+    for name, stats in summary["caches"].items():
+        print(f"  {name} cache: {stats['hits']} hits, {stats['shared']} shared, {stats['misses']} misses")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate news reports for many queries")
+    parser.add_argument("file", nargs="?", help="File with one query per line")
+    parser.add_argument("--query", action="append", default=[], help="Query to report on, may be repeated")
+    parser.add_argument("--out", default="reports", help="Output directory")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="Reports generated at a time")
+    parser.add_argument("--num-results", type=int, default=10)
+    parser.add_argument("--time", default="day", choices=("day", "week", "month", "year"))
+    parser.add_argument("--parse-workers", type=int, default=os.cpu_count() or 1,
+                        help="HTML parsing worker processes, 0 to parse in the calling thread")
+    args = parser.parse_args()
+
+    queries = (load_watchlist(args.file) if args.file else []) + args.query
+    if not queries:
+        parser.error("give a query file or at least one --query")
+    graph.configure_parse_pool(args.parse_workers, warm=True)
+    context_budget.get_tokenizer()
+    print_summary(run_batch(queries, args.out, args.concurrency, args.num_results, args.time))
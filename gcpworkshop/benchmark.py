@@ -0,0 +1,610 @@
+"""Offline replay benchmark for the news report pipeline.
+
+``web_search_report`` normally depends on Tavily, news sites, Gemini and
+Imagen, so its timing changes from run to run. This harness replays
+recorded fixtures instead:
+
+- A local HTTP server stands in for the Tavily search API, Google Custom
+  Search and the news sites. It serves the recorded results and HTML pages
+  with configurable injected latency.
+- Replay chat and image models return the recorded LLM and Imagen responses.
+  They sleep for a latency that grows with the prompt and answer size.
+
+Each scenario runs a number of reports at a given concurrency. It reports
+end-to-end latency, throughput and the time spent in each pipeline stage.
+It also totals the tracing spans each report returns, including tokens.
+Everything runs offline.
+
+Usage:
+    python benchmark.py run [--concurrency 1 2 4] [--reports 4] [--latency-scale 1.0] [--mode map_reduce]
+                            [--parse-workers 0] [--cascade]
+                            [--fixtures fixtures/replay.json] [--json results.json]
+    python benchmark.py record QUERY fixtures/recorded.json
+    python benchmark.py imports [--budget 1.0]
+    python benchmark.py budgets [--fixtures fixtures/replay.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from langchain_core.messages import AIMessage
+import requests
+
+from agent_common import cascade
+from agent_common import import_budget as shared_import_budget
+import context_budget
+import graph
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "replay.json")
+
+# Pipeline functions timed as stages, looked up on the graph module at call time
+STAGES = (
+    "tavily_news_search",
+    "extract_text_from_url",
+    "relevant_content",
+    "analyze_sentiment",
+    "summarize_text",
+    "digest_article",
+    "generate_report",
+    "synthesize_report",
+    "generate_header_image",
+)
+
+# Modules that must only be loaded on first use, not when the web app starts
+LAZY_MODULES = ("langchain_google_vertexai", "vertexai", "google.cloud.aiplatform", "bs4")
+# Cold start import budget for the web app, in seconds
+IMPORT_BUDGET_SECONDS = 1.0
+
+# Prompt prefixes used by graph.py, mapped to the recorded response they get
+PROMPT_STAGES = (
+    ("Please determine if the following text is relevant", "relevance"),
+    ("Please analyze the sentiment", "sentiment"),
+    ("Please summarize", "summary"),
+    ("Condense this news article", "digest"),
+    ("Based on the search query", "report"),
+    ("Create an image prompt", "image_prompt"),
+)
+
+
+def load_fixtures(path=DEFAULT_FIXTURES):
+    with open(path) as f:
+        return json.load(f)
+
+
+def estimate_tokens(text):
+    """Rough token count, about four characters per token."""
+    return max(1, len(text) // 4)
+
+
+def prompt_stage(prompt):
+    for prefix, stage in PROMPT_STAGES:
+        if prompt.lstrip().startswith(prefix):
+            return stage
+    return "default"
+
+
+class Latency:
+    """Injected latency settings from the fixture file, scaled by ``scale``."""
+
+    def __init__(self, settings, scale=1.0, seed=0):
+        self.settings = settings
+        self.scale = scale
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sleep(self, seconds):
+        if seconds <= 0 or self.scale <= 0:
+            return
+        with self._lock:
+            jitter = self._random.uniform(-1.0, 1.0) * self.settings.get("jitter", 0.0)
+        time.sleep(max(0.0, seconds * (1.0 + jitter)) * self.scale)
+
+    def llm_seconds(self, stage, input_tokens, output_tokens, model_name=None):
+        llm = self.settings.get("llm", {})
+        seconds = (llm.get(stage, llm.get("default", 0.0))
+                   + input_tokens / 1000 * self.settings.get("llm_per_1k_input_tokens", 0.0)
+                   + output_tokens / 100 * self.settings.get("llm_per_100_output_tokens", 0.0))
+        # Relative speed of each model tier, e.g. pro is slower than flash
+        return seconds * self.settings.get("model_factor", {}).get(model_name, 1.0)
+
+
+class ReplayServer:
+    """Threaded local HTTP server replaying search results and article pages.
+
+    Routes:
+        POST /search: Tavily search response.
+        GET /customsearch: Google Custom Search response.
+        GET /pages/<n>: HTML of the n-th recorded article.
+    """
+
+    def __init__(self, fixtures, latency):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.requests = defaultdict(int)
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def page_url(self, index):
+        return f"{self.url}/pages/{index}"
+
+    def start(self):
+        replay = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                path = urlparse(self.path).path
+                replay.requests[path] += 1
+                if path != "/search":
+                    return self._send(404, b"{}", "application/json")
+                payload = json.loads(body or b"{}")
+                replay.latency.sleep(replay.latency.settings.get("search", 0.0))
+                results = [{"title": article["title"], "url": replay.page_url(i), "content": article["snippet"]}
+                           for i, article in enumerate(replay.fixtures["articles"])]
+                results = results[:payload.get("max_results", len(results))]
+                self._send(200, json.dumps({"results": results}).encode(), "application/json")
+
+            def do_GET(self):
+                path = urlparse(self.path).path
+                replay.requests[path.rsplit("/", 1)[0] if path.startswith("/pages/") else path] += 1
+                if path == "/customsearch":
+                    replay.latency.sleep(replay.latency.settings.get("search", 0.0))
+                    items = [{"title": article["title"], "link": replay.page_url(i), "snippet": article["snippet"]}
+                             for i, article in enumerate(replay.fixtures["articles"])]
+                    return self._send(200, json.dumps({"items": items}).encode(), "application/json")
+                if path.startswith("/pages/"):
+                    try:
+                        article = replay.fixtures["articles"][int(path.rsplit("/", 1)[-1])]
+                    except (ValueError, IndexError):
+                        return self._send(404, b"Not found", "text/plain")
+                    replay.latency.sleep(replay.latency.settings.get("page", 0.0))
+                    return self._send(200, article["html"].encode(), "text/html; charset=utf-8")
+                self._send(404, b"Not found", "text/plain")
+
+            def _send(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class ReplayChatModel:
+    """Stand-in for ChatVertexAI that answers with recorded responses.
+
+    Relevance checks answer "True" when the query appears in the article
+    text, which is how the recorded answers were decided. A fixture answer
+    keyed ``<stage>@<model name>`` replaces the stage's answer for that
+    model, such as a weaker report draft from a cheap cascade tier.
+    Structured output (used by model cascades) fills string fields with the
+    recorded answer and ``confidence`` from the fixture's per-answer confidence.
+    """
+
+    def __init__(self, fixtures, latency, max_tokens=1024, model_name="replay"):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.max_tokens = max_tokens
+        self.model_name = model_name
+
+    def respond(self, prompt):
+        stage = prompt_stage(prompt)
+        llm = self.fixtures["llm"]
+        if stage == "relevance":
+            text = prompt.split("Text:", 1)[-1]
+            return stage, llm["relevance_true"] if self.fixtures["query"].lower() in text.lower() else llm["relevance_false"]
+        return stage, llm.get(f"{stage}@{self.model_name}", llm.get(stage, "OK"))
+
+    def invoke(self, messages):
+        prompt = messages if isinstance(messages, str) else "\n".join(str(message.content) for message in messages)
+        stage, content = self.respond(prompt)
+        input_tokens, output_tokens = estimate_tokens(prompt), estimate_tokens(content)
+        self.latency.sleep(self.latency.llm_seconds(stage, input_tokens, output_tokens, self.model_name))
+        return AIMessage(content=content, usage_metadata={
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }, response_metadata={"stage": stage})
+
+    def confidence(self, stage, content):
+        confidences = self.fixtures["llm"].get("confidence", {})
+        key = f"relevance_{content.strip().lower()}" if stage == "relevance" else stage
+        return confidences.get(key, confidences.get("default", 1.0))
+
+    def with_structured_output(self, schema, include_raw=False):
+        return ReplayStructuredModel(self, schema, include_raw)
+
+
+class ReplayStructuredModel:
+    """Structured output wrapper returned by ReplayChatModel.with_structured_output."""
+
+    def __init__(self, model, schema, include_raw):
+        self.model = model
+        self.schema = schema
+        self.include_raw = include_raw
+
+    def invoke(self, messages):
+        raw = self.model.invoke(messages)
+        values = {}
+        for name, field in self.schema.model_fields.items():
+            if name == "confidence":
+                values[name] = self.model.confidence(raw.response_metadata["stage"], raw.content)
+            elif field.annotation is bool:
+                values[name] = raw.content.strip() == "True"
+            else:
+                values[name] = raw.content
+        parsed = self.schema(**values)
+        return {"raw": raw, "parsed": parsed, "parsing_error": None} if self.include_raw else parsed
+
+
+class ReplayImageGenerator:
+    """Stand-in for VertexAIImageGeneratorChat returning the recorded image."""
+
+    def __init__(self, fixtures, latency):
+        self.fixtures = fixtures
+        self.latency = latency
+
+    def invoke(self, prompt):
+        self.latency.sleep(self.latency.settings.get("image", 0.0))
+        return AIMessage(content=[{"type": "image_url", "image_url": {
+            "url": f"data:image/png;base64,{self.fixtures['image_base64']}"}}])
+
+
+class StageTimer:
+    """Accumulates wall time per pipeline stage across threads."""
+
+    def __init__(self):
+        self.calls = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def wrap(self, name, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.calls[name] += 1
+                    self.seconds[name] += elapsed
+        return timed
+
+
+@contextlib.contextmanager
+def replay(fixtures, latency_scale=1.0, timer=None):
+    """Point ``graph`` at a replay server and replay models for the duration of the block."""
+    latency = Latency(fixtures.get("latency", {}), latency_scale)
+    server = ReplayServer(fixtures, latency).start()
+    patches = {
+        "TAVILY_SEARCH_URL": f"{server.url}/search",
+        "GOOGLE_SEARCH_URL": f"{server.url}/customsearch",
+        "chat_model": lambda max_tokens=1024, temperature=0.2, model_name="replay": ReplayChatModel(
+            fixtures, latency, max_tokens, model_name),
+        "image_generator": lambda: ReplayImageGenerator(fixtures, latency),
+    }
+    if timer is not None:
+        for name in STAGES:
+            patches[name] = timer.wrap(name, getattr(graph, name))
+    originals = {name: getattr(graph, name) for name in patches}
+    try:
+        for name, value in patches.items():
+            setattr(graph, name, value)
+        yield server
+    finally:
+        for name, value in originals.items():
+            setattr(graph, name, value)
+        server.stop()
+
+
+def percentile(values, q):
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def cascade_delta(before, after):
+    """Cascade calls and escalations between two ``cascade.stats()`` snapshots."""
+    delta = {}
+    for task, stats in after.items():
+        calls = stats["calls"] - before.get(task, {}).get("calls", 0)
+        escalations = stats["escalations"] - before.get(task, {}).get("escalations", 0)
+        reasons = {reason: count - before.get(task, {}).get("reasons", {}).get(reason, 0)
+                   for reason, count in stats["reasons"].items()}
+        if calls:
+            delta[task] = {"calls": calls, "escalations": escalations, "escalation_rate": escalations / calls,
+                           "reasons": {reason: count for reason, count in reasons.items() if count}}
+    return delta
+
+
+def run_scenario(fixtures, concurrency, reports, latency_scale=1.0, num_results=10, time_range="week",
+                 mode=graph.REPORT_MODE):
+    """Run ``reports`` reports with at most ``concurrency`` at a time.
+
+    Returns:
+        dict: Wall time, throughput, latency percentiles and per-stage time
+            (seconds per report, summed across threads).
+    """
+    timer = StageTimer()
+    cascades_before = cascade.stats()
+    latencies = []
+    spans = defaultdict(lambda: defaultdict(float))
+    lock = threading.Lock()
+
+    def one_report(_):
+        start = time.perf_counter()
+        result = graph.web_search_report(fixtures["query"], num_results, time=time_range, mode=mode)
+        with lock:
+            latencies.append(time.perf_counter() - start)
+            for event in result.get("trace", {}).get("traceEvents", []):
+                if event["ph"] != "X":
+                    continue
+                total = spans[event["name"]]
+                total["calls"] += 1
+                total["seconds"] += event["dur"] / 1e6
+                for key in ("input_tokens", "output_tokens", "bytes"):
+                    total[key] += event["args"].get(key, 0)
+
+    with replay(fixtures, latency_scale, timer) as server:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(one_report, range(reports)))
+        wall = time.perf_counter() - start
+        http_requests = dict(server.requests)
+
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "reports": reports,
+        "wall_s": wall,
+        "throughput_per_min": reports / wall * 60,
+        "latency_s": {
+            "p50": statistics.median(latencies),
+            "p95": percentile(latencies, 95),
+            "max": max(latencies),
+        },
+        "stages": {
+            name: {"calls": timer.calls[name], "s_per_report": timer.seconds[name] / reports}
+            for name in STAGES if timer.calls[name]
+        },
+        "spans": {name: dict(total) for name, total in spans.items()},
+        "cascades": cascade_delta(cascades_before, cascade.stats()),
+        "http_requests": http_requests,
+    }
+
+
+def print_scenario(result):
+    latency = result["latency_s"]
+    print(f"\nmode={result['mode']} concurrency={result['concurrency']} reports={result['reports']} "
+          f"wall={result['wall_s']:.2f}s throughput={result['throughput_per_min']:.1f}/min "
+          f"p50={latency['p50']:.2f}s p95={latency['p95']:.2f}s max={latency['max']:.2f}s")
+    for name, stage in result["stages"].items():
+        print(f"  {name:<24} {stage['calls']:>5} calls  {stage['s_per_report']:>7.2f} s/report")
+    tokens = sum(total["input_tokens"] for total in result["spans"].values())
+    print(f"  input tokens per report: {tokens / result['reports']:.0f}")
+    for task, stats in result.get("cascades", {}).items():
+        reasons = ", ".join(f"{reason} {count}" for reason, count in stats["reasons"].items())
+        print(f"  {task} cascade: {stats['escalations']}/{stats['calls']} escalated ({stats['escalation_rate']:.0%})"
+              + (f": {reasons}" if reasons else ""))
+
+
+def record(query, path, num_results=10, time_range="week"):
+    """Run one live report and save its search results, pages and model answers as fixtures."""
+    articles, pages, answers, timings = [], {}, {}, defaultdict(list)
+    original_search = graph.tavily_news_search
+    original_chat_model = graph.chat_model
+    original_image_generator = graph.image_generator
+
+    def recording_get(url, *args, **kwargs):
+        start = time.perf_counter()
+        response = requests.get(url, *args, **kwargs)
+        timings["page"].append(time.perf_counter() - start)
+        pages[url] = response.content.decode(response.encoding or "utf-8", errors="replace")
+        return response
+
+    def recording_search(*args, **kwargs):
+        start = time.perf_counter()
+        results = original_search(*args, **kwargs)
+        timings["search"].append(time.perf_counter() - start)
+        articles.extend(results)
+        return results
+
+    class RecordingModel:
+        def __init__(self, model):
+            self.model = model
+
+        def invoke(self, messages):
+            prompt = messages if isinstance(messages, str) else "\n".join(str(m.content) for m in messages)
+            stage = prompt_stage(prompt)
+            start = time.perf_counter()
+            response = self.model.invoke(messages)
+            timings[stage].append(time.perf_counter() - start)
+            content = response.content if isinstance(response.content, str) else ""
+            if stage == "relevance":
+                answers["relevance_true" if content.strip() == "True" else "relevance_false"] = content.strip()
+            else:
+                answers.setdefault(stage, content)
+            return response
+
+    class RecordingImageGenerator:
+        def __init__(self, generator):
+            self.generator = generator
+
+        def invoke(self, prompt):
+            start = time.perf_counter()
+            response = self.generator.invoke(prompt)
+            timings["image"].append(time.perf_counter() - start)
+            answers["image_base64"] = response.content[0]["image_url"]["url"].split(",")[-1]
+            return response
+
+    graph.tavily_news_search = recording_search
+    graph.chat_model = lambda *args, **kwargs: RecordingModel(original_chat_model(*args, **kwargs))
+    graph.image_generator = lambda: RecordingImageGenerator(original_image_generator())
+    # Plain answers are recorded; replay adds cascade confidences from the fixtures
+    original_cascade = graph.MODEL_CASCADE
+    graph.MODEL_CASCADE = False
+    fetcher = graph.page_fetcher.set(recording_get)
+    try:
+        graph.web_search_report(query, num_results, time=time_range)
+    finally:
+        graph.page_fetcher.reset(fetcher)
+        graph.tavily_news_search = original_search
+        graph.chat_model = original_chat_model
+        graph.image_generator = original_image_generator
+        graph.MODEL_CASCADE = original_cascade
+
+    mean = lambda values: statistics.mean(values) if values else 0.0
+    fixtures = {
+        "query": query,
+        "articles": [{"title": article["title"], "snippet": article["snippet"], "html": pages[article["link"]]}
+                     for article in articles if article["link"] in pages],
+        "llm": {
+            "relevance_true": answers.get("relevance_true", "True"),
+            "relevance_false": answers.get("relevance_false", "False"),
+            **{stage: answers[stage] for stage in ("sentiment", "summary", "digest", "report", "image_prompt")
+               if stage in answers},
+        },
+        "image_base64": answers.get("image_base64", ""),
+        "latency": {
+            "search": mean(timings["search"]),
+            "page": mean(timings["page"]),
+            "llm": {stage: mean(timings[stage]) for stage in ("relevance", "sentiment", "summary", "report",
+                                                              "image_prompt", "default") if timings[stage]},
+            "image": mean(timings["image"]),
+            "jitter": 0.1,
+        },
+    }
+    with open(path, "w") as f:
+        json.dump(fixtures, f, indent=1)
+    print(f"Recorded {len(fixtures['articles'])} articles to {path}")
+
+
+# Prompt budgets checked by ``budgets``: stage → (context_budget attribute,
+# condensed with the query, condenses the report rather than the articles)
+BUDGET_STAGES = {
+    "relevance": ("RELEVANCE_BUDGET", True, False),
+    "sentiment": ("SENTIMENT_BUDGET", False, False),
+    "summary": ("SUMMARY_BUDGET", False, False),
+    "digest": ("DIGEST_BUDGET", True, False),
+    "report_source": ("REPORT_SOURCE_BUDGET", True, False),
+    "image_prompt": ("IMAGE_PROMPT_BUDGET", False, True),
+}
+
+
+def measure_budgets(fixtures):
+    """Condense the fixture articles to each stage's token budget.
+
+    The kept share is the part of a text's total sentence score (see
+    context_budget.score_sentences) that survives condensing. Below 1 the
+    budget drops sentences condense ranks as informative.
+
+    Returns:
+        dict: Per stage, the budget, mean tokens before and after condensing,
+            and the minimum and mean kept share.
+    """
+    query = fixtures["query"]
+    articles = [graph.parse_html(article["html"].encode()) for article in fixtures["articles"]]
+    results = {}
+    for stage, (attribute, with_query, report) in BUDGET_STAGES.items():
+        budget = getattr(context_budget, attribute)
+        stage_query = query if with_query else None
+        before, after, kept = [], [], []
+        for text in [fixtures["llm"].get("report", "")] if report else articles:
+            sentences = context_budget.split_sentences(text)
+            scores = context_budget.score_sentences(sentences, stage_query)
+            condensed = context_budget.condense(text, budget, query=stage_query)
+            before.append(context_budget.count_tokens(text))
+            after.append(context_budget.count_tokens(condensed))
+            total = sum(scores)
+            kept.append(sum(score for sentence, score in zip(sentences, scores) if sentence in condensed) / total
+                        if total else 1.0)
+        results[stage] = {
+            "budget": budget,
+            "tokens_before": statistics.mean(before),
+            "tokens_after": statistics.mean(after),
+            "kept_min": min(kept),
+            "kept_mean": statistics.mean(kept),
+        }
+    return results
+
+
+def import_budget(module="webview", budget=IMPORT_BUDGET_SECONDS):
+    """Check the cold start cost of importing ``module``, see agent_common/import_budget.py."""
+    return shared_import_budget.import_budget(module, budget, LAZY_MODULES, os.path.dirname(os.path.abspath(__file__)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline replay benchmark for web_search_report")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="Replay fixtures at one or more concurrency levels")
+    run.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    run.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4])
+    run.add_argument("--reports", type=int, default=4, help="Reports per concurrency level")
+    run.add_argument("--latency-scale", type=float, default=1.0, help="Multiplier for all injected latency")
+    run.add_argument("--mode", choices=("map_reduce", "single"), default=graph.REPORT_MODE)
+    run.add_argument("--parse-workers", type=int, default=graph.PARSE_WORKERS,
+                     help="HTML parsing worker processes, 0 to parse in the calling thread")
+    run.add_argument("--cascade", action=argparse.BooleanOptionalAction, default=graph.MODEL_CASCADE,
+                     help="Run relevance checks and the report through model cascades")
+    run.add_argument("--json", help="Write the results to this file")
+    rec = commands.add_parser("record", help="Record fixtures from one live report")
+    rec.add_argument("query")
+    rec.add_argument("path")
+    imports = commands.add_parser("imports", help="Check the web app's cold start import time")
+    imports.add_argument("--budget", type=float, default=IMPORT_BUDGET_SECONDS)
+    budgets = commands.add_parser("budgets", help="Check how much each prompt budget keeps of the fixture texts")
+    budgets.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.query, args.path)
+    elif args.command == "imports":
+        result = import_budget(budget=args.budget)
+        shared_import_budget.print_result(result)
+        sys.exit(0 if result["ok"] else 1)
+    elif args.command == "budgets":
+        context_budget.get_tokenizer()
+        for stage, measured in measure_budgets(load_fixtures(args.fixtures)).items():
+            print(f"  {stage:<14} budget {measured['budget']:>5}  tokens {measured['tokens_before']:>6.0f} → "
+                  f"{measured['tokens_after']:>5.0f}  kept {measured['kept_mean']:.0%} (min {measured['kept_min']:.0%})")
+    else:
+        fixtures = load_fixtures(args.fixtures)
+        graph.MODEL_CASCADE = args.cascade
+        graph.configure_parse_pool(args.parse_workers, warm=True)
+        # Loaded up front so the first report does not pay for it
+        context_budget.get_tokenizer()
+        results = []
+        for concurrency in args.concurrency:
+            result = run_scenario(fixtures, concurrency, args.reports, args.latency_scale, mode=args.mode)
+            print_scenario(result)
+            results.append(result)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(results, f, indent=1)
@@ -0,0 +1,158 @@
+"""Token budgets for LLM prompts, with local extractive condensing.
+
+A fixed character slice sends page boilerplate and cuts off relevant
+paragraphs. ``condense`` instead keeps the sentences that matter most until
+the text fits a token budget. Each sentence is scored by:
+
+- TF-IDF weight of its terms within the document
+- mentions of entities (capitalised names, numbers)
+- terms shared with the query
+
+The kept sentences stay in their original order. Tokens are counted with
+Gemini's local SentencePiece tokenizer from the Vertex AI SDK. Loading it
+downloads its model file the first time, so entry points call
+``get_tokenizer()`` at startup, not while serving a report. Until it is
+loaded, or if loading fails, counts use a character estimate. Everything
+else runs locally and takes milliseconds per article.
+"""
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import List, Optional
+
+# Token budgets per prompt, overridable through the environment and checked
+# with ``python benchmark.py budgets``. On the replay fixtures the sentences
+# condense ranks as informative take at most about 230 tokens per article,
+# so relevance and sentiment keep all of them at 250. Summaries and digests
+# get room for longer pages. A report source keeps its key sentences (94% of
+# the sentence score on average), and the header image only needs the gist
+# of the report.
+RELEVANCE_BUDGET = int(os.environ.get("CONTEXT_BUDGET_RELEVANCE", 250))
+SENTIMENT_BUDGET = int(os.environ.get("CONTEXT_BUDGET_SENTIMENT", 250))
+SUMMARY_BUDGET = int(os.environ.get("CONTEXT_BUDGET_SUMMARY", 400))
+REPORT_SOURCE_BUDGET = int(os.environ.get("CONTEXT_BUDGET_REPORT_SOURCE", 200))
+IMAGE_PROMPT_BUDGET = int(os.environ.get("CONTEXT_BUDGET_IMAGE_PROMPT", 100))
+DIGEST_BUDGET = int(os.environ.get("CONTEXT_BUDGET_DIGEST", 400))
+
+# Model whose tokenizer counts tokens. All Gemini models share it. Set it
+# empty to always use the character estimate.
+TOKENIZER_MODEL = os.environ.get("CONTEXT_TOKENIZER_MODEL", "gemini-1.5-flash-002")
+# Fallback estimate: Gemini tokenises Norwegian and English news text at
+# roughly four characters per token
+CHARS_PER_TOKEN = 4
+
+_tokenizer = None
+_tokenizer_loaded = False
+_tokenizer_lock = threading.Lock()
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'«(]?[A-ZÆØÅ0-9])")
+_WORD = re.compile(r"[A-Za-zÆØÅæøåÉéÜüÖöÄä0-9][\w'-]*")
+_ENTITY = re.compile(r"\b(?:[A-ZÆØÅ][\w-]+|\d[\d.,%]*)")
+
+# Frequent words carry no signal for ranking
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were will with
+og i det er som en på til av for med har de ikke den et om var ved fra men kan vi seg så også etter
+""".split())
+
+
+def get_tokenizer():
+    """Return the local Gemini tokenizer, loading it on the first call.
+
+    Call this at startup: counting never loads the tokenizer itself. Returns
+    None if TOKENIZER_MODEL is empty or the tokenizer cannot be loaded. A
+    failure is reported once and not retried.
+    """
+    global _tokenizer, _tokenizer_loaded
+    with _tokenizer_lock:
+        if not _tokenizer_loaded:
+            _tokenizer_loaded = True
+            if TOKENIZER_MODEL:
+                try:
+                    from vertexai.preview.tokenization import get_tokenizer_for_model
+                    _tokenizer = get_tokenizer_for_model(TOKENIZER_MODEL)
+                except Exception as e:
+                    print(f"Error loading the {TOKENIZER_MODEL} tokenizer, estimating tokens from length: {str(e)}")
+    return _tokenizer
+
+
+def count_tokens(text: str) -> int:
+    """Count the model tokens in ``text``, estimating from its length until the tokenizer is loaded."""
+    tokenizer = _tokenizer
+    if tokenizer is None or not text:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return tokenizer.count_tokens(text).total_tokens
+
+
+def count_tokens_each(texts: List[str]) -> List[int]:
+    """Count the model tokens in each of ``texts`` in one tokenizer call."""
+    tokenizer = _tokenizer
+    if tokenizer is None or not texts:
+        return [math.ceil(len(text) / CHARS_PER_TOKEN) for text in texts]
+    return [len(info.token_ids) for info in tokenizer.compute_tokens(texts).tokens_info]
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence.strip() for sentence in _SENTENCE_END.split(text) if sentence.strip()]
+
+
+def _terms(sentence: str) -> List[str]:
+    return [word for word in (w.lower() for w in _WORD.findall(sentence))
+            if word not in STOPWORDS and len(word) > 1]
+
+
+def score_sentences(sentences: List[str], query: Optional[str] = None) -> List[float]:
+    """Score each sentence by TF-IDF weight, entity mentions and query overlap."""
+    terms = [_terms(sentence) for sentence in sentences]
+    document_frequency = Counter(term for sentence_terms in terms for term in set(sentence_terms))
+    n = len(sentences)
+    query_terms = set(_terms(query or ""))
+    seen = set()
+    scores = []
+    for index, (sentence, sentence_terms) in enumerate(zip(sentences, terms)):
+        key = sentence.lower()
+        if len(sentence_terms) < 3 or key in seen:
+            # Menu items, bylines and repeated boilerplate
+            scores.append(0.0)
+            continue
+        seen.add(key)
+        counts = Counter(sentence_terms)
+        tf_idf = sum((count / len(sentence_terms)) * math.log((1 + n) / (1 + document_frequency[term]))
+                     for term, count in counts.items())
+        entities = len(_ENTITY.findall(sentence[1:]))  # skip the capitalised first word
+        overlap = len(query_terms & counts.keys())
+        lead = 0.5 if index < 3 else 0.0
+        scores.append(tf_idf + 0.3 * min(entities, 5) + 2.0 * overlap + lead)
+    return scores
+
+
+def condense(text: str, budget: int, query: Optional[str] = None) -> str:
+    """Fit ``text`` into ``budget`` tokens by keeping its highest scoring sentences.
+
+    Args:
+        text: Text to condense, e.g. an extracted article.
+        budget: Maximum tokens of the result.
+        query: Optional query whose terms make sentences more important.
+
+    Returns:
+        The text unchanged if it already fits, otherwise the selected
+        sentences in their original order.
+    """
+    if count_tokens(text) <= budget:
+        return text
+    sentences = split_sentences(text)
+    scores = score_sentences(sentences, query)
+    tokens = count_tokens_each(sentences)
+    chosen, used = [], 0
+    for index in sorted(range(len(sentences)), key=lambda i: scores[i], reverse=True):
+        if scores[index] <= 0:
+            break
+        if used + tokens[index] > budget:
+            continue
+        chosen.append(index)
+        used += tokens[index]
+    if not chosen:
+        return text[:budget * CHARS_PER_TOKEN]
+    return " ".join(sentences[index] for index in sorted(chosen))
@@ -1,21 +1,68 @@
 
-from langchain_google_vertexai import ChatVertexAI, VertexAIImageGeneratorChat
-from langchain_core.messages import HumanMessage, AIMessage
-from langgraph.graph import END, START, StateGraph
-from langchain import hub
-from langgraph.prebuilt import create_react_agent
+from langchain_core.messages import AIMessage, HumanMessage
+from pydantic import BaseModel, Field
 import requests
-import json
-from bs4 import BeautifulSoup
 import urllib.parse
-import base64
 import os
+import json
+import re
+import contextvars
+import inspect
+import threading
+import functools
+import multiprocessing
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
 from typing import List, Dict, Any, Optional, Callable, Tuple
-
-
+from tracing import Tracer, record_usage, span, status
+import context_budget
+from context_budget import condense, count_tokens
+from agent_common.client_policy import policy
+from agent_common.cascade import cascade
+from article_store import ArticleStore, TIME_RANGE_SECONDS
+from report_cache import CachedChatModel, CachedStructuredModel, ReportCaches, cached, cached_model, use_caches
+
+# Service endpoints, overridable so the pipeline can run against a local
+# replay server (see benchmark.py)
+TAVILY_SEARCH_URL = os.environ.get("TAVILY_SEARCH_URL", "https://api.tavily.com/search")
+GOOGLE_SEARCH_URL = os.environ.get("GOOGLE_SEARCH_URL", "https://customsearch.googleapis.com/customsearch/v1")
+TAVILY_API_KEY = os.environ.get("TAVILY_API_KEY", "KEY")
+# SQLite file with articles analyzed by the background ingester (ingest.py).
+# When set, reports reuse those analyses instead of fetching and analyzing again.
+ARTICLE_STORE_PATH = os.environ.get("ARTICLE_STORE_PATH")
+
+# "single" sends all article content to one report prompt after every
+# article is processed. "map_reduce" digests every accepted article as soon
+# as its analysis is done, at the cost of one more LLM call per article, and
+# synthesizes a shorter report prompt from the digests.
+REPORT_MODE = os.environ.get("REPORT_MODE", "single")
+# Articles fetched and analyzed at the same time in map_reduce mode
+ARTICLE_WORKERS = int(os.environ.get("ARTICLE_WORKERS", 4))
+# Accepted articles per report
+MAX_ARTICLES = 5
+# MODEL_CASCADE=1 runs relevance checks and the final report through model
+# cascades (see agent_common/cascade.py) instead of the fixed models
+MODEL_CASCADE = os.environ.get("MODEL_CASCADE", "0") == "1"
+# A cascaded report draft shorter than this, or with fewer Markdown
+# headings, is rejected and written again by the next tier
+REPORT_MIN_CHARS = int(os.environ.get("REPORT_MIN_CHARS", 600))
+REPORT_MIN_SECTIONS = 3
+# HTML parsing is pure Python and holds the GIL. With PARSE_WORKERS > 0 it
+# runs in that many worker processes, with at most PARSE_QUEUE_SIZE more
+# pages waiting (see configure_parse_pool).
+PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", 0))
+PARSE_QUEUE_SIZE = int(os.environ.get("PARSE_QUEUE_SIZE", 16))
+# Extracted text is capped to avoid oversized requests
+MAX_EXTRACT_CHARS = 10000
+
+
+# The Vertex AI SDK takes seconds to import, so it is loaded on first use
+# instead of at module load
 
 # Create a Vertex AI chat model instance using LangChain
 def chat_model(max_tokens=1024, temperature=0.2, model_name="gemini-2.5-flash-preview-05-20"):
+    from langchain_google_vertexai import ChatVertexAI
     # Initialize the chat model with your specific parameters
     chat = ChatVertexAI(
         model_name=model_name,
@@ -24,54 +71,191 @@ def chat_model(max_tokens=1024, temperature=0.2, model_name="gemini-2.5-flash-pr
         endpoint_version="v1",
         max_output_tokens=max_tokens,  # Optional: adjust based on your needs
         temperature=temperature,         # Optional: adjust based on your needs
+        max_retries=1,                   # A single attempt; client_policy owns retries
     )
     return chat
 
+def cached_chat_model(*args, **kwargs):
+    """Return ``chat_model(*args, **kwargs)``, answering from the report's shared LLM cache if it has one."""
+    # Keyed by the bound settings, so positional and keyword calls share entries
+    settings = inspect.signature(chat_model).bind(*args, **kwargs)
+    settings.apply_defaults()
+    return cached_model(chat_model(*args, **kwargs), tuple(settings.arguments.items()))
+
+def invoke_model(model, messages):
+    """
+    Invoke a chat model under the vertex client policy.
+    
+    A model answering from the report's shared LLM cache enters the policy
+    only on a cache miss. Hits and answers shared with another report use no
+    rate-limit tokens or concurrency slots, and their near-zero latency does
+    not reach the concurrency limiter. A CascadeChatModel applies the policy
+    to each tier it calls.
+    """
+    if isinstance(model, CascadeChatModel):
+        return model.invoke(messages)
+    if isinstance(model, (CachedChatModel, CachedStructuredModel)):
+        return model.invoke(messages, call=policy("vertex").call)
+    return policy("vertex").call(model.invoke, messages)
+
+# Create an Imagen model instance using LangChain
+def image_generator():
+    from langchain_google_vertexai import VertexAIImageGeneratorChat
+    return VertexAIImageGeneratorChat(
+        project="genaibuilders25osl-4814",
+        location="us-central1",
+        model_name="imagen-4.0-generate-preview-05-20"
+    )
+
+class CascadeAnswer(BaseModel):
+    """Answer and self-assessed confidence of one cascade tier."""
+
+    answer: str = Field(
+        description="The complete response, formatted exactly as the request asks"
+    )
+    confidence: float = Field(
+        description="How certain you are that the answer is correct and complete, from 0 to 1"
+    )
+
+CONFIDENCE_INSTRUCTION = ("Put your complete response in `answer`, formatted exactly as requested above, "
+                          "and rate in `confidence` from 0 to 1 how certain you are that it is correct and complete.")
+
+def check_report(response: AIMessage) -> Optional[str]:
+    """
+    Check a report draft for problems that can be verified without a model.
+    
+    Args:
+        response: Plain text report from one cascade tier
+        
+    Returns:
+        Why the draft is unusable ("empty", "truncated", "too_short",
+        "missing_sections" or "no_links"), or None if it passes
+    """
+    text = str(response.content).strip()
+    if not text:
+        return "empty"
+    if response.response_metadata.get("finish_reason") in ("MAX_TOKENS", "length"):
+        return "truncated"
+    if len(text) < REPORT_MIN_CHARS:
+        return "too_short"
+    if len(re.findall(r"^#{1,6} \S", text, re.MULTILINE)) < REPORT_MIN_SECTIONS:
+        return "missing_sections"
+    if not re.search(r"\]\(https?://", text):
+        return "no_links"
+    return None
+
+class CascadeChatModel:
+    """
+    Chat model that runs each prompt through a model cascade.
+    
+    ``invoke`` works like ``ChatVertexAI.invoke``. Without ``check``, each
+    tier answers with a CascadeAnswer and a low-confidence answer is retried
+    on the next tier. With ``check``, each tier answers in plain text and an
+    answer that fails the check is retried instead, so long free-text output
+    such as the report is never forced through a schema. The returned message
+    carries the token usage of every tier that ran, plus the answering model,
+    its confidence and the number of escalations in ``response_metadata``.
+    
+    Each tier is called through ``invoke_model``, so it takes its own client
+    policy slot and a tier answered from the shared LLM cache takes none.
+    Callers invoke the cascade with ``invoke_model`` like any other model.
+    
+    Args:
+        task: Cascade name in agent_common.cascade.CASCADES
+        max_tokens: Maximum output tokens per tier
+        temperature: Sampling temperature per tier
+        check: Returns why a plain text response is unusable, or None to accept it
+    """
+
+    def __init__(self, task: str, max_tokens: int = 1024, temperature: float = 0.2,
+                 check: Optional[Callable[[AIMessage], Optional[str]]] = None):
+        self.task = task
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.check = check
+
+    def invoke(self, messages: List[HumanMessage]) -> AIMessage:
+        prompt = list(messages) + [HumanMessage(content=CONFIDENCE_INSTRUCTION)]
+        usage = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+        input_tokens = sum(count_tokens(str(m.content)) for m in messages)
+
+        def add_usage(response):
+            for key, value in (getattr(response, "usage_metadata", None) or {}).items():
+                if key in usage:
+                    usage[key] += value
+
+        def attempt(model_name):
+            model = cached_chat_model(self.max_tokens, self.temperature, model_name)
+            output = invoke_model(model.with_structured_output(CascadeAnswer, include_raw=True), prompt)
+            add_usage(output["raw"])
+            parsed = output["parsed"]
+            return parsed, parsed.confidence if parsed is not None else None
+
+        def checked_attempt(model_name):
+            response = invoke_model(cached_chat_model(self.max_tokens, self.temperature, model_name), messages)
+            add_usage(response)
+            rejected = self.check(response)
+            return response, None if rejected else 1.0, rejected
+
+        if self.check is not None:
+            outcome = cascade(self.task).run(checked_attempt, input_tokens=input_tokens)
+            content = outcome.result.content
+        else:
+            outcome = cascade(self.task).run(attempt, input_tokens=input_tokens)
+            if outcome.result is not None:
+                content = outcome.result.answer
+            else:
+                # The last tier gave no structured answer, so ask it again without the schema
+                response = invoke_model(cached_chat_model(self.max_tokens, self.temperature, outcome.model_name), messages)
+                add_usage(response)
+                content = response.content
+        return AIMessage(content=content, usage_metadata=usage, response_metadata={
+            "model_name": outcome.model_name,
+            "confidence": outcome.confidence,
+            "escalations": outcome.escalations,
+            "rejected": outcome.rejected,
+        })
+
 # Function to generate an image using Imagen API
-def generate_header_image(query: str, status_callback: Optional[Callable] = None) -> Tuple[str, str]:
+def generate_header_image(query: str) -> Tuple[str, str]:
     """
     Generate a header image for the report using Google's Imagen API.
     
     Args:
         query: The search query to base the image on
-        status_callback: Optional callback function to report status
         
     Returns:
         Tuple of (base64-encoded image, image prompt used)
     """
-    if status_callback:
-        status_callback(f"Generating header image for 'report'")
+    status(f"Generating header image for 'report'")
     
     # Construct a detailed prompt for the image based on the query
-    model = chat_model(temperature=0.7)
-    image_prompt_request = f"""Create an image prompt about this report: {query[:500]} that would work well for a business report header.
+    model = cached_chat_model(temperature=0.7)
+    image_prompt_request = f"""Create an image prompt about this report: {condense(query, context_budget.IMAGE_PROMPT_BUDGET)} that would work well for a business report header.
     The image should look professional and be related to business, or the specific company/industry/theme.
     Do not include any text in the image prompt as Imagen cannot render text.
     Keep the prompt under 200 characters. 
     Just return the prompt text and nothing else."""
     
-    image_prompt_response = model.invoke([HumanMessage(content=image_prompt_request)])
+    with span("image_prompt") as current:
+        image_prompt_response = invoke_model(model, [HumanMessage(content=image_prompt_request)])
+        record_usage(current, image_prompt_response)
     image_prompt = image_prompt_response.content.strip()
     
-    if status_callback:
-        status_callback(f"Created image prompt: '{image_prompt}'")
+    status(f"Created image prompt: '{image_prompt}'")
     
     try:
-        image_generator = VertexAIImageGeneratorChat(
-        project="genaibuilders25osl-4814",
-        location="us-central1",
-        model_name="imagen-4.0-generate-preview-05-20"
-        )
-        response = image_generator.invoke(image_prompt)
-        generated_image = response.content[0]
-        # Parse response object to get base64 string for image
-        img_base64 = generated_image["image_url"]["url"].split(",")[-1]
+        with span("image") as current:
+            response = policy("imagen").call(image_generator().invoke, image_prompt)
+            generated_image = response.content[0]
+            # Parse response object to get base64 string for image
+            img_base64 = generated_image["image_url"]["url"].split(",")[-1]
+            current.set(bytes=len(img_base64) * 3 // 4)
         
         return img_base64, image_prompt
     
     except Exception as e:
-        if status_callback:
-            status_callback(f"Error generating image: {str(e)}")
+        status(f"Error generating image: {str(e)}")
         print(f"Error generating image: {str(e)}")
         return "", image_prompt
 
@@ -94,7 +278,7 @@ def google_search(query: str, api_key: str, cx: str, num_results: int = 5) -> Li
     encoded_query = urllib.parse.quote_plus(query)
     
     # Build the API URL
-    base_url = "https://customsearch.googleapis.com/customsearch/v1"
+    base_url = GOOGLE_SEARCH_URL
     params = {
         "key": api_key,
         "cx": cx,
@@ -103,7 +287,9 @@ def google_search(query: str, api_key: str, cx: str, num_results: int = 5) -> Li
     }
     
     # Make the request
-    response = requests.get(base_url, params=params)
+    with span("search", provider="google") as current:
+        response = policy("google_search").call(requests.get, base_url, params=params)
+        current.set(bytes=len(response.content), status=response.status_code)
     if response.status_code != 200:
         print(f"Error: API request failed with status code {response.status_code}")
         return []
@@ -122,10 +308,7 @@ def google_search(query: str, api_key: str, cx: str, num_results: int = 5) -> Li
     
     return results
 
-import requests
-from typing import List, Dict
-
-def tavily_news_search(query: str, api_key: str, num_results: int = 5, time="day", status_callback: Optional[Callable] = None) -> List[Dict[str, str]]:
+def tavily_news_search(query: str, api_key: str, num_results: int = 5, time="day") -> List[Dict[str, str]]:
     """
     Perform a Tavily search with a focus on news and return the top N results.
 
@@ -133,15 +316,11 @@ def tavily_news_search(query: str, api_key: str, num_results: int = 5, time="day
         query: Search query string
         api_key: Tavily API key
         num_results: Number of results to return
-        status_callback: Optional callback function to report status
 
     Returns:
         List of dictionaries with title, url, and content for each result
     """
-    if status_callback:
-        status_callback(f"Searching for news about '{query}'")
-        
-    url = "https://api.tavily.com/search"
+    url = TAVILY_SEARCH_URL
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
@@ -158,7 +337,9 @@ def tavily_news_search(query: str, api_key: str, num_results: int = 5, time="day
         "type": "news"
     }
 
-    response = requests.post(url, headers=headers, json=payload)
+    with span("search", f"Searching for news about '{query}'", provider="tavily") as current:
+        response = policy("tavily").call(requests.post, url, headers=headers, json=payload)
+        current.set(bytes=len(response.content), status=response.status_code)
     if response.status_code != 200:
         print(f"Error: Tavily request failed with status code {response.status_code}")
         return []
@@ -166,8 +347,7 @@ def tavily_news_search(query: str, api_key: str, num_results: int = 5, time="day
     data = response.json()
     results = []
 
-    if status_callback:
-        status_callback(f"Found {len(data.get('results', []))} news articles")
+    status(f"Found {len(data.get('results', []))} news articles")
         
     for result in data.get("results", []):
         results.append({
@@ -178,57 +358,173 @@ def tavily_news_search(query: str, api_key: str, num_results: int = 5, time="day
 
     return results
 
-def extract_text_from_url(url: str, status_callback: Optional[Callable] = None) -> str:
+def parse_html(content: bytes, max_chars: int = MAX_EXTRACT_CHARS) -> str:
+    """
+    Extract readable text from raw HTML.
+    
+    This is a top-level function of bytes in, capped text out, so it can run
+    in a worker process and only compact text is sent back.
+    
+    Args:
+        content: Raw HTML bytes
+        max_chars: Maximum length of the returned text
+        
+    Returns:
+        Whitespace-normalized text without scripts, styles and page chrome
+    """
+    # Parse HTML with BeautifulSoup
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content, 'html.parser')
+    
+    # Remove script and style elements
+    for script in soup(["script", "style", "nav", "footer", "header"]):
+        script.extract()
+        
+    # Get the text content
+    text = soup.get_text(separator=' ', strip=True)
+    
+    # Remove extra whitespace and normalize
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    text = ' '.join(chunk for chunk in chunks if chunk)
+    return text[:max_chars]
+
+def _warm_parser():
+    # Import BeautifulSoup when a worker starts rather than on its first page
+    import bs4  # noqa: F401
+
+class ParsePool:
+    """
+    Bounded process pool running parse_html off the calling thread.
+    
+    At most ``workers + queue_size`` pages are submitted at once. Further
+    callers block until a slot frees up, which gives backpressure instead of
+    an unbounded queue of page bytes. Workers are spawned on first use. If
+    the pool breaks, e.g. a worker is killed, the page is parsed in the
+    calling thread and a new pool is started on the next call.
+    
+    Args:
+        workers: Number of worker processes
+        queue_size: Pages allowed to wait for a free worker
+    """
+
+    def __init__(self, workers: int, queue_size: int = PARSE_QUEUE_SIZE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Spawned workers do not inherit the parent's threads and locks
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                                     initializer=_warm_parser)
+            return self._executor
+
+    def parse(self, content: bytes, max_chars: int = MAX_EXTRACT_CHARS) -> Tuple[str, float]:
+        """Parse ``content`` in a worker and return the text and seconds spent waiting for a slot."""
+        start = perf_counter()
+        self._slots.acquire()
+        waited = perf_counter() - start
+        executor = self._get_executor()
+        try:
+            future = executor.submit(parse_html, content, max_chars)
+        except BaseException as e:
+            self._slots.release()
+            if not isinstance(e, BrokenProcessPool):
+                raise
+            self._reset(executor)
+            return parse_html(content, max_chars), waited
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(), waited
+        except BrokenProcessPool:
+            self._reset(executor)
+            return parse_html(content, max_chars), waited
+
+    def _reset(self, executor: ProcessPoolExecutor):
+        # Drop a broken executor so the next call starts a fresh one
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+
+    def warm(self):
+        """Start the workers now, so the first pages do not wait for them to spawn."""
+        executor = self._get_executor()
+        for future in [executor.submit(_warm_parser) for _ in range(self.workers)]:
+            future.result()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+_parse_pool: Optional[ParsePool] = ParsePool(PARSE_WORKERS) if PARSE_WORKERS > 0 else None
+
+def configure_parse_pool(workers: int, queue_size: int = PARSE_QUEUE_SIZE, warm: bool = False):
+    """
+    Set the number of HTML parsing worker processes, or 0 to parse in the calling thread.
+    
+    Do not call this at import time of the main module, as spawned workers
+    re-import it; call it under ``if __name__ == "__main__"`` or from a
+    request hook. With ``warm`` the workers are started before this returns.
+    """
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown()
+    _parse_pool = ParsePool(workers, queue_size) if workers > 0 else None
+    if warm and _parse_pool is not None:
+        _parse_pool.warm()
+
+# Fetches article pages as requests.get does. Callers can set it for one
+# report's context, e.g. benchmark.py records the pages it fetches.
+page_fetcher: contextvars.ContextVar[Callable] = contextvars.ContextVar("page_fetcher", default=requests.get)
+
+def extract_text_from_url(url: str) -> str:
     """
     Extract the main text content from a webpage.
     
     Args:
         url: URL of the webpage
-        status_callback: Optional callback function to report status
         
     Returns:
         String containing the main text from the webpage
     """
-    if status_callback:
-        status_callback(f"Extracting content from {url}")
-        
     try:
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
         }
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-        
-        # Parse HTML with BeautifulSoup
-        soup = BeautifulSoup(response.content, 'html.parser')
+        with span("fetch", f"Extracting content from {url}", url=url) as current:
+            response = page_fetcher.get()(url, headers=headers, timeout=10)
+            current.set(bytes=len(response.content), status=response.status_code)
+            response.raise_for_status()  # Raise an exception for HTTP errors
         
-        # Remove script and style elements
-        for script in soup(["script", "style", "nav", "footer", "header"]):
-            script.extract()
-            
-        # Get the text content
-        text = soup.get_text(separator=' ', strip=True)
+        with span("parse", bytes=len(response.content)) as current:
+            pool = _parse_pool
+            if pool is not None:
+                text, waited = pool.parse(response.content)
+                current.set(worker="process", queue_wait=waited)
+            else:
+                text = parse_html(response.content)
+                current.set(worker="thread")
+            current.set(chars=len(text))
         
-        # Remove extra whitespace and normalize
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = ' '.join(chunk for chunk in chunks if chunk)
-        
-        return text[:10000]  # Limit to first 10K characters to avoid oversized requests
+        return text
     except Exception as e:
         print(f"Error extracting text from {url}: {str(e)}")
-        if status_callback:
-            status_callback(f"Failed to extract content from {url}: {str(e)}")
+        status(f"Failed to extract content from {url}: {str(e)}")
         return f"Failed to extract content from {url}: {str(e)}"
 
-def summarize_text(model, text: str, status_callback: Optional[Callable] = None) -> str:
+def summarize_text(model, text: str) -> str:
     """
     Use the LLM to summarize the text.
     
     Args:
         model: LLM model instance
         text: Text to summarize
-        status_callback: Optional callback function to report status
         
     Returns:
         Summarized text
@@ -236,50 +532,50 @@ def summarize_text(model, text: str, status_callback: Optional[Callable] = None)
     if not text or len(text) < 100:
         return "Insufficient content to summarize."
     
-    if status_callback:
-        status_callback("Summarizing article content")
-        
-    prompt = f"Please summarize the following text in a concise manner:\n\n{text[:7000]}"
-    response = model.invoke([HumanMessage(content=prompt)])
+    text = condense(text, context_budget.SUMMARY_BUDGET)
+    prompt = f"Please summarize the following text in a concise manner:\n\n{text}"
+    with span("summarize", "Summarizing article content") as current:
+        response = invoke_model(model, [HumanMessage(content=prompt)])
+        record_usage(current, response)
     return response.content
 
-def analyze_sentiment(model, text: str, status_callback: Optional[Callable] = None) -> str:
+def analyze_sentiment(model, text: str) -> str:
     """
     Use the LLM to analyze the sentiment of the text.
     
     Args:
         model: LLM model instance
         text: Text to analyze
-        status_callback: Optional callback function to report status
         
     Returns:
         Sentiment analysis
     """
-    if status_callback:
-        status_callback("Analyzing sentiment of content")
-        
-    prompt = f"Please analyze the sentiment of the following text. Is it positive, negative, or neutral? Provide a brief explanation why:\n\n{text[:7000]}"
-    response = model.invoke([HumanMessage(content=prompt)])
+    text = condense(text, context_budget.SENTIMENT_BUDGET)
+    prompt = f"Please analyze the sentiment of the following text. Is it positive, negative, or neutral? Provide a brief explanation why:\n\n{text}"
+    with span("sentiment", "Analyzing sentiment of content") as current:
+        response = invoke_model(model, [HumanMessage(content=prompt)])
+        record_usage(current, response)
     return response.content
 
-def relevant_content(model, prompt: str, text: str, title: str, status_callback: Optional[Callable] = None) -> str:
+def relevant_content(model, prompt: str, text: str, title: str) -> str:
     """
     Use the LLM to determine if the text is relevant to the prompt.
 
     Return True or False, and nothing else.
     """
-    if status_callback:
-        status_callback(f"Checking relevance of article: '{title}'")
-        
+    text = condense(text, context_budget.RELEVANCE_BUDGET, query=prompt)
     prompt = f"""Please determine if the following text is relevant to the prompt.
     The prompt is asking for news about Norwegian companies, and you should verify
     that the text has some mention of the company mentioned in the prompt, and that the source is a credible news site in Norway. 
     finn.no and sites named after the company in the prompt are not credible news sites, and you should not use them as sources.
-    Respond with 'True' or 'False' only.\n\nPrompt: {prompt}\n\nText: {text[:7000]}"""
-    response = model.invoke([HumanMessage(content=prompt)])
+    Respond with 'True' or 'False' only.\n\nPrompt: {prompt}\n\nText: {text}"""
+    with span("relevance", f"Checking relevance of article: '{title}'") as current:
+        response = invoke_model(model, [HumanMessage(content=prompt)])
+        record_usage(current, response)
+        current.set(relevant=response.content.strip() == "True")
     return response.content.strip()
 
-def generate_report(model, query: str, results_data: List[Dict[str, Any]], status_callback: Optional[Callable] = None) -> str:
+def generate_report(model, query: str, results_data: List[Dict[str, Any]]) -> str:
     """
     Generate a comprehensive report based on the search results.
     
@@ -287,13 +583,11 @@ def generate_report(model, query: str, results_data: List[Dict[str, Any]], statu
         model: LLM model instance
         query: Original search query
         results_data: List of dictionaries containing result information with summaries and sentiment
-        status_callback: Optional callback function to report status
         
     Returns:
         Generated report text
     """
-    if status_callback:
-        status_callback(f"Generating comprehensive report from {len(results_data)} sources")
+    status(f"Generating comprehensive report from {len(results_data)} sources")
         
     formatted_results = "\n\n".join([
         f"SOURCE {i+1}: {result['title']}\n" +
@@ -322,91 +616,340 @@ Format the report with appropriate headings and structure.
 Call sources by their title with a hyperlink to the url, and do not use the word "source" in the report.
 """
     
-    if status_callback:
-        status_callback("Finalizing report, adding citations and formatting")
-        
-    response = model.invoke([HumanMessage(content=prompt)])
+    with span("report", "Finalizing report, adding citations and formatting", sources=len(results_data)) as current:
+        response = invoke_model(model, [HumanMessage(content=prompt)])
+        record_usage(current, response)
     return response.content
 
-def web_search_report(query: str, num_results: int = 5, time="day", status_callback: Optional[Callable] = None) -> Dict:
+def digest_article(model, query: str, result: Dict[str, str], content: str, sentiment: str) -> Dict[str, Any]:
     """
-    Perform a complete web search and report generation workflow.
+    Use the LLM to condense one accepted article into a structured digest.
     
     Args:
-        query: Search query
-        num_results: Number of search results to process
-        status_callback: Optional callback function to report status updates
+        model: LLM model instance
+        query: Original search query
+        result: Search result with title and link
+        content: Extracted article text
+        sentiment: Sentiment analysis of the article
         
     Returns:
-        Dictionary containing the report and header image
+        Dictionary with title, link, headline, key_points, entities, sentiment and sentiment_reason
     """
-    print("Starting web search report generation...")
-    if status_callback:
-        status_callback("Initializing report generation")
+    content = condense(content, context_budget.DIGEST_BUDGET, query=query)
+    prompt = f"""Condense this news article into a digest for a report about "{query}".
+Respond with JSON only, using these keys:
+"headline": one sentence with the main news,
+"key_points": up to four short factual points relevant to the query,
+"entities": companies, people and places mentioned,
+"sentiment": "positive", "negative", "neutral" or "mixed",
+"sentiment_reason": one sentence.
+
+Title: {result['title']}
+Sentiment analysis: {sentiment}
+Article: {content}"""
+    with span("digest", f"Digesting article: '{result['title']}'") as current:
+        response = invoke_model(model, [HumanMessage(content=prompt)])
+        record_usage(current, response)
+    digest = _parse_digest(response.content)
+    digest.update(title=result["title"], link=result["link"])
+    return digest
+
+def _parse_digest(text: str) -> Dict[str, Any]:
+    # Models often wrap JSON in a code fence
+    text = text.strip().removeprefix("```json").removeprefix("```").removesuffix("```").strip()
+    try:
+        digest = json.loads(text)
+    except json.JSONDecodeError:
+        digest = None
+    if not isinstance(digest, dict):
+        return {"headline": "", "key_points": [text], "entities": [], "sentiment": "unknown", "sentiment_reason": ""}
+    digest.setdefault("headline", "")
+    digest["key_points"] = [str(point) for point in digest.get("key_points") or []]
+    digest["entities"] = [str(entity) for entity in digest.get("entities") or []]
+    digest.setdefault("sentiment", "unknown")
+    digest.setdefault("sentiment_reason", "")
+    return digest
+
+def _format_digest(number: int, digest: Dict[str, Any]) -> str:
+    points = "\n".join(f"- {point}" for point in digest["key_points"])
+    return (f"ARTICLE {number}: {digest['title']}\n"
+            f"URL: {digest['link']}\n"
+            f"HEADLINE: {digest['headline']}\n"
+            f"KEY POINTS:\n{points}\n"
+            f"ENTITIES: {', '.join(digest['entities'])}\n"
+            f"SENTIMENT: {digest['sentiment']} - {digest['sentiment_reason']}")
+
+def synthesize_report(model, query: str, digests: List[Dict[str, Any]]) -> str:
+    """
+    Generate the report from article digests instead of full article content.
+    
+    Args:
+        model: LLM model instance
+        query: Original search query
+        digests: Article digests from digest_article
+        
+    Returns:
+        Generated report text
+    """
+    status(f"Synthesizing report from {len(digests)} article digests")
+    
+    formatted_digests = "\n\n".join(_format_digest(i + 1, digest) for i, digest in enumerate(digests))
+    prompt = f"""Based on the search query "{query}", please write a comprehensive report that synthesizes 
+these article digests: 
+
+{formatted_digests}
+
+You will be shut down if you use articles not in the list above.
+
+Your report should be made in Markdown format and include the following:
+
+Provide a summary of the main findings.
+Discuss the sentiment of the information.
+Identify any trends or patterns.
 
-    api_key_tavily = "KEY"
 
+Format the report with appropriate headings and structure.
+Call articles by their title with a hyperlink to the url, and do not use the words "source" or "digest" in the report.
+"""
     
-    # Generate header image first
+    with span("report", "Finalizing report, adding citations and formatting", sources=len(digests), mode="map_reduce") as current:
+        response = invoke_model(model, [HumanMessage(content=prompt)])
+        record_usage(current, response)
+    return response.content
+
+def render_partial_report(query: str, digests: List[Dict[str, Any]]) -> str:
+    """
+    Render the digests finished so far as a Markdown preview, without an LLM call.
     
+    Args:
+        query: Original search query
+        digests: Article digests in search result order
+        
+    Returns:
+        Markdown text shown while the remaining articles are processed
+    """
+    sections = [f"# {query} - Early findings", f"*{len(digests)} of up to {MAX_ARTICLES} articles analyzed so far.*"]
+    for digest in digests:
+        points = "\n".join(f"- {point}" for point in digest["key_points"])
+        sections.append(f"## [{digest['title']}]({digest['link']})\n\n{digest['headline']}\n\n{points}\n\n"
+                        f"*Sentiment: {digest['sentiment']}*")
+    return "\n\n".join(sections)
+
+class ArticleSlots:
+    """Thread-safe count of accepted articles, capped at ``limit``."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.accepted = 0
+        self._lock = threading.Lock()
+
+    def claim(self) -> Optional[int]:
+        """Take a slot and return its 1-based number, or None when all are taken."""
+        with self._lock:
+            if self.accepted >= self.limit:
+                return None
+            self.accepted += 1
+            return self.accepted
+
+    @property
+    def full(self) -> bool:
+        with self._lock:
+            return self.accepted >= self.limit
+
+def web_search_report(query: str, num_results: int = 5, time="day", status_callback: Optional[Callable] = None,
+                      partial_callback: Optional[Callable] = None, mode: str = REPORT_MODE,
+                      caches: Optional[ReportCaches] = None) -> Dict:
+    """
+    Perform a complete web search and report generation workflow.
     
-    # Initialize the model
-    model = chat_model()
+    Every stage is recorded as a span on a per-report Tracer, and the status
+    messages passed to ``status_callback`` are derived from those spans.
     
-    # Step 1: Perform the search
-    print(f"Searching for: {query}")
-    search_results = tavily_news_search(query, api_key_tavily, num_results, time=time, status_callback=status_callback)
-
-    if not search_results:
-        if status_callback:
-            status_callback("No results found. Please try a different query.")
-        return {
-            "report": "The search didn't return any results.",
-        }
+    Args:
+        query: Search query
+        num_results: Number of search results to process
+        status_callback: Optional callback function to report status updates
+        partial_callback: Optional callback receiving a Markdown preview each
+            time an article digest is ready (map_reduce mode only)
+        mode: "map_reduce" or "single", see REPORT_MODE
+        caches: Optional ReportCaches shared with other reports, see report_cache.py
+        
+    Returns:
+        Dictionary containing the report, header image and Chrome trace JSON
+    """
+    tracer = Tracer(status_callback)
+    with use_caches(caches), tracer.activate(), tracer.span("web_search_report", query=query, num_results=num_results, mode=mode):
+        result = _web_search_report(query, num_results, time, mode, partial_callback)
+    result["trace"] = tracer.to_chrome_trace()
+    return result
+
+@functools.lru_cache(maxsize=None)
+def get_article_store() -> Optional[ArticleStore]:
+    """Return the article store at ARTICLE_STORE_PATH, or None if it is not configured."""
+    return ArticleStore(ARTICLE_STORE_PATH) if ARTICLE_STORE_PATH else None
+
+def process_article(model, relevance_model, query: str, result: Dict[str, str], slots: Optional[ArticleSlots] = None,
+                    mode: str = REPORT_MODE, store: Optional[ArticleStore] = None) -> Optional[Dict[str, Any]]:
+    """
+    Fetch, check and analyze one search result.
+    
+    With a store, an article already analyzed for this query is reused
+    without fetching it or calling the LLM again. New analyses are written
+    back to the store. Failed fetches are not stored, so they are retried
+    next time.
     
-    # Step 2-4: Process each result
-    results_data = []
-    max_result = 5
-    accepted = 0
-    for i, result in enumerate(search_results):
-        if accepted >= max_result:
-            break
-        print(f"Processing result {i+1}/{len(search_results)}: {result['title']}")
+    Args:
+        model: LLM model instance for sentiment and digests
+        relevance_model: LLM model instance for the relevance check
+        query: Search query the article is analyzed for
+        result: Search result with title, link and snippet
+        slots: Optional cap on accepted articles shared with other workers
+        mode: "map_reduce" also digests the article
+        store: Optional ArticleStore
         
-        # Extract text from the URL
-        content = extract_text_from_url(result['link'], status_callback)
-        if relevant_content(model, query, content, result['title'], status_callback) == "False":
+    Returns:
+        Report data for the article, or None if it is irrelevant or no slot is left
+    """
+    with span("article", title=result['title'], url=result['link']) as article:
+        stored = store.analysis(query, result['link']) if store is not None else None
+        article.set(warm=stored is not None)
+        if stored is not None:
+            relevant = stored["relevant"]
+            content = stored["content"]
+        else:
+            # Extract text from the URL
+            content = cached("fetch", result['link'], lambda: extract_text_from_url(result['link']))
+            fetched = not content.startswith("Failed to extract content from")
+            relevant = relevant_content(relevance_model, query, content, result['title']) != "False"
+            if store is not None and fetched:
+                store.add_article(result['link'], result['title'], result['snippet'], content)
+                store.add_analysis(query, result['link'], relevant)
+        if not relevant:
             print(f"Skipping irrelevant content for {result['title']}")
-            if status_callback:
-                status_callback(f"Article '{result['title']}' determined to be irrelevant - skipping")
-            continue
-        # Summarize the content
-        accepted += 1
+            article.set(accepted=False)
+            status(f"Article '{result['title']}' determined to be irrelevant - skipping")
+            return None
+        number = slots.claim() if slots is not None else None
+        if slots is not None and number is None:
+            # Other workers filled the report while this article was checked
+            article.set(accepted=False, reason="enough articles")
+            return None
+        article.set(accepted=True)
         # summary = summarize_text(model, content)
         
         # Analyze sentiment
-        sentiment = analyze_sentiment(model, content, status_callback)
+        sentiment = stored["sentiment"] if stored and stored["sentiment"] else analyze_sentiment(model, content)
         
-        if status_callback:
-            status_callback(f"Processing article {accepted}/{max_result}: '{result['title']}' complete")
-
         # Store all the data
-        results_data.append({
+        data = {
             "title": result["title"],
             "link": result["link"],
             "snippet": result["snippet"],
-            "content": content[:1000] + "...",  # Store just a preview
+            "content": condense(content, context_budget.REPORT_SOURCE_BUDGET, query=query),  # Store just the key sentences
             # "summary": summary,
             "sentiment": sentiment
-        })
+        }
+        if mode == "map_reduce":
+            data["digest"] = (stored["digest"] if stored and stored["digest"]
+                              else digest_article(model, query, result, content, sentiment))
+        if store is not None and (stored is None or stored["sentiment"] != sentiment or stored["digest"] != data.get("digest")):
+            store.add_analysis(query, result['link'], True, sentiment, data.get("digest"))
+        
+        if slots is not None:
+            status(f"Processing article {number}/{slots.limit}: '{result['title']}' complete")
+    return data
+
+def _process_result(model, relevance_model, query: str, index: int, total: int, result: Dict[str, str],
+                    slots: ArticleSlots, mode: str, store: Optional[ArticleStore]) -> Optional[Dict[str, Any]]:
+    print(f"Processing result {index+1}/{total}: {result['title']}")
+    return process_article(model, relevance_model, query, result, slots, mode, store)
+
+def _map_articles(model, relevance_model, query: str, search_results: List[Dict[str, str]], mode: str,
+                  partial_callback: Optional[Callable], store: Optional[ArticleStore] = None) -> List[Dict[str, Any]]:
+    """
+    Process search results until MAX_ARTICLES are accepted.
+    
+    In map_reduce mode up to ARTICLE_WORKERS articles are processed at a time.
+    A new result is only started while slots are left, so no more than
+    ARTICLE_WORKERS - 1 extra articles are fetched. Each worker runs in a
+    copy of the caller's context, so its spans nest under the current span.
+    """
+    slots = ArticleSlots(MAX_ARTICLES)
+    workers = ARTICLE_WORKERS if mode == "map_reduce" else 1
+    pending = iter(enumerate(search_results))
+    accepted = {}
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        
+        def submit_next():
+            for index, result in pending:
+                context = contextvars.copy_context()
+                futures[pool.submit(context.run, _process_result, model, relevance_model, query, index, len(search_results),
+                                    result, slots, mode, store)] = index
+                return
+        
+        for _ in range(workers):
+            submit_next()
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = futures.pop(future)
+                data = future.result()
+                if data is not None:
+                    accepted[index] = data
+                    if partial_callback and "digest" in data:
+                        partial_callback(render_partial_report(query, [accepted[i]["digest"] for i in sorted(accepted)]))
+                if not slots.full:
+                    submit_next()
+    
+    # Keep the search engine's ranking regardless of completion order
+    return [accepted[index] for index in sorted(accepted)]
+
+def _web_search_report(query: str, num_results: int, time: str, mode: str = REPORT_MODE,
+                       partial_callback: Optional[Callable] = None) -> Dict:
+    print("Starting web search report generation...")
+    status("Initializing report generation")
+
+    # Generate header image first
+    
+    
+    # Initialize the models
+    model = cached_chat_model()
+    relevance_model = CascadeChatModel("relevance") if MODEL_CASCADE else model
+    store = get_article_store()
+    
+    # Step 1: Use articles the ingester already analyzed, or perform the search
+    warm = store.recent(query, TIME_RANGE_SECONDS.get(time, TIME_RANGE_SECONDS["day"]), MAX_ARTICLES) if store is not None else []
+    if len(warm) >= MAX_ARTICLES:
+        status(f"Using {len(warm)} pre-analyzed articles about '{query}'")
+        search_results = [{"title": item["title"], "link": item["url"], "snippet": item["snippet"]} for item in warm]
+    else:
+        print(f"Searching for: {query}")
+        search_results = cached("search", (query.lower(), num_results, time),
+                                lambda: tavily_news_search(query, TAVILY_API_KEY, num_results, time=time))
+
+    if not search_results:
+        status("No results found. Please try a different query.")
+        return {
+            "report": "The search didn't return any results.",
+        }
+    
+    # Step 2-4: Process the results, digesting each accepted article in map_reduce mode
+    results_data = _map_articles(model, relevance_model, query, search_results, mode, partial_callback, store)
     
     # Step 5: Generate the report
     print("Generating final report...")
-    summary_model = chat_model(max_tokens=7000, temperature=0.5, model_name="gemini-2.5-pro-preview-05-06")
-    report_md = generate_report(summary_model, query, results_data, status_callback)
-    header_image, image_prompt = generate_header_image(report_md, status_callback)
-    if status_callback:
-        status_callback("Report generation complete")
+    if MODEL_CASCADE:
+        summary_model = CascadeChatModel("report", max_tokens=7000, temperature=0.5, check=check_report)
+    else:
+        summary_model = cached_chat_model(max_tokens=7000, temperature=0.5, model_name="gemini-2.5-pro-preview-05-06")
+    if mode == "map_reduce":
+        report_md = synthesize_report(summary_model, query, [data["digest"] for data in results_data])
+    else:
+        report_md = generate_report(summary_model, query, results_data)
+    header_image, image_prompt = generate_header_image(report_md)
+    status("Report generation complete")
     
     return {
         "report": report_md,
@@ -0,0 +1,164 @@
+"""Background news ingestion for a company watchlist.
+
+Reports are cheaper when their articles were analyzed before anyone asked.
+The ingester polls Tavily for every query on a watchlist on a fixed
+interval. Each article not seen yet for that query is fetched, checked for
+relevance, and analyzed for sentiment and a digest. The result goes into an
+ArticleStore (see article_store.py). With ``ARTICLE_STORE_PATH`` pointing at
+the same file, ``web_search_report`` assembles reports from these warm
+analyses and only fetches what the ingester has not seen.
+
+Usage:
+    python ingest.py --watchlist watchlist.txt --db articles.db [--interval 900] [--once]
+    python ingest.py --db articles.db --search "Rema 1000"
+
+The watchlist file has one query per line; blank lines and lines starting
+with # are ignored.
+"""
+import argparse
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import context_budget
+import graph
+from article_store import ArticleStore
+
+INGEST_WATCHLIST = os.environ.get("INGEST_WATCHLIST")
+INGEST_INTERVAL_SECONDS = int(os.environ.get("INGEST_INTERVAL_SECONDS", 900))
+# Search results fetched per query and poll
+INGEST_RESULTS = int(os.environ.get("INGEST_RESULTS", 10))
+
+
+def load_watchlist(path: str) -> List[str]:
+    """Read queries from a watchlist file, one per line."""
+    with open(path) as f:
+        lines = (line.strip() for line in f)
+        return [line for line in lines if line and not line.startswith("#")]
+
+
+def ingest_query(store: ArticleStore, query: str, num_results: int = INGEST_RESULTS, time_range: str = "day",
+                 mode: str = graph.REPORT_MODE) -> Dict[str, int]:
+    """
+    Search for ``query`` and analyze every result not yet stored for it.
+
+    Args:
+        store: ArticleStore receiving the articles and analyses
+        query: Watchlist query
+        num_results: Number of search results to check
+        time_range: Tavily time range
+        mode: Report mode the analyses are made for ("map_reduce" adds digests)
+
+    Returns:
+        Counts of search results, already seen articles, new articles and new relevant articles
+    """
+    model = graph.chat_model()
+    relevance_model = graph.CascadeChatModel("relevance") if graph.MODEL_CASCADE else model
+    results = graph.tavily_news_search(query, graph.TAVILY_API_KEY, num_results, time=time_range)
+    new = [result for result in results if store.analysis(query, result["link"]) is None]
+
+    def process(result):
+        return graph.process_article(model, relevance_model, query, result, mode=mode, store=store)
+
+    with ThreadPoolExecutor(max_workers=graph.ARTICLE_WORKERS) as pool:
+        # Each worker gets a copy of the context so spans nest when traced
+        futures = [pool.submit(contextvars.copy_context().run, process, result) for result in new]
+        processed = [future.result() for future in futures]
+    return {
+        "results": len(results),
+        "seen": len(results) - len(new),
+        "new": len(new),
+        "relevant": sum(1 for data in processed if data is not None),
+    }
+
+
+class Ingester:
+    """Polls a watchlist in a background thread.
+
+    Args:
+        store: ArticleStore receiving the analyses
+        watchlist: Queries to poll
+        interval: Seconds between the start of two polls
+        time_range: Tavily time range searched on each poll
+    """
+
+    def __init__(self, store: ArticleStore, watchlist: List[str], interval: float = INGEST_INTERVAL_SECONDS,
+                 time_range: str = "day"):
+        self.store = store
+        self.watchlist = watchlist
+        self.interval = interval
+        self.time_range = time_range
+        self.last_run: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> Dict[str, Dict[str, int]]:
+        """Ingest every watchlist query once and return the counts per query."""
+        self.last_run = time.time()
+        counts = {}
+        for query in self.watchlist:
+            try:
+                counts[query] = ingest_query(self.store, query, time_range=self.time_range)
+            except Exception as e:
+                # One failing query must not stop the others
+                print(f"Error ingesting '{query}': {str(e)}")
+            else:
+                print(f"Ingested '{query}': {counts[query]}")
+        return counts
+
+    def _run(self):
+        while not self._stop.is_set():
+            start = time.monotonic()
+            self.run_once()
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - start)))
+
+    def start(self) -> "Ingester":
+        self._thread = threading.Thread(target=self._run, name="ingester", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def start_background_ingester() -> Optional[Ingester]:
+    """Start polling INGEST_WATCHLIST into the report's article store, if both are configured."""
+    store = graph.get_article_store()
+    if not INGEST_WATCHLIST or store is None:
+        return None
+    return Ingester(store, load_watchlist(INGEST_WATCHLIST)).start()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest news for a company watchlist into an article store")
+    parser.add_argument("--db", default=graph.ARTICLE_STORE_PATH or "articles.db", help="SQLite article store")
+    parser.add_argument("--watchlist", default=INGEST_WATCHLIST, help="File with one query per line")
+    parser.add_argument("--interval", type=float, default=INGEST_INTERVAL_SECONDS, help="Seconds between polls")
+    parser.add_argument("--time", default="day", choices=("day", "week", "month", "year"))
+    parser.add_argument("--once", action="store_true", help="Poll once and exit")
+    parser.add_argument("--search", help="Full-text search the store instead of ingesting")
+    args = parser.parse_args()
+
+    store = ArticleStore(args.db)
+    if args.search:
+        for hit in store.search(args.search):
+            print(f"{hit['title']}\n  {hit['url']}\n  {hit['excerpt']}\n")
+    elif not args.watchlist:
+        parser.error("--watchlist or INGEST_WATCHLIST is required")
+    else:
+        context_budget.get_tokenizer()
+        ingester = Ingester(store, load_watchlist(args.watchlist), args.interval, args.time)
+        if args.once:
+            ingester.run_once()
+        else:
+            ingester.start()
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                ingester.stop()
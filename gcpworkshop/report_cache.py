@@ -0,0 +1,171 @@
+"""Single-flight caches shared by concurrent reports.
+
+Reports generated together, such as a batch (see batch_report.py), often
+search for, fetch and analyze the same articles. A ``ReportCaches`` passed to
+``web_search_report(caches=...)`` answers repeated searches, page
+extractions and identical LLM prompts from memory. When two reports need the
+same missing entry at the same time, one computes it and the other waits for
+that result.
+
+The caches are active only in the context of the report they were passed
+to, through a context variable that article worker threads inherit. Other
+reports running in the same process, e.g. from the web app, are not affected.
+"""
+import contextlib
+import contextvars
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from tracing import annotate
+
+NO_USAGE = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+
+
+class SingleFlightCache:
+    """In-memory memo where concurrent callers of a missing key share one computation.
+
+    Entries are kept for the lifetime of the batch. If the computing caller
+    raises, the error is not cached and the next waiter computes again.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self._values: Dict[Any, Any] = {}
+        self._inflight: Dict[Any, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute: Callable[[], Any]) -> Tuple[Any, str]:
+        """Return (value, outcome) where outcome is "hit", "shared" or "miss"."""
+        while True:
+            with self._lock:
+                if key in self._values:
+                    self.hits += 1
+                    return self._values[key], "hit"
+                event = self._inflight.get(key)
+                leader = event is None
+                if leader:
+                    event = self._inflight[key] = threading.Event()
+            if leader:
+                break
+            event.wait()
+            with self._lock:
+                if key in self._values:
+                    self.shared += 1
+                    return self._values[key], "shared"
+        try:
+            value = compute()
+            with self._lock:
+                self._values[key] = value
+                self.misses += 1
+            return value, "miss"
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            event.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "shared": self.shared, "misses": self.misses, "entries": len(self._values)}
+
+
+def _prompt_text(messages) -> str:
+    return messages if isinstance(messages, str) else "\n".join(str(message.content) for message in messages)
+
+
+def _without_usage(response):
+    # A cached answer costs no tokens, so it must not count them again
+    if hasattr(response, "usage_metadata") and response.usage_metadata:
+        return response.model_copy(update={"usage_metadata": dict(NO_USAGE)})
+    return response
+
+
+class CachedChatModel:
+    """Chat model wrapper answering repeated prompts from a shared cache."""
+
+    def __init__(self, model, cache: SingleFlightCache, key: Tuple):
+        self.model = model
+        self.cache = cache
+        self.key = key
+
+    def invoke(self, messages, call: Optional[Callable] = None):
+        """Answer from the cache, invoking the model through ``call`` (e.g. a client policy) only on a miss."""
+        call = call or (lambda func, *args: func(*args))
+        response, outcome = self.cache.get_or_compute(self.key + (_prompt_text(messages),),
+                                                      lambda: call(self.model.invoke, messages))
+        annotate(llm_cache=outcome)
+        return response if outcome == "miss" else _without_usage(response)
+
+    def with_structured_output(self, schema, include_raw=False):
+        return CachedStructuredModel(self.model.with_structured_output(schema, include_raw=include_raw), self.cache,
+                                     self.key + (schema.__name__, include_raw))
+
+
+class CachedStructuredModel:
+    """Structured output counterpart of CachedChatModel."""
+
+    def __init__(self, model, cache: SingleFlightCache, key: Tuple):
+        self.model = model
+        self.cache = cache
+        self.key = key
+
+    def invoke(self, messages, call: Optional[Callable] = None):
+        call = call or (lambda func, *args: func(*args))
+        output, outcome = self.cache.get_or_compute(self.key + (_prompt_text(messages),),
+                                                    lambda: call(self.model.invoke, messages))
+        annotate(llm_cache=outcome)
+        if outcome != "miss" and isinstance(output, dict) and "raw" in output:
+            output = dict(output, raw=_without_usage(output["raw"]))
+        return output
+
+
+class ReportCaches:
+    """The search, fetch and LLM caches shared by a group of reports."""
+
+    NAMES = ("search", "fetch", "llm")
+
+    def __init__(self):
+        self.caches = {name: SingleFlightCache(name) for name in self.NAMES}
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {name: cache.stats() for name, cache in self.caches.items()}
+
+
+_ACTIVE: contextvars.ContextVar[Optional[ReportCaches]] = contextvars.ContextVar("report_caches", default=None)
+
+
+@contextlib.contextmanager
+def use_caches(caches: Optional[ReportCaches]):
+    """Make ``caches`` the active caches for the duration of the block."""
+    token = _ACTIVE.set(caches)
+    try:
+        yield caches
+    finally:
+        _ACTIVE.reset(token)
+
+
+def cached(name: str, key, compute: Callable[[], Any]) -> Any:
+    """Return ``compute()`` through the active cache called ``name``, or directly if none is active.
+
+    The span is annotated with ``<name>_cache`` set to "hit", "shared" or "miss".
+    """
+    caches = _ACTIVE.get()
+    if caches is None:
+        return compute()
+    value, outcome = caches.caches[name].get_or_compute(key, compute)
+    annotate(**{f"{name}_cache": outcome})
+    return value
+
+
+def cached_model(model, key: Tuple):
+    """Wrap a chat model so it answers from the active LLM cache, if any.
+
+    Args:
+        model: Chat model to wrap
+        key: Identifies the model's settings; the prompt is added per call
+    """
+    caches = _ACTIVE.get()
+    return model if caches is None else CachedChatModel(model, caches.caches["llm"], key)
+
@@ -0,0 +1,185 @@
+"""Lightweight tracing spans for the report pipeline.
+
+Each pipeline stage opens a span with start and end timestamps and
+attributes such as tokens, bytes and cache hits. Spans nest through a
+context variable, so a fetch opened while an article is processed becomes
+that article's child. A span can carry a human-readable message. The
+tracer forwards it to the status callback, so the progress messages shown
+in the web view are derived from the trace.
+
+A finished trace exports as Chrome trace JSON (open it in
+chrome://tracing or Perfetto) or as OTLP-style span dicts.
+"""
+import contextlib
+import contextvars
+import itertools
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+_current_tracer = contextvars.ContextVar("tracer", default=None)
+_current_span = contextvars.ContextVar("span", default=None)
+
+
+class Span:
+    """One timed stage of the pipeline."""
+
+    def __init__(self, name: str, span_id: int, parent_id: Optional[int], message: Optional[str], attrs: Dict[str, Any]):
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.message = message
+        self.attrs = attrs
+        self.thread_id = threading.get_ident()
+        self.start = time.time()
+        self.end: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def set(self, **attrs):
+        """Add or update attributes, e.g. ``span.set(tokens=120, cache="hit")``."""
+        self.attrs.update(attrs)
+
+    @property
+    def duration(self) -> float:
+        return ((self.end or time.time()) - self.start)
+
+
+class Tracer:
+    """Collects the spans of one report.
+
+    Args:
+        status_callback: Optional callback receiving the message of every
+            span and status event, in the order they happen.
+    """
+
+    def __init__(self, status_callback: Optional[Callable] = None):
+        self.trace_id = uuid.uuid4().hex
+        self.status_callback = status_callback
+        self.spans: List[Span] = []
+        self.events: List[Dict[str, Any]] = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def status(self, message: str, **attrs):
+        """Record a point-in-time event and forward its message to the status callback."""
+        parent = _current_span.get()
+        with self._lock:
+            self.events.append({"time": time.time(), "message": message, "thread_id": threading.get_ident(),
+                                "parent_id": parent.span_id if parent else None, "attrs": attrs})
+        if self.status_callback:
+            self.status_callback(message)
+
+    @contextlib.contextmanager
+    def span(self, name: str, message: Optional[str] = None, **attrs):
+        parent = _current_span.get()
+        with self._lock:
+            span = Span(name, next(self._ids), parent.span_id if parent else None, message, attrs)
+            self.spans.append(span)
+        if message and self.status_callback:
+            self.status_callback(message)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.error = str(e)
+            raise
+        finally:
+            span.end = time.time()
+            _current_span.reset(token)
+
+    @contextlib.contextmanager
+    def activate(self):
+        """Make this tracer current, so module-level ``span`` and ``status`` use it."""
+        token = _current_tracer.set(self)
+        try:
+            yield self
+        finally:
+            _current_tracer.reset(token)
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """Export as Chrome trace event JSON, timestamps in microseconds."""
+        origin = min([span.start for span in self.spans] + [event["time"] for event in self.events], default=0.0)
+        pid = os.getpid()
+        events = []
+        for span in self.spans:
+            args = dict(span.attrs, span_id=span.span_id, parent_id=span.parent_id)
+            if span.message:
+                args["message"] = span.message
+            if span.error:
+                args["error"] = span.error
+            events.append({"name": span.name, "cat": "pipeline", "ph": "X", "pid": pid, "tid": span.thread_id,
+                           "ts": (span.start - origin) * 1e6, "dur": span.duration * 1e6, "args": args})
+        for event in self.events:
+            events.append({"name": event["message"], "cat": "status", "ph": "i", "s": "t", "pid": pid,
+                           "tid": event["thread_id"], "ts": (event["time"] - origin) * 1e6, "args": event["attrs"]})
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"trace_id": self.trace_id}}
+
+    def to_otlp(self) -> List[Dict[str, Any]]:
+        """Export as OTLP-style span dicts with nanosecond timestamps."""
+        return [{
+            "traceId": self.trace_id,
+            "spanId": f"{span.span_id:016x}",
+            "parentSpanId": f"{span.parent_id:016x}" if span.parent_id else "",
+            "name": span.name,
+            "startTimeUnixNano": int(span.start * 1e9),
+            "endTimeUnixNano": int((span.end or time.time()) * 1e9),
+            "attributes": span.attrs,
+            "status": {"code": "ERROR", "message": span.error} if span.error else {"code": "OK"},
+        } for span in self.spans]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Call count, total seconds and summed numeric attributes per span name."""
+        totals: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        for span in self.spans:
+            total = totals[span.name]
+            total["calls"] += 1
+            total["seconds"] += span.duration
+            for key, value in span.attrs.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    total[key] += value
+        return {name: dict(total) for name, total in totals.items()}
+
+
+def current_tracer() -> Optional[Tracer]:
+    return _current_tracer.get()
+
+
+@contextlib.contextmanager
+def span(name: str, message: Optional[str] = None, **attrs):
+    """Open a span on the current tracer, or a detached one if there is none."""
+    tracer = _current_tracer.get()
+    if tracer is None:
+        yield Span(name, 0, None, message, attrs)
+        return
+    with tracer.span(name, message, **attrs) as current:
+        yield current
+
+
+def status(message: str, **attrs):
+    """Send a status message through the current tracer, if any."""
+    tracer = _current_tracer.get()
+    if tracer is not None:
+        tracer.status(message, **attrs)
+
+
+def annotate(**attrs):
+    """Set attributes on the current span, if any, e.g. ``annotate(llm_cache="hit")``."""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attrs)
+
+
+def record_usage(current: Span, response):
+    """Copy token usage from a LangChain response onto a span."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage:
+        current.set(input_tokens=usage.get("input_tokens", 0), output_tokens=usage.get("output_tokens", 0))
+    metadata = getattr(response, "response_metadata", None) or {}
+    if "escalations" in metadata:
+        # Answered by a model cascade
+        current.set(model=metadata["model_name"], confidence=metadata["confidence"], escalations=metadata["escalations"])
+        if metadata.get("rejected"):
+            current.set(rejected=metadata["rejected"])
@@ -1,17 +1,58 @@
 from flask import Flask, render_template_string, request, jsonify, Response
 import markdown2
-from graph import web_search_report
+from graph import configure_parse_pool, web_search_report
+import context_budget
 import time
 import queue
 import threading
 import uuid
 import json
+import os
 
 app = Flask(__name__)
 
 # Store for active report generation sessions
 sessions = {}
 
+# Queued in place of a status message when a partial report or the final
+# report is ready. Status messages are free text, so they cannot double as
+# signals.
+PARTIAL = object()
+COMPLETE = object()
+
+_services_lock = threading.Lock()
+_services_started = False
+
+@app.before_request
+def start_services():
+    """
+    Start the page parsing pool and the background ingester, once per process.
+    
+    Runs before the first request, so the services start under any WSGI
+    server, and with the debug reloader only in the process that serves
+    requests.
+    """
+    global _services_started
+    if _services_started:
+        return
+    with _services_lock:
+        if _services_started:
+            return
+        _services_started = True
+        try:
+            # Parse article HTML in worker processes so parsing does not hold the
+            # GIL on request threads. PARSE_WORKERS=0 parses in the request thread.
+            configure_parse_pool(int(os.environ.get("PARSE_WORKERS", os.cpu_count() or 1)), warm=True)
+            # Load the tokenizer now, not inside the first report
+            context_budget.get_tokenizer()
+            # Keep the article store warm when INGEST_WATCHLIST and
+            # ARTICLE_STORE_PATH are set
+            from ingest import start_background_ingester
+            start_background_ingester()
+        except Exception as e:
+            # Reports still work, parsing in the request thread without warm articles
+            print(f"Error starting background services: {str(e)}")
+
 HTML_TEMPLATE = """
 <!DOCTYPE html>
 <html>
@@ -93,6 +134,12 @@ HTML_TEMPLATE = """
             margin-bottom: 0.5rem;
         }
         
+        .partial-report {
+            opacity: 0.7;
+            border-left: 4px solid #ccc;
+            padding-left: 1rem;
+        }
+        
         .report-date {
             text-align: center;
             color: #666;
@@ -140,7 +187,11 @@ HTML_TEMPLATE = """
                     eventSource.onmessage = function(event) {
                         const data = JSON.parse(event.data);
                         
-                        if (data.status === "complete") {
+                        if (data.status === "partial") {
+                            // Preview of the articles digested so far
+                            document.getElementById("report-container").innerHTML =
+                                `<div class="partial-report">${data.report}</div>`;
+                        } else if (data.status === "complete") {
                             // Report is complete
                             document.getElementById("spinner").style.display = "none";
                             
@@ -232,7 +283,9 @@ def start_report():
         "queue": message_queue,
         "report": None,
         "header_image": None,
-        "image_prompt": None
+        "image_prompt": None,
+        "partial_report": None,
+        "trace": None
     }
     
     # Start report generation in a background thread
@@ -240,13 +293,20 @@ def start_report():
         def status_callback(message):
             message_queue.put(message)
         
-        result = web_search_report(query, 10, time="week", status_callback=status_callback)
-        report_html = markdown2.markdown(result["report"])
+        def partial_callback(markdown):
+            # Built from scraped titles and text, so raw HTML in it is escaped
+            sessions[session_id]["partial_report"] = markdown2.markdown(markdown, safe_mode="escape")
+            message_queue.put(PARTIAL)
+        
+        result = web_search_report(query, 10, time="week", status_callback=status_callback,
+                                   partial_callback=partial_callback)
+        report_html = markdown2.markdown(result["report"], safe_mode="escape")
         
         sessions[session_id]["report"] = report_html
         sessions[session_id]["header_image"] = result["header_image"]
         sessions[session_id]["image_prompt"] = result["image_prompt"]
-        message_queue.put("complete")
+        sessions[session_id]["trace"] = result["trace"]
+        message_queue.put(COMPLETE)
     
     thread = threading.Thread(target=generate_report)
     thread.daemon = True
@@ -266,7 +326,7 @@ def status_stream(session_id):
         while True:
             message = queue_obj.get()
             
-            if message == "complete":
+            if message is COMPLETE:
                 data = {
                     "status": "complete",
                     "report": session_data["report"],
@@ -276,6 +336,14 @@ def status_stream(session_id):
                 yield f"data: {json.dumps(data)}\n\n"
                 break
             
+            if message is PARTIAL:
+                data = {
+                    "status": "partial",
+                    "report": session_data["partial_report"]
+                }
+                yield f"data: {json.dumps(data)}\n\n"
+                continue
+            
             data = {
                 "status": "progress",
                 "message": message
@@ -284,5 +352,14 @@ def status_stream(session_id):
     
     return Response(generate(), mimetype="text/event-stream")
 
+@app.route("/trace/<session_id>")
+def trace(session_id):
+    """Chrome trace JSON of a finished report, for chrome://tracing or Perfetto."""
+    if session_id not in sessions:
+        return jsonify({"error": "Invalid session ID"}), 404
+    if sessions[session_id]["trace"] is None:
+        return jsonify({"error": "Report not finished"}), 404
+    return jsonify(sessions[session_id]["trace"])
+
 if __name__ == "__main__":
-    app.run(debug=True, threaded=True)
\ No newline at end of file
+    app.run(debug=True, threaded=True)
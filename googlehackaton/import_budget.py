@@ -0,0 +1,41 @@
+"""Cold start import budget for the Streamlit app.
+
+Streamlit runs ``ui.py`` top to bottom before drawing the first widget, so
+everything it imports at module level delays the first page. This script
+imports ``ui`` in a fresh interpreter (Streamlit's bare mode). It fails if
+that takes longer than the budget, or if any module that should only load
+when a trip is planned or drawn got loaded.
+
+Usage:
+    python import_budget.py [budget_seconds]
+"""
+import os
+import sys
+
+from agent_common import import_budget as shared_import_budget
+
+# Loaded on first use: folium when a map is drawn, the routing stack when a
+# route is drawn, and the agent when the first question is asked
+LAZY_MODULES = (
+    "folium",
+    "streamlit_folium",
+    "shapely",
+    "pyproj",
+    "langgraph",
+    "langchain_google_vertexai",
+    "src.agent",
+    "walking_path",
+)
+IMPORT_BUDGET_SECONDS = 1.5
+
+
+def import_budget(module="ui", budget=IMPORT_BUDGET_SECONDS):
+    """Check the cold start cost of importing ``module``, see agent_common/import_budget.py."""
+    return shared_import_budget.import_budget(module, budget, LAZY_MODULES, os.path.dirname(os.path.abspath(__file__)))
+
+
+if __name__ == "__main__":
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else IMPORT_BUDGET_SECONDS
+    result = import_budget(budget=budget)
+    shared_import_budget.print_result(result)
+    sys.exit(0 if result["ok"] else 1)
@@ -0,0 +1,224 @@
+"""One-to-many reachability over the local footway network.
+
+A single bounded Dijkstra search from the snapped origin answers "what can be
+reached within N minutes" for every node at once. Each edge costs its
+profile weight (see ``local_routing.ACCESSIBILITY_PROFILES``) divided by the
+walking speed, so partially accessible footways count as slower. The search
+stops at the time budget. The result is a travel-time field over the nodes,
+an isochrone polygon, and optionally the travel time to each transit stop.
+One search therefore replaces a point-to-point route per candidate
+destination.
+
+Usage:
+    python isochrone.py footway_network/ lon lat minutes [profile]
+"""
+import json
+import os
+import sys
+
+import numpy as np
+import shapely
+
+from local_routing import FootwayNetwork, dijkstra
+from route_geometry import TRANSFORMER_25832_to_4326, to_utm
+from snapping import line_substring
+
+# Default walking speed in meters per second, roughly a manual wheelchair
+WALKING_SPEED = float(os.environ.get("WALKING_SPEED", 0.8))
+# Half-width in meters of the corridor drawn around reached footways
+ISOCHRONE_BUFFER_METERS = float(os.environ.get("ISOCHRONE_BUFFER_METERS", 25))
+
+
+class Isochrone:
+    """Result of a reachability search.
+
+    Attributes:
+        seconds: Travel time in seconds to every node, ``inf`` beyond the budget.
+        budget: The time budget in seconds.
+        polygon: Reached area as a shapely geometry in EPSG:25832.
+        stop_times: Stop id → travel time in seconds for the stops within the
+            budget, or None if no stops were given.
+    """
+
+    def __init__(self, seconds, budget, polygon, stop_times=None):
+        self.seconds = seconds
+        self.budget = budget
+        self.polygon = polygon
+        self.stop_times = stop_times
+
+    def to_geojson(self, precision=6):
+        """Export the polygon as a GeoJSON Feature in WGS84."""
+        polygon = shapely.transform(
+            self.polygon,
+            lambda xy: np.column_stack(TRANSFORMER_25832_to_4326.transform(xy[:, 0], xy[:, 1])),
+        )
+        return {
+            "type": "Feature",
+            "geometry": json.loads(shapely.to_geojson(shapely.set_precision(polygon, 10 ** -precision))),
+            "properties": {"minutes": self.budget / 60, "stops": self.stop_times},
+        }
+
+
+def _edge_start_costs(network, weights, edges, fractions):
+    """Cost from each snapped point to the start and end node of its edge."""
+    edge_weights = np.asarray(weights)[edges]
+    return edge_weights * fractions, edge_weights * (1.0 - fractions)
+
+
+def reached_lines(network, costs, weights, max_cost):
+    """Cut every edge to the part reachable within ``max_cost``.
+
+    An edge is covered from both ends. When the remaining budgets at its two
+    nodes add up to its weight it is reached completely, otherwise only the
+    pieces next to each reached node are.
+
+    Returns:
+        list: Reached line pieces as (n, 2) EPSG:25832 arrays.
+    """
+    weights = np.asarray(weights)
+    edge_u, edge_v = np.asarray(network.edge_u), np.asarray(network.edge_v)
+    remaining_u = np.maximum(max_cost - costs[edge_u], 0.0)
+    remaining_v = np.maximum(max_cost - costs[edge_v], 0.0)
+    usable = np.isfinite(weights) & (weights > 0)
+    touched = usable & ((remaining_u > 0) | (remaining_v > 0))
+
+    lines = []
+    for edge in np.flatnonzero(touched).tolist():
+        coords = network.edge_coords(edge)
+        weight = weights[edge]
+        if remaining_u[edge] + remaining_v[edge] >= weight:
+            lines.append(np.asarray(coords))
+            continue
+        if remaining_u[edge] > 0:
+            lines.append(line_substring(coords, 0.0, remaining_u[edge] / weight))
+        if remaining_v[edge] > 0:
+            lines.append(line_substring(coords, 1.0 - remaining_v[edge] / weight, 1.0))
+    return lines
+
+
+def _search(network, lon, lat, max_cost, profile):
+    """Bounded Dijkstra from a WGS84 point snapped onto an edge usable in ``profile``.
+
+    Returns:
+        tuple: (costs to every node, snapped edge, fraction along it, snap
+            result), with an edge of -1 and no costs if the point could not
+            be snapped.
+    """
+    weights = network.profile_weights(profile)
+    snap = network.snap_lonlat([lon], [lat], profile)
+    edge = int(snap["edge"][0])
+    if edge < 0:
+        return np.full(network.n_nodes, np.inf), edge, 0.0, snap
+    fraction = float(snap["fraction"][0])
+    to_u, to_v = _edge_start_costs(network, weights, [edge], np.array([fraction]))
+    sources = {}
+    for node, cost in ((int(network.edge_u[edge]), to_u[0]), (int(network.edge_v[edge]), to_v[0])):
+        sources[node] = min(cost, sources.get(node, np.inf))
+    return dijkstra(network, sources, weights, max_cost), edge, fraction, snap
+
+
+def snap_stops(network, stops, profile="default"):
+    """Snap (stop_id, lat, lon) stops onto the edges usable in ``profile``."""
+    xy = to_utm([stop[2] for stop in stops], [stop[1] for stop in stops])
+    return network.snapper_for(profile).snap(xy[:, 0], xy[:, 1])
+
+
+def stop_costs(network, costs, profile, stop_snap, origin_edge=-1, origin_fraction=0.0):
+    """Cost to each snapped stop given the node costs of a search.
+
+    Returns:
+        np.ndarray: Cost per stop, ``inf`` if not reached or not snapped.
+    """
+    weights = network.profile_weights(profile)
+    valid = stop_snap["edge"] >= 0
+    stop_edges = np.where(valid, stop_snap["edge"], 0)
+    to_u, to_v = _edge_start_costs(network, weights, stop_edges, stop_snap["fraction"])
+    result = np.minimum(costs[np.asarray(network.edge_u)[stop_edges]] + to_u,
+                        costs[np.asarray(network.edge_v)[stop_edges]] + to_v)
+    if origin_edge >= 0:
+        # A stop on the origin edge is reached along the edge directly
+        same_edge = valid & (stop_edges == origin_edge)
+        direct = np.abs(stop_snap["fraction"] - origin_fraction) * weights[origin_edge]
+        result = np.where(same_edge, np.minimum(result, direct), result)
+    return np.where(valid, result, np.inf)
+
+
+def stop_times(network, lon, lat, minutes, stops, profile="default", speed=WALKING_SPEED, stop_snap=None):
+    """Travel time in seconds from a WGS84 point to every stop, in one search.
+
+    Args:
+        stops: List of (stop_id, lat, lon).
+        stop_snap: Optional result of ``snap_stops`` for ``stops``, to reuse
+            across many origins.
+
+    Returns:
+        np.ndarray: Seconds per stop, ``inf`` beyond the budget.
+    """
+    max_cost = minutes * 60.0 * speed
+    costs, edge, fraction, _ = _search(network, lon, lat, max_cost, profile)
+    if stop_snap is None:
+        stop_snap = snap_stops(network, stops, profile)
+    result = stop_costs(network, costs, profile, stop_snap, edge, fraction)
+    return np.where(result <= max_cost, result / speed, np.inf)
+
+
+def isochrone(network, lon, lat, minutes, profile="default", speed=WALKING_SPEED, stops=None):
+    """Find everything reachable from a WGS84 point within a time budget.
+
+    Args:
+        network: The FootwayNetwork to search.
+        lon, lat: Origin in WGS84.
+        minutes: Time budget.
+        profile: Key of ``local_routing.ACCESSIBILITY_PROFILES``.
+        speed: Walking speed in meters per second.
+        stops: Optional list of (stop_id, lat, lon) transit stops to time,
+            shaped like ``src.node.TRIP_CACHE_STOPS``.
+
+    Returns:
+        Isochrone: The reachability result, with an empty polygon if the
+            origin cannot be snapped.
+    """
+    budget = minutes * 60.0
+    weights = network.profile_weights(profile)
+    max_cost = budget * speed
+
+    costs, edge, fraction, snap = _search(network, lon, lat, max_cost, profile)
+    if edge < 0:
+        return Isochrone(costs, budget, shapely.Polygon(), {} if stops is not None else None)
+
+    lines = reached_lines(network, costs, weights, max_cost)
+    origin_xy = (float(snap["x"][0]), float(snap["y"][0]))
+    for line in (line_substring(network.edge_coords(edge), fraction, 0.0),
+                 line_substring(network.edge_coords(edge), fraction, 1.0)):
+        # The origin edge itself, cut at the budget in both directions
+        lengths = np.concatenate([[0.0], np.cumsum(np.hypot(*np.diff(line, axis=0).T))])
+        if lengths[-1] > 0:
+            reach = min(max_cost / weights[edge] * network.edge_length[edge], lengths[-1])
+            lines.append(line_substring(line, 0.0, reach / lengths[-1]))
+    polygon = shapely.Point(origin_xy).buffer(ISOCHRONE_BUFFER_METERS)
+    if lines:
+        corridors = shapely.buffer(
+            shapely.linestrings(np.concatenate(lines), indices=np.repeat(np.arange(len(lines)),
+                                                                         [len(line) for line in lines])),
+            ISOCHRONE_BUFFER_METERS,
+        )
+        polygon = shapely.union_all(np.append(corridors, polygon))
+
+    times = None
+    if stops is not None:
+        times = {}
+        if stops:
+            reached = stop_costs(network, costs, profile, snap_stops(network, stops, profile), edge, fraction)
+            times = {stop[0]: cost / speed for stop, cost in zip(stops, reached.tolist()) if cost <= max_cost}
+
+    return Isochrone(costs / speed, budget, polygon, times)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (5, 6):
+        print(__doc__)
+        sys.exit(1)
+    network = FootwayNetwork.open(sys.argv[1])
+    profile = sys.argv[5] if len(sys.argv) == 6 else "default"
+    result = isochrone(network, float(sys.argv[2]), float(sys.argv[3]), float(sys.argv[4]), profile)
+    print(json.dumps(result.to_geojson()))
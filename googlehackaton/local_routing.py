@@ -0,0 +1,570 @@
+"""In-process A* routing over the wheelchair-accessibility footway network.
+
+The network is an export of the same table the ``find_astar_path_rullestol``
+RPC routes over (GeoJSON or GeoPackage, EPSG:25832). It is held in flat NumPy
+arrays: node coordinates, a CSR adjacency (``indptr``/``adj_node``/``adj_edge``)
+and every edge geometry concatenated into one coordinate array. The arrays can
+be saved to a directory and memory-mapped on start-up.
+
+Usage:
+    python local_routing.py build footway.geojson footway_network/
+"""
+import heapq
+import json
+import math
+import os
+import sqlite3
+import sys
+
+import numpy as np
+from pyproj import Transformer
+
+from route_geometry import TRANSFORMER_4326_to_25832
+from snapping import EdgeSnapper, line_substring
+
+# Edge attributes kept from the export, besides the geometry
+GATETYPE_COLUMN = "gatetype"
+IMAGE_COLUMN = "bildefil1"
+ACCESSIBILITY_COLUMNS = (
+    "tilgjengvurderingrullestol",
+    "tilgjengvurderingelrullestol",
+    "tilgjengvurderingsyn",
+)
+
+# Accepted ratings per accessibility column for each routing profile. The
+# "default" profile routes over every edge of the export.
+ACCESSIBLE = ("Tilgjengelig", "Delvis tilgjengelig")
+ACCESSIBILITY_PROFILES = {
+    "default": {},
+    "manual_wheelchair": {"tilgjengvurderingrullestol": ACCESSIBLE},
+    "electric_wheelchair": {"tilgjengvurderingelrullestol": ACCESSIBLE},
+    "low_vision": {"tilgjengvurderingsyn": ACCESSIBLE},
+    "manual_wheelchair_low_vision": {"tilgjengvurderingrullestol": ACCESSIBLE,
+                                     "tilgjengvurderingsyn": ACCESSIBLE},
+    "electric_wheelchair_low_vision": {"tilgjengvurderingelrullestol": ACCESSIBLE,
+                                       "tilgjengvurderingsyn": ACCESSIBLE},
+}
+# Cost multiplier for edges rated "Delvis tilgjengelig" in a profile's columns
+PARTIAL_PENALTY = 1.5
+
+# Endpoints closer than this (in meters) are treated as the same node
+NODE_TOLERANCE = 0.01
+
+# Heap entry marking that the destination itself has been reached
+_FINISH = -1
+
+
+class FootwayNetwork:
+    """Array-backed footway graph with A* queries.
+
+    Attributes:
+        node_xy: (n_nodes, 2) node coordinates in EPSG:25832.
+        indptr: (n_nodes + 1,) CSR row pointers into ``adj_node``/``adj_edge``.
+        adj_node: Neighbour node of each adjacency entry.
+        adj_edge: Edge id of each adjacency entry.
+        edge_u, edge_v: Start and end node of each edge, in geometry order.
+        edge_length: Length of each edge in meters.
+        coords: All edge vertices concatenated, ``coord_offsets`` delimits edges.
+        gatetype_codes: Index into ``gatetypes`` for each edge.
+        images: ``bildefil1`` of each edge, empty string if missing.
+        attributes: Accessibility column name → (codes, vocabulary).
+        landmarks: Optional ``routing_index.LandmarkIndex`` used to tighten
+            the A* heuristic.
+        profile_mask: Per-edge bitmask, bit ``i`` set when the edge is usable
+            in the ``i``-th entry of ACCESSIBILITY_PROFILES.
+    """
+
+    ARRAYS = ("node_xy", "indptr", "adj_node", "adj_edge", "edge_u", "edge_v",
+              "edge_length", "coords", "coord_offsets", "gatetype_codes", "images")
+
+    def __init__(self, arrays, gatetypes, attributes):
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+        self.gatetypes = gatetypes
+        self.attributes = attributes
+        self.landmarks = None
+        self._snappers = {}
+        self.profile_mask = self._build_profile_mask()
+        self._profile_weights = {profile: self._build_profile_weights(profile)
+                                 for profile in ACCESSIBILITY_PROFILES}
+
+    @property
+    def n_nodes(self):
+        return len(self.node_xy)
+
+    @property
+    def n_edges(self):
+        return len(self.edge_length)
+
+    # ------------------------------------------------------------------ loading
+    @classmethod
+    def from_features(cls, features, crs="EPSG:25832"):
+        """Build the network from (LineString coordinates, properties) pairs."""
+        transformer = None
+        if crs != "EPSG:25832":
+            transformer = Transformer.from_crs(crs, "EPSG:25832", always_xy=True)
+
+        lines, props = [], []
+        for line, properties in features:
+            line = np.asarray(line, dtype=np.float64)[:, :2]
+            if len(line) < 2:
+                continue
+            if transformer is not None:
+                line = np.column_stack(transformer.transform(line[:, 0], line[:, 1]))
+            lines.append(line)
+            props.append(properties or {})
+        if not lines:
+            raise ValueError("The footway export contains no line features")
+
+        coord_offsets = np.zeros(len(lines) + 1, dtype=np.int64)
+        coord_offsets[1:] = np.cumsum([len(line) for line in lines])
+        coords = np.concatenate(lines)
+
+        starts = coords[coord_offsets[:-1]]
+        ends = coords[coord_offsets[1:] - 1]
+        endpoints = np.round(np.concatenate([starts, ends]) / NODE_TOLERANCE).astype(np.int64)
+        _, first, inverse = np.unique(endpoints, axis=0, return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        node_xy = np.concatenate([starts, ends])[first]
+        n_edges = len(lines)
+        edge_u = inverse[:n_edges].astype(np.int32)
+        edge_v = inverse[n_edges:].astype(np.int32)
+
+        steps = np.diff(coords, axis=0)
+        step_lengths = np.hypot(steps[:, 0], steps[:, 1])
+        # Zero out the jumps between consecutive edges before summing per edge
+        step_lengths[coord_offsets[1:-1] - 1] = 0.0
+        cumulative = np.concatenate([[0.0], np.cumsum(step_lengths)])
+        edge_length = cumulative[coord_offsets[1:] - 1] - cumulative[coord_offsets[:-1]]
+
+        indptr, adj_node, adj_edge = build_csr(len(node_xy), edge_u, edge_v)
+
+        gatetypes = sorted({str(p.get(GATETYPE_COLUMN) or "N/A") for p in props})
+        gatetype_index = {name: i for i, name in enumerate(gatetypes)}
+        attributes = {}
+        for column in ACCESSIBILITY_COLUMNS:
+            vocabulary = sorted({str(p.get(column) or "") for p in props})
+            index = {value: i for i, value in enumerate(vocabulary)}
+            codes = np.array([index[str(p.get(column) or "")] for p in props], dtype=np.int16)
+            attributes[column] = (codes, vocabulary)
+
+        arrays = {
+            "node_xy": node_xy,
+            "indptr": indptr,
+            "adj_node": adj_node,
+            "adj_edge": adj_edge,
+            "edge_u": edge_u,
+            "edge_v": edge_v,
+            "edge_length": edge_length,
+            "coords": coords,
+            "coord_offsets": coord_offsets,
+            "gatetype_codes": np.array(
+                [gatetype_index[str(p.get(GATETYPE_COLUMN) or "N/A")] for p in props], dtype=np.int16),
+            "images": np.array([str(p.get(IMAGE_COLUMN) or "") for p in props]),
+        }
+        return cls(arrays, gatetypes, attributes)
+
+    @classmethod
+    def from_file(cls, path, layer=None):
+        """Load the network from a GeoJSON or GeoPackage export."""
+        if path.lower().endswith(".gpkg"):
+            features, crs = read_geopackage(path, layer)
+        else:
+            features, crs = read_geojson(path)
+        return cls.from_features(features, crs=crs)
+
+    def save(self, directory):
+        """Write the arrays to ``directory`` so they can be memory-mapped by ``load``."""
+        os.makedirs(directory, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        for column, (codes, _) in self.attributes.items():
+            np.save(os.path.join(directory, f"attr_{column}.npy"), codes)
+        with open(os.path.join(directory, "vocabulary.json"), "w") as f:
+            json.dump({
+                "gatetypes": self.gatetypes,
+                "attributes": {column: vocab for column, (_, vocab) in self.attributes.items()},
+            }, f)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Load a network saved with ``save``, memory-mapping the arrays by default."""
+        mmap_mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+                  for name in cls.ARRAYS}
+        with open(os.path.join(directory, "vocabulary.json")) as f:
+            vocabulary = json.load(f)
+        attributes = {
+            column: (np.load(os.path.join(directory, f"attr_{column}.npy"), mmap_mode=mmap_mode), vocab)
+            for column, vocab in vocabulary["attributes"].items()
+        }
+        return cls(arrays, vocabulary["gatetypes"], attributes)
+
+    @classmethod
+    def open(cls, path):
+        """Load a saved network directory, or build one from a GeoJSON/GeoPackage file."""
+        if os.path.isdir(path):
+            return cls.load(path)
+        return cls.from_file(path)
+
+    # ------------------------------------------------------------------ queries
+    def _build_profile_mask(self):
+        mask = np.zeros(self.n_edges, dtype=np.uint8)
+        for bit, requirements in enumerate(ACCESSIBILITY_PROFILES.values()):
+            valid = np.ones(self.n_edges, dtype=bool)
+            for column, accepted in requirements.items():
+                codes, vocabulary = self.attributes[column]
+                accepted_codes = [i for i, value in enumerate(vocabulary) if value in accepted]
+                valid &= np.isin(codes, accepted_codes)
+            mask |= valid.astype(np.uint8) << bit
+        return mask
+
+    def _build_profile_weights(self, profile):
+        bit = list(ACCESSIBILITY_PROFILES).index(profile)
+        valid = (self.profile_mask >> bit) & 1 == 1
+        weights = np.where(valid, np.asarray(self.edge_length), np.inf)
+        for column in ACCESSIBILITY_PROFILES[profile]:
+            codes, vocabulary = self.attributes[column]
+            if "Delvis tilgjengelig" in vocabulary:
+                weights[np.asarray(codes) == vocabulary.index("Delvis tilgjengelig")] *= PARTIAL_PENALTY
+        return weights
+
+    def profile_weights(self, profile="default"):
+        """Per-edge costs for an accessibility profile.
+
+        Unusable edges cost ``inf`` and partially accessible edges are
+        penalised. The vectors are computed when the network is loaded, so
+        switching profiles is a dictionary lookup with no graph rebuild.
+        """
+        if profile not in self._profile_weights:
+            raise ValueError(f"Unknown accessibility profile: {profile}")
+        return self._profile_weights[profile]
+
+    def snapper_for(self, profile="default"):
+        """Spatial index over the edges usable in a profile, built on first use."""
+        if profile not in self._snappers:
+            edges = None
+            if ACCESSIBILITY_PROFILES[profile]:
+                edges = np.flatnonzero(np.isfinite(self.profile_weights(profile)))
+            self._snappers[profile] = EdgeSnapper(self, edges)
+        return self._snappers[profile]
+
+    @property
+    def snapper(self):
+        """Spatial index over every edge and node, built on first use."""
+        return self.snapper_for("default")
+
+    def nearest_node(self, x, y):
+        """Return the id of the node closest to an EPSG:25832 coordinate."""
+        return int(self.snapper.nearest_nodes([x], [y])[0])
+
+    def _straight_line(self, target):
+        node_xy = self.node_xy
+        tx, ty = node_xy[target]
+
+        def heuristic(node):
+            x, y = node_xy[node]
+            return math.hypot(x - tx, y - ty)
+
+        return heuristic
+
+    def astar(self, source, target, weights=None, use_landmarks=True):
+        """Shortest path between two nodes or sets of nodes.
+
+        Args:
+            source: Start node id, or dict of node id → initial cost, e.g. the
+                two ends of the edge a start point was snapped to.
+            target: End node id, or dict of node id → remaining cost from that
+                node to the destination.
+            weights: Optional per-edge cost array, defaults to ``edge_length``.
+                Costs must be at least the edge length for the heuristic to
+                stay admissible.
+            use_landmarks: Use the landmark index, if one is attached.
+
+        Returns:
+            tuple: (node ids, edge ids) along the path, or (None, None) if unreachable.
+        """
+        # Plain ndarray views: indexing a memmap is several times slower
+        weights = np.asarray(self.edge_length if weights is None else weights)
+        indptr, adj_node, adj_edge = (np.asarray(array) for array in (self.indptr, self.adj_node, self.adj_edge))
+        sources = source if isinstance(source, dict) else {source: 0.0}
+        targets = target if isinstance(target, dict) else {target: 0.0}
+
+        first_source = next(iter(sources))
+        bounds = []
+        for target_node, remaining in targets.items():
+            if use_landmarks and self.landmarks is not None:
+                bounds.append((self.landmarks.lower_bound(target_node, first_source), remaining))
+            else:
+                bounds.append((self._straight_line(target_node), remaining))
+        if len(bounds) == 1 and bounds[0][1] == 0.0:
+            heuristic = bounds[0][0]
+        elif len(bounds) == 1:
+            bound, remaining = bounds[0]
+
+            def heuristic(node):
+                return bound(node) + remaining
+        else:
+            def heuristic(node):
+                return min(bound(node) + remaining for bound, remaining in bounds)
+
+        best, parent, heap = {}, {}, []
+        for node, cost in sources.items():
+            best[node] = cost
+            parent[node] = (-1, -1)
+            heap.append((cost + heuristic(node), cost, node))
+        heapq.heapify(heap)
+        finish = None
+        closed = set()
+        while heap:
+            _, cost, node = heapq.heappop(heap)
+            if node == _FINISH:
+                return self._unwind(parent, finish[1])
+            if node in closed:
+                continue
+            closed.add(node)
+            if node in targets:
+                total = cost + targets[node]
+                if finish is None or total < finish[0]:
+                    finish = (total, node)
+                    heapq.heappush(heap, (total, total, _FINISH))
+            start, end = indptr[node], indptr[node + 1]
+            edges = adj_edge[start:end]
+            for neighbour, edge, weight in zip(adj_node[start:end].tolist(), edges.tolist(), weights[edges].tolist()):
+                new_cost = cost + weight
+                if new_cost < best.get(neighbour, math.inf):
+                    best[neighbour] = new_cost
+                    parent[neighbour] = (node, edge)
+                    heapq.heappush(heap, (new_cost + heuristic(neighbour), new_cost, neighbour))
+        return None, None
+
+    @staticmethod
+    def _unwind(parent, target):
+        nodes, edges = [target], []
+        node = target
+        while parent[node][0] != -1:
+            node, edge = parent[node]
+            nodes.append(node)
+            edges.append(edge)
+        return nodes[::-1], edges[::-1]
+
+    def segments(self, nodes, edges):
+        """Turn a path into segments shaped like the RPC output.
+
+        Each segment has ``geom_geojson`` (an EPSG:25832 LineString oriented in
+        travel direction), ``gatetype`` and ``bildefil1``.
+        """
+        segments = []
+        for from_node, edge in zip(nodes, edges):
+            line = self.edge_coords(edge)
+            if self.edge_u[edge] != from_node:
+                line = line[::-1]
+            segments.append(self._segment(edge, line))
+        return segments
+
+    def edge_coords(self, edge):
+        return self.coords[self.coord_offsets[edge]:self.coord_offsets[edge + 1]]
+
+    def _segment(self, edge, line):
+        return {
+            "geom_geojson": {"type": "LineString", "coordinates": np.asarray(line).tolist()},
+            "gatetype": self.gatetypes[self.gatetype_codes[edge]],
+            "bildefil1": str(self.images[edge]) or None,
+        }
+
+    def snap_lonlat(self, lons, lats, profile="default"):
+        """Snap arrays of WGS84 coordinates to the network in one lookup.
+
+        Points are only snapped to edges usable in ``profile``.
+
+        Returns:
+            dict: ``EdgeSnapper.snap`` arrays for the points.
+        """
+        xs, ys = TRANSFORMER_4326_to_25832.transform(np.asarray(lons, dtype=np.float64),
+                                                     np.asarray(lats, dtype=np.float64))
+        return self.snapper_for(profile).snap(xs, ys)
+
+    def route_snapped(self, start_edge, start_fraction, end_edge, end_fraction, weights=None):
+        """Route between two points already snapped onto edges.
+
+        The search starts from both ends of the start edge and finishes at
+        either end of the end edge. The returned first and last segments are
+        trimmed to the snapped points.
+
+        Returns:
+            list: Segments in the same shape as ``find_astar_path_rullestol``,
+                empty if no route exists or either point was not snapped
+                (edge -1).
+        """
+        weights = self.edge_length if weights is None else weights
+        start_edge, end_edge = int(start_edge), int(end_edge)
+        if start_edge < 0 or end_edge < 0:
+            return []
+        start_cost = weights[start_edge]
+        end_cost = weights[end_edge]
+        if not (math.isfinite(start_cost) and math.isfinite(end_cost)):
+            return []
+
+        sources = {}
+        for node, fraction in ((int(self.edge_u[start_edge]), 0.0), (int(self.edge_v[start_edge]), 1.0)):
+            sources[node] = min(sources.get(node, math.inf), abs(start_fraction - fraction) * start_cost)
+        targets = {}
+        for node, fraction in ((int(self.edge_u[end_edge]), 0.0), (int(self.edge_v[end_edge]), 1.0)):
+            targets[node] = min(targets.get(node, math.inf), abs(end_fraction - fraction) * end_cost)
+
+        if start_edge == end_edge:
+            direct_cost = abs(end_fraction - start_fraction) * start_cost
+            if direct_cost <= min(sources[n] + targets[n] for n in sources if n in targets):
+                line = line_substring(self.edge_coords(start_edge), start_fraction, end_fraction)
+                return [self._segment(start_edge, line)]
+
+        nodes, edges = self.astar(sources, targets, weights)
+        if nodes is None:
+            return []
+
+        segments = self.segments(nodes, edges)
+        leave_fraction = 0.0 if nodes[0] == self.edge_u[start_edge] else 1.0
+        if abs(leave_fraction - start_fraction) * start_cost > NODE_TOLERANCE:
+            line = line_substring(self.edge_coords(start_edge), start_fraction, leave_fraction)
+            segments.insert(0, self._segment(start_edge, line))
+        enter_fraction = 0.0 if nodes[-1] == self.edge_u[end_edge] else 1.0
+        if abs(enter_fraction - end_fraction) * end_cost > NODE_TOLERANCE:
+            line = line_substring(self.edge_coords(end_edge), enter_fraction, end_fraction)
+            segments.append(self._segment(end_edge, line))
+        return segments
+
+    def route(self, start_lon, start_lat, end_lon, end_lat, profile="default"):
+        """Route between two WGS84 coordinates for an accessibility profile.
+
+        Returns:
+            list: Segments in the same shape as ``find_astar_path_rullestol``,
+                empty if no route exists.
+        """
+        snap = self.snap_lonlat([start_lon, end_lon], [start_lat, end_lat], profile)
+        return self.route_snapped(snap["edge"][0], snap["fraction"][0],
+                                  snap["edge"][1], snap["fraction"][1],
+                                  self.profile_weights(profile))
+
+
+def dijkstra(network, sources, weights=None, max_cost=math.inf):
+    """Single- or multi-source shortest path costs to every node.
+
+    Args:
+        network: The FootwayNetwork to search.
+        sources: Node id, iterable of node ids starting at cost 0, or dict
+            of node id → starting cost.
+        weights: Optional per-edge cost array, defaults to ``edge_length``.
+        max_cost: Stop expanding nodes beyond this cost.
+
+    Returns:
+        np.ndarray: Cost to every node, ``inf`` where unreachable within ``max_cost``.
+    """
+    weights = network.edge_length if weights is None else weights
+    indptr, adj_node, adj_edge = network.indptr, network.adj_node, network.adj_edge
+    if isinstance(sources, (int, np.integer)):
+        sources = [sources]
+    if not isinstance(sources, dict):
+        sources = dict.fromkeys(sources, 0.0)
+
+    costs = np.full(network.n_nodes, np.inf)
+    heap = []
+    for source, start_cost in sources.items():
+        if start_cost < costs[source] and start_cost <= max_cost:
+            costs[source] = start_cost
+            heap.append((float(start_cost), int(source)))
+    heapq.heapify(heap)
+    while heap:
+        cost, node = heapq.heappop(heap)
+        if cost > costs[node]:
+            continue
+        start, end = indptr[node], indptr[node + 1]
+        for neighbour, edge in zip(adj_node[start:end].tolist(), adj_edge[start:end].tolist()):
+            new_cost = cost + weights[edge]
+            if new_cost < costs[neighbour] and new_cost <= max_cost:
+                costs[neighbour] = new_cost
+                heapq.heappush(heap, (new_cost, neighbour))
+    return costs
+
+
+def build_csr(n_nodes, edge_u, edge_v):
+    """Build an undirected CSR adjacency from edge endpoint arrays.
+
+    Returns:
+        tuple: (indptr, adj_node, adj_edge)
+    """
+    edge_ids = np.arange(len(edge_u), dtype=np.int32)
+    sources = np.concatenate([edge_u, edge_v])
+    targets = np.concatenate([edge_v, edge_u]).astype(np.int32)
+    edges = np.concatenate([edge_ids, edge_ids])
+    order = np.argsort(sources, kind="stable")
+    indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(sources, minlength=n_nodes))
+    return indptr, targets[order], edges[order]
+
+
+def _line_parts(geometry):
+    if geometry is None:
+        return []
+    if geometry["type"] == "LineString":
+        return [geometry["coordinates"]]
+    if geometry["type"] == "MultiLineString":
+        return geometry["coordinates"]
+    return []
+
+
+def read_geojson(path):
+    """Read line features from a GeoJSON export.
+
+    Returns:
+        tuple: (list of (coordinates, properties), CRS string)
+    """
+    with open(path) as f:
+        data = json.load(f)
+    crs = "EPSG:4326"
+    crs_name = ((data.get("crs") or {}).get("properties") or {}).get("name", "")
+    if "25832" in crs_name:
+        crs = "EPSG:25832"
+    features = [(part, feature.get("properties"))
+                for feature in data.get("features", [])
+                for part in _line_parts(feature.get("geometry"))]
+    return features, crs
+
+
+def read_geopackage(path, layer=None):
+    """Read line features from a GeoPackage export.
+
+    Returns:
+        tuple: (list of (coordinates, properties), CRS string)
+    """
+    import shapely
+
+    db = sqlite3.connect(path)
+    try:
+        query = ("SELECT table_name, column_name, srs_id FROM gpkg_geometry_columns"
+                 + (" WHERE table_name = ?" if layer else ""))
+        table, geometry_column, srs_id = db.execute(query, (layer,) if layer else ()).fetchone()
+        cursor = db.execute(f'SELECT * FROM "{table}"')
+        columns = [description[0] for description in cursor.description]
+        features = []
+        for row in cursor:
+            properties = dict(zip(columns, row))
+            blob = properties.pop(geometry_column)
+            if blob is None:
+                continue
+            # GeoPackage header: magic, version, flags, srs id, then an optional envelope
+            envelope_size = {0: 0, 1: 32, 2: 48, 3: 48, 4: 64}[(blob[3] >> 1) & 0b111]
+            geometry = shapely.from_wkb(bytes(blob[8 + envelope_size:]))
+            for part in getattr(geometry, "geoms", [geometry]):
+                features.append((list(part.coords), properties))
+    finally:
+        db.close()
+    return features, f"EPSG:{srs_id}"
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "build":
+        print(__doc__)
+        sys.exit(1)
+    network = FootwayNetwork.from_file(sys.argv[2])
+    network.save(sys.argv[3])
+    print(f"Saved {network.n_nodes} nodes and {network.n_edges} edges to {sys.argv[3]}")
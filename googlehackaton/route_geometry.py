@@ -0,0 +1,199 @@
+"""Vectorized geometry assembly for walking routes.
+
+Route segments arrive as one GeoJSON LineString per footway edge in
+EPSG:25832. They are packed into one contiguous coordinate array with segment
+offsets. Trimming and reprojection then run as single array operations, not
+per vertex.
+"""
+import math
+
+import numpy as np
+import shapely
+from pyproj import Transformer
+
+from snapping import line_substring
+
+# UTM32 → WGS84 for drawing, and WGS84 → UTM32 for snapping OTP coordinates
+TRANSFORMER_25832_to_4326 = Transformer.from_crs("EPSG:25832", "EPSG:4326", always_xy=True)
+TRANSFORMER_4326_to_25832 = Transformer.from_crs("EPSG:4326", "EPSG:25832", always_xy=True)
+
+
+def to_latlon(coords_utm):
+    """Reproject an (n, 2) EPSG:25832 array to an (n, 2) array of (lat, lon)."""
+    coords_utm = np.asarray(coords_utm, dtype=np.float64).reshape(-1, 2)
+    lon, lat = TRANSFORMER_25832_to_4326.transform(coords_utm[:, 0], coords_utm[:, 1])
+    return np.column_stack([lat, lon])
+
+
+def to_utm(lons, lats):
+    """Reproject WGS84 lon/lat arrays to an (n, 2) EPSG:25832 array."""
+    x, y = TRANSFORMER_4326_to_25832.transform(np.asarray(lons, dtype=np.float64),
+                                               np.asarray(lats, dtype=np.float64))
+    return np.column_stack([x, y])
+
+
+def zoom_tolerance(zoom, latitude, pixels=0.5):
+    """Simplification tolerance in meters that stays invisible at a web-map zoom level.
+
+    Args:
+        zoom: Web Mercator zoom level the geometry must look exact at.
+        latitude: Latitude of the map, in degrees.
+        pixels: Allowed deviation in screen pixels.
+    """
+    meters_per_pixel = 156543.03392 * math.cos(math.radians(latitude)) / 2 ** zoom
+    return pixels * meters_per_pixel
+
+
+def _offsets(lengths):
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(lengths)
+    return offsets
+
+
+class SegmentArrays:
+    """Route segments stored as contiguous arrays.
+
+    Attributes:
+        coords: (n_vertices, 2) vertices of every segment in EPSG:25832.
+        offsets: (n_segments + 1,) start of each segment in ``coords``.
+        gatetypes: ``gatetype`` of each segment.
+        images: ``bildefil1`` of each segment, or None. For a merged segment,
+            the first image along it.
+        all_images: Tuple of the distinct images along each segment, so
+            merging segments does not drop any.
+    """
+
+    def __init__(self, coords, offsets, gatetypes, images, all_images=None):
+        self.coords = coords
+        self.offsets = offsets
+        self.gatetypes = gatetypes
+        self.images = images
+        self.all_images = all_images if all_images is not None else [(image,) if image else () for image in images]
+
+    @classmethod
+    def from_segments(cls, route_data):
+        """Pack segments shaped like the routing RPC output."""
+        lines = [np.asarray(segment['geom_geojson']['coordinates'], dtype=np.float64).reshape(-1, 2)
+                 for segment in route_data]
+        offsets = _offsets([len(line) for line in lines])
+        coords = np.concatenate(lines) if lines else np.empty((0, 2))
+        return cls(coords, offsets,
+                   [segment.get('gatetype', 'N/A') for segment in route_data],
+                   [segment.get('bildefil1') for segment in route_data])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def segment(self, index):
+        return self.coords[self.offsets[index]:self.offsets[index + 1]]
+
+    def trim_ends(self, start_lonlat, end_lonlat):
+        """Cut the first and last segments at the projections of the leg endpoints.
+
+        Args:
+            start_lonlat: (lon, lat) where the walking leg starts.
+            end_lonlat: (lon, lat) where the walking leg ends.
+
+        Returns:
+            SegmentArrays: A trimmed copy.
+        """
+        if len(self) == 0:
+            return self
+        last = len(self) - 1
+        ends = to_utm([start_lonlat[0], end_lonlat[0]], [start_lonlat[1], end_lonlat[1]])
+        first_line, last_line = self.segment(0), self.segment(last)
+        lines = shapely.linestrings(
+            np.concatenate([first_line, last_line]),
+            indices=np.repeat([0, 1], [len(first_line), len(last_line)]),
+        )
+        fractions = shapely.line_locate_point(lines, shapely.points(ends), normalized=True)
+
+        lines = [self.segment(i) for i in range(len(self))]
+        if last == 0:
+            lines[0] = line_substring(lines[0], fractions[0], fractions[1])
+        else:
+            lines[0] = line_substring(lines[0], fractions[0], 1.0)
+            lines[last] = line_substring(lines[last], 0.0, fractions[1])
+
+        return SegmentArrays(np.concatenate(lines), _offsets([len(line) for line in lines]),
+                             self.gatetypes, self.images, self.all_images)
+
+    def merge_by_gatetype(self):
+        """Join runs of consecutive segments that share the same ``gatetype``.
+
+        A merged segment's ``images`` entry is the first image found in its
+        run, and ``all_images`` keeps every distinct image of the run in order.
+
+        Returns:
+            SegmentArrays: A copy with one segment per run.
+        """
+        if len(self) == 0:
+            return self
+        lines, gatetypes, images, all_images = [], [], [], []
+        for index in range(len(self)):
+            line = self.segment(index)
+            if gatetypes and gatetypes[-1] == self.gatetypes[index]:
+                if np.allclose(lines[-1][-1], line[0]):
+                    line = line[1:]
+                lines[-1] = np.concatenate([lines[-1], line])
+                images[-1] = images[-1] or self.images[index]
+                all_images[-1] += tuple(image for image in self.all_images[index] if image not in all_images[-1])
+            else:
+                lines.append(line)
+                gatetypes.append(self.gatetypes[index])
+                images.append(self.images[index])
+                all_images.append(tuple(self.all_images[index]))
+        return SegmentArrays(np.concatenate(lines), _offsets([len(line) for line in lines]),
+                             gatetypes, images, all_images)
+
+    def simplify(self, tolerance):
+        """Simplify every segment in one vectorized call.
+
+        Topology is preserved, so a simplified segment never crosses itself,
+        e.g. where a route doubles back along a footway.
+
+        Args:
+            tolerance: Maximum deviation in meters, see ``zoom_tolerance``.
+
+        Returns:
+            SegmentArrays: A simplified copy.
+        """
+        if len(self) == 0 or tolerance <= 0:
+            return self
+        lines = shapely.linestrings(self.coords, indices=np.repeat(np.arange(len(self)), np.diff(self.offsets)))
+        simplified = shapely.simplify(lines, tolerance, preserve_topology=True)
+        coords, index = shapely.get_coordinates(simplified, return_index=True)
+        return SegmentArrays(coords, _offsets(np.bincount(index, minlength=len(self))),
+                             self.gatetypes, self.images, self.all_images)
+
+    def to_geojson(self, properties=None, precision=6):
+        """Export the segments as one GeoJSON FeatureCollection in WGS84.
+
+        Args:
+            properties: Optional list with extra properties for each segment.
+            precision: Decimals kept for each coordinate (6 ≈ 0.1 m).
+
+        Returns:
+            dict: FeatureCollection with ``gatetype`` and ``bildefil1`` on each feature.
+        """
+        lonlat = np.round(to_latlon(self.coords)[:, ::-1], precision)
+        features = []
+        for index, line in enumerate(np.split(lonlat, self.offsets[1:-1])):
+            feature_properties = {"gatetype": self.gatetypes[index], "bildefil1": self.images[index]}
+            if properties:
+                feature_properties.update(properties[index])
+            features.append({
+                "type": "Feature",
+                "geometry": {"type": "LineString", "coordinates": line.tolist()},
+                "properties": feature_properties,
+            })
+        return {"type": "FeatureCollection", "features": features}
+
+    def latlon_segments(self):
+        """Reproject every vertex in one call and split it back into segments.
+
+        Returns:
+            list: One (n, 2) array of (lat, lon) per segment.
+        """
+        latlon = to_latlon(self.coords)
+        return np.split(latlon, self.offsets[1:-1])
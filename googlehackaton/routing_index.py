@@ -0,0 +1,200 @@
+"""ALT landmark index for the local footway network.
+
+ALT (A*, landmarks, triangle inequality) precomputes shortest path costs from
+a handful of landmark nodes to every node. For any node ``v`` and target ``t``
+``|d(L, t) - d(L, v)|`` is a lower bound on ``d(v, t)``. This is a much tighter
+A* heuristic than the straight-line distance, so queries settle far fewer
+nodes. The bounds are computed over edge lengths. They stay admissible for
+profile weights that only raise edge costs or remove edges, and ``verify``
+checks every accessibility profile against plain A*.
+
+The index is stored next to the saved network as ``landmark_distances.npy``
+(n_nodes × n_landmarks, float32) and memory-mapped at start-up.
+
+The search itself is still a pure-Python heap loop. On a synthetic 900-node
+grid ``verify`` measures about 0.4 ms per ALT query against 3 ms for plain
+A*. That is under a millisecond, but not well under. Profiles that remove
+edges loosen the bounds, so their ALT queries take 1-2 ms, and larger
+networks settle more nodes per query. Going further needs a compiled inner loop.
+Computing the bounds with numpy per expanded node was measured slower than
+the scalar loop, as each node has only a few neighbours.
+
+Usage:
+    python routing_index.py build footway_network/ [n_landmarks]
+    python routing_index.py verify footway_network/ [n_queries]
+"""
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+from local_routing import ACCESSIBILITY_PROFILES, FootwayNetwork, dijkstra
+
+LANDMARKS_FILE = "landmarks.npy"
+DISTANCES_FILE = "landmark_distances.npy"
+
+
+class LandmarkIndex:
+    """Landmark distances for ALT lower bounds.
+
+    Attributes:
+        landmarks: Node ids of the landmarks.
+        distances: (n_nodes, n_landmarks) cost from each landmark to each node,
+            ``inf`` where a node is not connected to the landmark.
+    """
+
+    def __init__(self, landmarks, distances):
+        self.landmarks = landmarks
+        self.distances = distances
+
+    @classmethod
+    def build(cls, network, n_landmarks=16, seed=0):
+        """Pick landmarks by farthest-point selection and compute their distances.
+
+        Each new landmark is the node farthest from the landmarks chosen so far.
+        This spreads them over the edge of the network, where they give the
+        tightest bounds.
+        """
+        rng = random.Random(seed)
+        landmarks, columns = [], []
+        nearest = dijkstra(network, rng.randrange(network.n_nodes))
+        for _ in range(min(n_landmarks, network.n_nodes)):
+            reachable = np.where(np.isfinite(nearest), nearest, -1.0)
+            landmark = int(np.argmax(reachable))
+            if landmark in landmarks:
+                # Every reachable node is covered, seed the next component
+                unvisited = np.flatnonzero(~np.isfinite(nearest))
+                if len(unvisited) == 0:
+                    break
+                landmark = int(unvisited[0])
+            costs = dijkstra(network, landmark)
+            landmarks.append(landmark)
+            columns.append(costs)
+            nearest = costs if len(landmarks) == 1 else np.minimum(nearest, costs)
+        distances = np.column_stack(columns).astype(np.float32)
+        return cls(np.array(landmarks, dtype=np.int32), distances)
+
+    def save(self, directory):
+        np.save(os.path.join(directory, LANDMARKS_FILE), self.landmarks)
+        np.save(os.path.join(directory, DISTANCES_FILE), self.distances)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Load a saved index, or return None if ``directory`` has none."""
+        if not os.path.exists(os.path.join(directory, DISTANCES_FILE)):
+            return None
+        mmap_mode = "r" if mmap else None
+        return cls(np.load(os.path.join(directory, LANDMARKS_FILE)),
+                   np.load(os.path.join(directory, DISTANCES_FILE), mmap_mode=mmap_mode))
+
+    def lower_bound(self, target, source=None, active=4):
+        """Return a function giving the ALT lower bound from a node to ``target``.
+
+        Args:
+            target: Target node id.
+            source: Optional source node id. When given, only the ``active``
+                landmarks with the best bound at the source are consulted,
+                which keeps the per-node cost low.
+            active: Number of landmarks to use when ``source`` is given.
+        """
+        to_target = np.asarray(self.distances[target], dtype=np.float64)
+        usable = np.isfinite(to_target)
+        if source is not None:
+            from_source = np.asarray(self.distances[source], dtype=np.float64)
+            usable &= np.isfinite(from_source)
+            gain = np.where(usable, np.abs(to_target - from_source), -1.0)
+            columns = [int(c) for c in np.argsort(-gain)[:active] if gain[c] >= 0]
+        else:
+            columns = np.flatnonzero(usable).tolist()
+        targets = [(column, float(to_target[column])) for column in columns]
+        # A plain ndarray view: indexing a memmap is several times slower
+        distances = np.asarray(self.distances)
+
+        def bound(node):
+            row = distances[node].tolist()
+            best = 0.0
+            for column, target_cost in targets:
+                gap = abs(target_cost - row[column])
+                if gap > best:
+                    best = gap
+            # float32 storage rounds the distances, so shave off a little slack.
+            # A node unreachable from a landmark gives inf, which correctly
+            # prunes it: it cannot be connected to the target either.
+            return max(best - 0.01, 0.0)
+
+        return bound
+
+
+def path_cost(network, edges, weights=None):
+    weights = network.edge_length if weights is None else weights
+    return float(sum(weights[edge] for edge in edges))
+
+
+def verify(network, index, n_queries=200, seed=0):
+    """Compare ALT queries against plain A* on random node pairs.
+
+    Every accessibility profile is checked on the same node pairs, since the
+    bounds are computed over edge lengths but queried with profile weights.
+
+    Returns:
+        dict: Number of queries, total mismatching path costs, and per
+            profile the mismatches and mean query time in milliseconds for
+            plain A* and ALT.
+    """
+    network.landmarks = index
+    profiles = {}
+    for profile in ACCESSIBILITY_PROFILES:
+        weights = network.profile_weights(profile)
+        rng = random.Random(seed)
+        mismatches = 0
+        plain_time = alt_time = 0.0
+        for _ in range(n_queries):
+            source, target = rng.randrange(network.n_nodes), rng.randrange(network.n_nodes)
+
+            start = time.perf_counter()
+            _, plain_edges = network.astar(source, target, weights, use_landmarks=False)
+            plain_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            _, alt_edges = network.astar(source, target, weights)
+            alt_time += time.perf_counter() - start
+
+            if (plain_edges is None) != (alt_edges is None):
+                mismatches += 1
+            elif plain_edges is not None and abs(
+                    path_cost(network, plain_edges, weights) - path_cost(network, alt_edges, weights)) > 1e-6:
+                mismatches += 1
+
+        profiles[profile] = {
+            "mismatches": mismatches,
+            "astar_ms": plain_time / n_queries * 1000,
+            "alt_ms": alt_time / n_queries * 1000,
+        }
+
+    return {
+        "queries": n_queries,
+        "mismatches": sum(result["mismatches"] for result in profiles.values()),
+        "profiles": profiles,
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("build", "verify"):
+        print(__doc__)
+        sys.exit(1)
+    directory = sys.argv[2]
+    network = FootwayNetwork.load(directory)
+    if sys.argv[1] == "build":
+        n_landmarks = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+        index = LandmarkIndex.build(network, n_landmarks)
+        index.save(directory)
+        print(f"Saved {len(index.landmarks)} landmarks to {directory}")
+    else:
+        n_queries = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+        report = verify(network, LandmarkIndex.load(directory), n_queries)
+        for profile, result in report["profiles"].items():
+            print(f"{profile}: {result['mismatches']} mismatches, "
+                  f"A* {result['astar_ms']:.2f} ms, ALT {result['alt_ms']:.2f} ms")
+        sys.exit(1 if report["mismatches"] else 0)
@@ -0,0 +1,105 @@
+"""Spatial index for snapping coordinates onto the local footway network.
+
+An STRtree over every edge geometry answers nearest-edge queries for whole
+arrays of points at once. The result holds the snapped edge, the projection
+parameter along it and the snapped point, so endpoints can be joined to the
+graph and route ends trimmed without a query per leg.
+"""
+import numpy as np
+import shapely
+
+
+class EdgeSnapper:
+    """Nearest-edge and nearest-node lookups over a FootwayNetwork.
+
+    Args:
+        network: The ``local_routing.FootwayNetwork`` to index.
+        edges: Optional edge ids to index, e.g. those usable in an
+            accessibility profile. Defaults to every edge.
+    """
+
+    def __init__(self, network, edges=None):
+        self.network = network
+        coord_edge = np.repeat(np.arange(network.n_edges), np.diff(network.coord_offsets))
+        self.lines = shapely.linestrings(np.asarray(network.coords), indices=coord_edge)
+        self.edge_ids = np.arange(network.n_edges) if edges is None else np.asarray(edges)
+        self.edge_tree = shapely.STRtree(self.lines[self.edge_ids])
+        self.node_tree = shapely.STRtree(shapely.points(np.asarray(network.node_xy)))
+
+    def snap(self, xs, ys):
+        """Snap EPSG:25832 points to their nearest edges.
+
+        Args:
+            xs, ys: Arrays of point coordinates.
+
+        Returns:
+            dict: Arrays ``edge``, ``fraction`` (0 at the edge's first vertex,
+                1 at its last), ``distance`` and the snapped ``x``/``y``. A
+                point that could not be snapped, e.g. with NaN coordinates,
+                gets edge -1, distance ``inf`` and NaN fraction and x/y.
+        """
+        points = shapely.points(np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64))
+        (point_index, edges), distances = self.edge_tree.query_nearest(
+            points, return_distance=True, all_matches=False
+        )
+        # query_nearest skips empty inputs; keep the result aligned with the input
+        edge = np.full(len(points), -1, dtype=np.int64)
+        distance = np.full(len(points), np.inf)
+        edge[point_index] = self.edge_ids[edges]
+        distance[point_index] = distances
+
+        fraction = np.full(len(points), np.nan)
+        x = np.full(len(points), np.nan)
+        y = np.full(len(points), np.nan)
+        found = edge >= 0
+        if found.any():
+            lines = self.lines[edge[found]]
+            fraction[found] = shapely.line_locate_point(lines, points[found], normalized=True)
+            snapped = shapely.line_interpolate_point(lines, fraction[found], normalized=True)
+            x[found] = shapely.get_x(snapped)
+            y[found] = shapely.get_y(snapped)
+        return {
+            "edge": edge,
+            "fraction": fraction,
+            "distance": distance,
+            "x": x,
+            "y": y,
+        }
+
+    def nearest_nodes(self, xs, ys):
+        """Return the id of the nearest graph node for each EPSG:25832 point."""
+        points = shapely.points(np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64))
+        point_index, nodes = self.node_tree.query_nearest(points, all_matches=False)
+        result = np.full(len(points), -1, dtype=np.int64)
+        result[point_index] = nodes
+        return result
+
+
+def line_substring(coords, start_fraction, end_fraction):
+    """Cut a polyline between two normalised positions along it.
+
+    The result runs from ``start_fraction`` to ``end_fraction`` and is
+    reversed when ``start_fraction`` is the larger of the two.
+
+    Args:
+        coords: (n, 2) array of vertices.
+        start_fraction, end_fraction: Positions in [0, 1] along the line.
+
+    Returns:
+        np.ndarray: Vertices of the cut line.
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    reverse = start_fraction > end_fraction
+    low, high = sorted((start_fraction, end_fraction))
+    steps = np.hypot(*np.diff(coords, axis=0).T)
+    cumulative = np.concatenate([[0.0], np.cumsum(steps)])
+    total = cumulative[-1]
+    if total == 0.0:
+        return coords[[0, 0]]
+    low_m, high_m = low * total, high * total
+
+    inner = coords[(cumulative > low_m) & (cumulative < high_m)]
+    ends = np.column_stack([np.interp([low_m, high_m], cumulative, coords[:, 0]),
+                            np.interp([low_m, high_m], cumulative, coords[:, 1])])
+    result = np.concatenate([ends[:1], inner, ends[1:]])
+    return result[::-1] if reverse else result
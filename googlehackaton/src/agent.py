@@ -1,31 +1,72 @@
+import asyncio
+import threading
+import time
+import uuid
 
 import src.datamodel as dm
 
+from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import END, START, StateGraph
 
 import src.node as nodes
 
+# Compiled workflow shared by every TripAgent in the process. Agents with
+# checkpointing use a copy bound to their own checkpointer.
+_COMPILED_GRAPH = None
+_COMPILE_LOCK = threading.Lock()
+
 
 class TripAgent:
     """
     """
 
-    def __init__(self):
+    def __init__(self, checkpointing=False):
         """
-    
+        Args:
+            checkpointing: Keep per-thread checkpoints in memory so a failed run
+                can be resumed with ``aretry`` instead of starting over. The
+                checkpoints belong to this agent and are freed with it.
         """
+        self.checkpointing = checkpointing
+        self.checkpointer = MemorySaver() if checkpointing else None
         self.init()
 
     def init(self):
         """Initialize the agent."""
-        self.create_graph()
+        self.app = self.create_graph()
+
+    @classmethod
+    def compiled_graph(cls):
+        """Return the process-wide compiled workflow, compiling it on first use.
 
+        Returns:
+            CompiledStateGraph: A reusable runnable shared across agents and sessions.
+        """
+        global _COMPILED_GRAPH
+        with _COMPILE_LOCK:
+            if _COMPILED_GRAPH is None:
+                _COMPILED_GRAPH = cls.build_workflow().compile()
+            return _COMPILED_GRAPH
 
     def create_graph(self):
         """Create the workflow graph for the agent.
 
         Returns:
-            StateGraph: A compiled StateGraph object representing the agent's workflow.
+            StateGraph: The shared compiled workflow, bound to this agent's
+                checkpointer when checkpointing is on.
+        """
+        graph = self.compiled_graph()
+        if self.checkpointer is None:
+            return graph
+        # A shallow copy: the compiled nodes are shared, only the checkpointer differs
+        return graph.copy(update={"checkpointer": self.checkpointer})
+
+    @staticmethod
+    def build_workflow():
+        """Build the uncompiled workflow graph.
+
+        Returns:
+            StateGraph: The agent's workflow, ready to be compiled.
         """
         # Create the graph
         workflow = StateGraph(dm.GraphState)
@@ -48,17 +89,126 @@ class TripAgent:
         workflow.add_edge("get_coordinates", "plan_trip_entur")
         workflow.add_edge("plan_trip_entur", END)
 
-        return workflow.compile()
+        return workflow
 
+    def run_config(self, thread_id=None, **configurable):
+        """Build the run config, adding a thread id when checkpointing is on."""
+        if self.checkpointing:
+            configurable["thread_id"] = thread_id or str(uuid.uuid4())
+        return {"configurable": configurable}
 
+    def discard(self, config):
+        """Drop the checkpoints of a finished run; only a failed run needs them for ``aretry``."""
+        if self.checkpointer is not None:
+            self.checkpointer.delete_thread(config["configurable"]["thread_id"])
 
-if __name__ == "__main__":
+    async def ainvoke(self, question, thread_id=None):
+        """Run a single question through the graph.
+
+        Args:
+            question: Question string or ``{"question": ...}`` dict.
+            thread_id: Checkpoint thread to use when checkpointing is enabled.
+        """
+        if isinstance(question, str):
+            question = {"question": question}
+        config = self.run_config(thread_id)
+        try:
+            return await self.app.ainvoke(question, config)
+        finally:
+            if thread_id is None:
+                # Nobody can resume a thread id they were never given
+                self.discard(config)
+
+    async def astream(self, question, thread_id=None):
+        """Run a single question and yield each node's state delta as it completes.
+
+        Args:
+            question: Question string or ``{"question": ...}`` dict.
+            thread_id: Checkpoint thread to use when checkpointing is enabled.
+
+        Yields:
+            tuple: ``(node_name, delta)`` where ``delta`` holds the keys the node set.
+        """
+        if isinstance(question, str):
+            question = {"question": question}
+        config = self.run_config(thread_id)
+        try:
+            async for update in self.app.astream(question, config, stream_mode="updates"):
+                for node_name, delta in update.items():
+                    yield node_name, delta or {}
+        finally:
+            if thread_id is None:
+                # Nobody can resume a thread id they were never given
+                self.discard(config)
+
+    async def aretry(self, thread_id):
+        """Resume a failed run from its last checkpoint.
+
+        Completed nodes such as extraction and geocoding are not run again; only
+        the node that failed and those after it are executed.
+
+        Args:
+            thread_id: The thread id of the failed run.
+        """
+        if not self.checkpointing:
+            raise ValueError("aretry requires a TripAgent created with checkpointing=True")
+        config = self.run_config(thread_id)
+        result = await self.app.ainvoke(None, config)
+        self.discard(config)
+        return result
+
+    async def abatch(self, questions, max_concurrency=8, batch_window=0.05):
+        """Run many questions through the graph with bounded concurrency.
 
-    import asyncio
+        Entur trip queries issued within ``batch_window`` seconds of each other
+        are merged into one aliased GraphQL request. The HTTP session and the
+        model client are shared by every run.
+
+        Args:
+            questions: Question strings or ``{"question": ...}`` dicts.
+            max_concurrency: Maximum number of questions in flight at once.
+            batch_window: Seconds to wait for more trip queries before sending.
+
+        Returns:
+            list: One dict per question, in input order, with ``question``,
+                ``result``, ``error``, ``elapsed`` (seconds) and ``thread_id``
+                (None unless checkpointing is enabled). Only failed runs keep
+                their checkpoints, until ``aretry`` succeeds or the agent is
+                dropped.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        batcher = nodes.EnturTripBatcher(window=batch_window, max_batch=max_concurrency)
+
+        async def run_one(question):
+            if isinstance(question, str):
+                question = {"question": question}
+            async with semaphore:
+                start = time.perf_counter()
+                result, error = None, None
+                config = self.run_config(trip_batcher=batcher)
+                try:
+                    result = await self.app.ainvoke(question, config)
+                    # Only failed runs keep their checkpoints, for aretry
+                    self.discard(config)
+                except Exception as e:
+                    error = str(e)
+                return {
+                    "question": question["question"],
+                    "result": result,
+                    "error": error,
+                    "elapsed": time.perf_counter() - start,
+                    "thread_id": config["configurable"].get("thread_id"),
+                }
+
+        return await asyncio.gather(*(run_one(question) for question in questions))
+
+
+
+if __name__ == "__main__":
 
     async def test_agent():
         Agent = TripAgent()
-        app = Agent.create_graph()
+        app = Agent.app
         question = {
             "question": "Jeg skal reise fra Jernbanetorget, til Gladengveien 10. Jeg bruker rullestol. Jeg vil reise kl 12:00 i dag.",
         }
@@ -0,0 +1,100 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Bounded in-memory LRU cache with optional expiry and an optional disk tier.
+
+    Entries live in memory up to ``maxsize`` and are evicted least recently used
+    first. When ``path`` is given, entries are also written to a SQLite file so
+    they survive restarts and can be shared between processes. Values stored on
+    disk must be JSON serialisable.
+
+    Args:
+        maxsize: Maximum number of entries kept in memory.
+        ttl: Time to live in seconds, or None for entries that never expire.
+        path: Optional path to a SQLite file used as the disk tier.
+    """
+
+    def __init__(self, maxsize=256, ttl=None, path=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expires REAL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def _encode_key(key):
+        return json.dumps(key, separators=(",", ":"))
+
+    def get(self, key, default=None):
+        """Return the cached value for ``key``, or ``default`` if missing or expired."""
+        encoded = self._encode_key(key)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(encoded)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > now:
+                    self._entries.move_to_end(encoded)
+                    self.hits += 1
+                    return value
+                del self._entries[encoded]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires FROM cache WHERE key = ?", (encoded,)
+                ).fetchone()
+                if row is not None:
+                    value, expires = json.loads(row[0]), row[1]
+                    if expires is None or expires > now:
+                        self._store(encoded, value, expires)
+                        self.hits += 1
+                        return value
+                    self._db.execute("DELETE FROM cache WHERE key = ?", (encoded,))
+                    self._db.commit()
+
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        """Store ``value`` under ``key`` in memory and, if configured, on disk."""
+        encoded = self._encode_key(key)
+        expires = time.time() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._store(encoded, value, expires)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                    (encoded, json.dumps(value), expires),
+                )
+                self._db.commit()
+
+    def _store(self, encoded, value, expires):
+        self._entries[encoded] = (value, expires)
+        self._entries.move_to_end(encoded)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every entry from memory and disk."""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM cache")
+                self._db.commit()
+
+    def __len__(self):
+        return len(self._entries)
@@ -41,4 +41,7 @@ class FindUserData(BaseModel):
     handicap: str = Field(
         description="If the user uses a wheelchair or has reduced eyesight, if not, None"
     )
+    confidence: float = Field(
+        description="How certain you are that the fields are correct, from 0 to 1"
+    )
 
@@ -1,19 +1,63 @@
+from langchain_core.exceptions import OutputParserException
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_google_vertexai import ChatVertexAI
+from pydantic import ValidationError
 from datetime import datetime
 import src.datamodel as dm
 import requests
+import asyncio
+import copy
+import functools
+import json
+import math
+import os
 from datetime import datetime, timezone
+from src.cache import TTLCache
+from src.transfers import get_transfer_matrix, handicap_profile
+from agent_common.client_policy import policy
+from agent_common.cascade import cascade
 
-def setup_model():
+ENTUR_CLIENT_NAME = "Google-VertexAI-LLM-hackathon"
+ENTUR_GEOCODER_URL = "https://api.entur.io/geocoder/v1/autocomplete"
+ENTUR_JOURNEY_PLANNER_URL = "https://api.entur.io/journey-planner/v3/graphql"
+
+# One HTTP session per process so connections are pooled across requests.
+HTTP = requests.Session()
+
+TRANSPORT_MODES = ("bus", "rail", "tram", "metro", "water")
+
+# Trip plans are reused for journeys that snap to the same grid cells and
+# depart within the same time bucket.
+TRIP_CACHE_GRID_METERS = float(os.environ.get("TRIP_CACHE_GRID_METERS", 100))
+TRIP_CACHE_TIME_BUCKET_MINUTES = int(os.environ.get("TRIP_CACHE_TIME_BUCKET_MINUTES", 5))
+TRIP_CACHE = TTLCache(
+    maxsize=int(os.environ.get("TRIP_CACHE_SIZE", 512)),
+    ttl=int(os.environ.get("TRIP_CACHE_TTL", 300)),
+    path=os.environ.get("TRIP_CACHE_PATH"),
+)
+# Optional JSON list of [stop_id, lat, lon] stops, e.g. the stops.json that
+# transfer_matrix.py builds from. Trip endpoints within the grid distance of a
+# stop are snapped to that stop instead of a grid cell.
+TRIP_CACHE_STOPS_PATH = os.environ.get("TRIP_CACHE_STOPS_PATH")
+# MODEL_CASCADE=1 extracts trip details through the "extraction" model
+# cascade (see agent_common/cascade.py) instead of the fixed model
+MODEL_CASCADE = os.environ.get("MODEL_CASCADE", "0") == "1"
+# Trip patterns requested per query when a transfer matrix is available to
+# discard patterns with transfers the user cannot make
+TRIP_PATTERN_CANDIDATES = int(os.environ.get("TRIP_PATTERN_CANDIDATES", 5))
+
+@functools.lru_cache(maxsize=None)
+def setup_model(model_name="gemini-2.5-pro-preview-05-06"):
+    # The Vertex AI SDK takes seconds to import, so load it on first use
+    from langchain_google_vertexai import ChatVertexAI
     # LLM with function call
     llm = ChatVertexAI(
-            model_name="gemini-2.5-pro-preview-05-06",
+            model_name=model_name,
             project="PROJECTID",
             location="us-central1",
             endpoint_version="v1",
             max_output_tokens=2000, 
             temperature=0.1,        
+            max_retries=1,  # A single attempt; client_policy owns retries
         )
     return llm
 
@@ -30,9 +74,15 @@ async def check_trip(state):
     return "True"
 
 async def extract_data(state):
+    """Extract origin, destination, time and handicap from the question.
+
+    Uses the default ``setup_model`` model, or with ``MODEL_CASCADE=1`` the
+    "extraction" model cascade (see ``agent_common.cascade``): the flash model
+    answers first, and the pro model only runs when flash reports low
+    confidence or gives no answer that parses. If the last model gives no
+    answer, no fields are returned, and ``check_trip`` ends the run.
+    """
     question = state.get("question")
-    llm = setup_model()
-    structured_llm_grader = llm.with_structured_output(dm.FindUserData)
 
     # Prompt
     system = """Your task is to find where the user is traveling from and to."""
@@ -41,17 +91,38 @@ async def extract_data(state):
             ("system", system),
             ("human", "Given this question {question}, fill out the following fields: origin, destination, time, handicap. "
              "If the user does not specify a time, use 'Now'. If the user does not specify a handicap, use 'None'. "
-             "If the user does not specify a location, use 'None'. "),
+             "If the user does not specify a location, use 'None'. "
+             "Rate in confidence from 0 to 1 how certain you are that every field is correct."),
         ]
     )
 
-    retrieval_grader = grade_prompt | structured_llm_grader
-    ans = retrieval_grader.invoke({"question": question})
-    state["origin"] = ans.origin
-    state["destination"] = ans.destination
-    state["time"] = ans.time
-    state["handicap"] = ans.handicap
-    return state
+    async def attempt(llm):
+        retrieval_grader = grade_prompt | llm.with_structured_output(dm.FindUserData)
+        try:
+            ans = await policy("vertex").acall(retrieval_grader.ainvoke, {"question": question})
+        except (OutputParserException, ValidationError) as e:
+            # An unparseable answer lets the cascade escalate instead of failing the run
+            print(f"Error parsing trip details from {llm.model_name}: {e}")
+            return None, None, "parse_error"
+        return ans, ans.confidence if ans is not None else None
+
+    if MODEL_CASCADE:
+        outcome = await cascade("extraction").arun(
+            lambda model_name: attempt(setup_model(model_name)), input_tokens=len(question or "") // 4
+        )
+        ans = outcome.result
+    else:
+        ans = (await attempt(setup_model()))[0]
+    if ans is None:
+        print(f"Could not extract trip details from question: {question}")
+        return {}
+    # Only the updated keys are returned so streamed runs see a compact delta
+    return {
+        "origin": ans.origin,
+        "destination": ans.destination,
+        "time": ans.time,
+        "handicap": ans.handicap,
+    }
 
 
 
@@ -76,24 +147,26 @@ async def get_coordinates(state):
     if destination.endswith("i Oslo"):
         destination = destination[:-len("i Oslo")].strip()
 
-    origin_coordinates = await get_coordinates_for_place(origin)
-    destination_coordinates = await get_coordinates_for_place(destination)
+    origin_coordinates, destination_coordinates = await asyncio.gather(
+        get_coordinates_for_place(origin),
+        get_coordinates_for_place(destination),
+    )
+    update = {}
     if origin_coordinates:
-        state["origin_lat"] = origin_coordinates[0]
-        state["origin_long"] = origin_coordinates[1]
+        update["origin_lat"] = origin_coordinates[0]
+        update["origin_long"] = origin_coordinates[1]
     else:
         print(f"Could not find coordinates for '{origin}'.")
     if destination_coordinates:
-        state["destination_lat"] = destination_coordinates[0]
-        state["destination_long"] = destination_coordinates[1]
+        update["destination_lat"] = destination_coordinates[0]
+        update["destination_long"] = destination_coordinates[1]
     else:
         print(f"Could not find coordinates for '{destination}'.")
-    return state
+    return update
 
 async def get_coordinates_for_place(place_name):
-    url = "https://api.entur.io/geocoder/v1/autocomplete"
     headers = {
-        "ET-Client-Name": "Google-VertexAI-LLM-hackathon",
+        "ET-Client-Name": ENTUR_CLIENT_NAME,
     }
     params = {
         "text": place_name,
@@ -102,7 +175,9 @@ async def get_coordinates_for_place(place_name):
     }
 
     try:
-        response = requests.get(url, headers=headers, params=params)
+        response = await policy("entur").acall(
+            asyncio.to_thread, HTTP.get, ENTUR_GEOCODER_URL, headers=headers, params=params
+        )
         response.raise_for_status()
         data = response.json()
 
@@ -119,39 +194,103 @@ async def get_coordinates_for_place(place_name):
         return None
     
 
-async def plan_trip_entur(state):
-    client_name="Google-VertexAI-LLM-hackathon"
-    url = "https://api.entur.io/journey-planner/v3/graphql"
-    headers = {
-        "Content-Type": "application/json",
-        "ET-Client-Name": client_name
-    }
+@functools.lru_cache(maxsize=None)
+def get_trip_cache_stops():
+    """Return the (stop_id, lat, lon) stops at TRIP_CACHE_STOPS_PATH, or [] if it is not set or unreadable."""
+    if not TRIP_CACHE_STOPS_PATH:
+        return []
+    try:
+        with open(TRIP_CACHE_STOPS_PATH) as f:
+            return [tuple(stop) for stop in json.load(f)]
+    except Exception as e:
+        print(f"Error loading trip cache stops from {TRIP_CACHE_STOPS_PATH}: {e}")
+        return []
+
+
+def snap_coordinate(lat, lon, grid_meters=None, stops=None):
+    """Snap a coordinate to the nearest stop, or to a metric grid cell.
+
+    Args:
+        lat: Latitude in degrees.
+        lon: Longitude in degrees.
+        grid_meters: Grid cell size in meters, defaults to TRIP_CACHE_GRID_METERS.
+        stops: Optional list of (stop_id, lat, lon) tuples to snap to.
+
+    Returns:
+        tuple: ("stop", stop_id) or ("grid", row, col).
+    """
+    grid_meters = grid_meters or TRIP_CACHE_GRID_METERS
+    meters_per_deg_lat = 111320.0
+    meters_per_deg_lon = meters_per_deg_lat * math.cos(math.radians(lat))
+
+    if stops:
+        best_id, best_dist = None, grid_meters
+        for stop_id, stop_lat, stop_lon in stops:
+            dist = math.hypot((stop_lat - lat) * meters_per_deg_lat,
+                              (stop_lon - lon) * meters_per_deg_lon)
+            if dist <= best_dist:
+                best_id, best_dist = stop_id, dist
+        if best_id is not None:
+            return ("stop", best_id)
+
+    # Scale longitude by the latitude of the row centre so cells are stable
+    row = math.floor(lat * meters_per_deg_lat / grid_meters)
+    row_lat = (row + 0.5) * grid_meters / meters_per_deg_lat
+    row_meters_per_deg_lon = meters_per_deg_lat * math.cos(math.radians(row_lat))
+    return ("grid", row, math.floor(lon * row_meters_per_deg_lon / grid_meters))
+
+
+def trip_cache_key(origin_lat, origin_long, destination_lat, destination_long,
+                   departure, modes=TRANSPORT_MODES, handicap=None):
+    """Build the TRIP_CACHE key for a journey.
+
+    Args:
+        departure: Departure time as a timezone-aware datetime.
+        modes: Transport modes included in the query.
+        handicap: Accessibility profile extracted from the question.
+    """
+    bucket_seconds = TRIP_CACHE_TIME_BUCKET_MINUTES * 60
+    return (
+        snap_coordinate(origin_lat, origin_long, stops=get_trip_cache_stops()),
+        snap_coordinate(destination_lat, destination_long, stops=get_trip_cache_stops()),
+        int(departure.timestamp() // bucket_seconds),
+        sorted(modes),
+        (handicap or "None").strip().lower(),
+    )
+
 
-    iso_time = datetime.now(timezone.utc).isoformat()
-        
+def build_trip_query(origin_lat, origin_long, destination_lat, destination_long,
+                     iso_time, modes=TRANSPORT_MODES, num_patterns=None):
+    """Build the GraphQL ``trip`` selection for a journey.
 
+    The selection has no surrounding ``query`` block so several of them can be
+    combined under aliases into a single request.
 
-    query = f"""
-    query {{
+    Args:
+        num_patterns: Number of trip patterns to ask for, Entur's default if None.
+    """
+    num_trip_patterns = f"numTripPatterns: {num_patterns}" if num_patterns else ""
+    transport_modes = "\n            ".join(
+        f"{{ transportMode: {mode} }}" for mode in modes
+    )
+
+    return f"""
       trip(
         from: {{
-          coordinates: {{ latitude: {state.get("origin_lat")}, longitude: {state.get("origin_long")} }}
+          coordinates: {{ latitude: {origin_lat}, longitude: {origin_long} }}
         }}
         to: {{
-          coordinates: {{ latitude: {state.get("destination_lat")}, longitude: {state.get("destination_long")} }}
+          coordinates: {{ latitude: {destination_lat}, longitude: {destination_long} }}
         }}
         dateTime: "{iso_time}"
         arriveBy: {"false"}
+        {num_trip_patterns}
         modes: {{
           accessMode: foot
           egressMode: foot
           directMode: foot
           transportModes: [
-            {{ transportMode: bus }}
-            {{ transportMode: rail }}
-            {{ transportMode: tram }}
-            {{ transportMode: metro }}
-            {{ transportMode: water }}
+            {transport_modes}
           ]
         }}
       ) {{
@@ -165,11 +304,17 @@ async def plan_trip_entur(state):
               name
               latitude
               longitude
+              quay {{
+                id
+              }}
             }}
             toPlace {{
               name
               latitude
               longitude
+              quay {{
+                id
+              }}
             }}
             distance
             line {{
@@ -179,13 +324,141 @@ async def plan_trip_entur(state):
           }}
         }}
       }}
-    }}
     """
 
-    response = requests.post(url, headers=headers, json={"query": query})
-    if response.status_code == 200:
-        trip_data = response.json()
-        state["trip"] = trip_data["data"]["trip"]["tripPatterns"][0]
-        return state
+
+def _entur_headers():
+    return {
+        "Content-Type": "application/json",
+        "ET-Client-Name": ENTUR_CLIENT_NAME
+    }
+
+
+class EnturTripBatcher:
+    """Merges concurrent trip queries into one aliased GraphQL request.
+
+    Queries submitted within ``window`` seconds of each other, up to
+    ``max_batch`` of them, are sent to the journey planner together as
+    ``t0: trip(...) t1: trip(...)`` and the results are handed back to each
+    caller.
+    """
+
+    def __init__(self, window=0.05, max_batch=20):
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = []
+        self._flush_handle = None
+        # The event loop only holds tasks weakly; in-flight sends live here
+        self._tasks = set()
+
+    async def submit(self, trip_selection):
+        """Queue a ``build_trip_query`` selection and wait for its trip result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((trip_selection, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            task.add_done_callback(lambda task: self._settle(batch, task))
+
+    @staticmethod
+    def _settle(batch, task):
+        # A send that was cancelled or failed outside its own error handling
+        # must still resolve every caller's future
+        for _, future in batch:
+            if future.done():
+                continue
+            if task.cancelled():
+                future.cancel()
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+
+    async def _send(self, batch):
+        query = "query {\n" + "\n".join(
+            f"t{i}: {selection}" for i, (selection, _) in enumerate(batch)
+        ) + "\n}"
+        try:
+            response = await policy("entur").acall(
+                asyncio.to_thread, HTTP.post, ENTUR_JOURNEY_PLANNER_URL,
+                headers=_entur_headers(), json={"query": query}
+            )
+            if response.status_code != 200:
+                raise Exception(f"Query failed with status code {response.status_code}: {response.text}")
+            data = response.json().get("data") or {}
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for i, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            trip = data.get(f"t{i}")
+            if trip is None:
+                future.set_exception(Exception(f"No trip returned for batched query t{i}"))
+            else:
+                future.set_result(trip)
+
+
+async def plan_trip_entur(state, config=None):
+    """Plan the trip with Entur's journey planner.
+
+    If the run config carries a ``trip_batcher`` (see ``TripAgent.abatch``), the
+    query is merged with other in-flight queries instead of sent on its own.
+
+    With a transfer matrix (see ``src.transfers``), several trip patterns are
+    requested and the first one whose transfers are walkable for the user's
+    accessibility profile is kept.
+    """
+    departure = datetime.now(timezone.utc)
+    iso_time = departure.isoformat()
+
+    cache_key = trip_cache_key(
+        state.get("origin_lat"), state.get("origin_long"),
+        state.get("destination_lat"), state.get("destination_long"),
+        departure, TRANSPORT_MODES, state.get("handicap"),
+    )
+    cached_trip = TRIP_CACHE.get(cache_key)
+    if cached_trip is not None:
+        # The walking, transfer and UI code edits trip and leg dicts in place
+        return {"trip": copy.deepcopy(cached_trip)}
+
+    transfers = get_transfer_matrix()
+    trip_selection = build_trip_query(
+        state.get("origin_lat"), state.get("origin_long"),
+        state.get("destination_lat"), state.get("destination_long"),
+        iso_time,
+        num_patterns=TRIP_PATTERN_CANDIDATES if transfers is not None else None,
+    )
+
+    batcher = ((config or {}).get("configurable") or {}).get("trip_batcher")
+    if batcher is not None:
+        trip = await batcher.submit(trip_selection)
     else:
-        raise Exception(f"Query failed with status code {response.status_code}: {response.text}")
\ No newline at end of file
+        response = await policy("entur").acall(
+            asyncio.to_thread, HTTP.post, ENTUR_JOURNEY_PLANNER_URL,
+            headers=_entur_headers(), json={"query": f"query {{{trip_selection}}}"}
+        )
+        if response.status_code != 200:
+            raise Exception(f"Query failed with status code {response.status_code}: {response.text}")
+        trip = response.json()["data"]["trip"]
+
+    trip_pattern = trip["tripPatterns"][0]
+    if transfers is not None:
+        trip_pattern = transfers.best_pattern(trip["tripPatterns"], handicap_profile(state.get("handicap")))
+
+    TRIP_CACHE.set(cache_key, copy.deepcopy(trip_pattern))
+    return {"trip": trip_pattern}
@@ -0,0 +1,84 @@
+import asyncio
+import queue
+import threading
+
+_DONE = object()
+
+
+class AgentRuntime:
+    """A long-lived asyncio event loop running in a background thread.
+
+    Work submitted from any thread, such as Streamlit script runs, is scheduled
+    on the same loop. Loop-bound state like pooled connections, the default
+    thread pool and cached clients therefore survives between requests, and
+    requests from several sessions can run concurrently.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="agent-runtime", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Schedule a coroutine on the runtime loop.
+
+        Returns:
+            concurrent.futures.Future: Future resolving to the coroutine's result.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the runtime loop and block until it finishes."""
+        return self.submit(coro).result(timeout)
+
+    def iterate(self, async_iterator, timeout=None):
+        """Drive an async iterator on the runtime loop from the calling thread.
+
+        Items are yielded in the calling thread as soon as they are produced,
+        which lets synchronous code such as a Streamlit script render them.
+
+        Args:
+            async_iterator: The async iterator to consume, e.g. ``TripAgent.astream(...)``.
+            timeout: Maximum seconds to wait for each item.
+        """
+        items = queue.Queue()
+
+        async def pump():
+            try:
+                async for item in async_iterator:
+                    items.put((item, None))
+            except BaseException as e:
+                items.put((_DONE, e))
+                return
+            items.put((_DONE, None))
+
+        self.submit(pump())
+        while True:
+            item, error = items.get(timeout=timeout)
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+
+    def shutdown(self):
+        """Stop the loop and wait for the background thread to exit."""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+
+_RUNTIME = None
+_RUNTIME_LOCK = threading.Lock()
+
+
+def get_runtime():
+    """Return the process-wide AgentRuntime, starting it on first use."""
+    global _RUNTIME
+    with _RUNTIME_LOCK:
+        if _RUNTIME is None:
+            _RUNTIME = AgentRuntime()
+        return _RUNTIME
@@ -0,0 +1,161 @@
+"""Accessible walking times between nearby transit stops.
+
+The matrix is built offline by ``transfer_matrix.py`` from the footway
+network. Each accessibility profile is stored sparsely in CSR form: every
+stop keeps the list of stops it can walk to within the build's time limit.
+Memory therefore grows with the number of nearby pairs instead of with the
+square of the number of stops. The arrays are memory-mapped here, so
+checking a transfer is a dictionary lookup and a binary search in one short
+row, and no routing runs while a trip is planned. Pairs that are not listed
+are not connected within the time limit and take ``inf`` seconds.
+"""
+import functools
+import json
+import os
+from datetime import datetime
+from typing import NamedTuple
+
+import numpy as np
+
+# Directory written by ``transfer_matrix.py build``
+TRANSFER_MATRIX_PATH = os.environ.get("TRANSFER_MATRIX_PATH")
+# Minimum time in seconds a transfer must leave on top of the walk itself
+TRANSFER_SLACK_SECONDS = float(os.environ.get("TRANSFER_SLACK_SECONDS", 60))
+
+STOPS_FILE = "stops.json"
+
+
+def matrix_file(profile, array):
+    return f"transfers_{profile}.{array}.npy"
+
+
+class Neighbours(NamedTuple):
+    """Transfers of one profile in CSR form.
+
+    The stops reachable from stop ``i`` are ``columns[indptr[i]:indptr[i + 1]]``,
+    sorted, with their walking times at the same positions in ``seconds``.
+    """
+
+    indptr: np.ndarray
+    columns: np.ndarray
+    seconds: np.ndarray
+
+
+class TransferMatrix:
+    """Walking seconds between nearby stops for each accessibility profile.
+
+    Attributes:
+        stops: List of (stop_id, lat, lon), the row and column order.
+        index: Stop id → row.
+        neighbours: Profile name → Neighbours.
+    """
+
+    def __init__(self, stops, neighbours):
+        self.stops = stops
+        self.index = {stop[0]: i for i, stop in enumerate(stops)}
+        self.neighbours = neighbours
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, STOPS_FILE), "w") as f:
+            json.dump([list(stop) for stop in self.stops], f)
+        for profile, neighbours in self.neighbours.items():
+            for array in Neighbours._fields:
+                np.save(os.path.join(directory, matrix_file(profile, array)), getattr(neighbours, array))
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Load a saved matrix, memory-mapping the arrays by default."""
+        with open(os.path.join(directory, STOPS_FILE)) as f:
+            stops = [tuple(stop) for stop in json.load(f)]
+        mmap_mode = "r" if mmap else None
+        neighbours = {}
+        for name in os.listdir(directory):
+            if name.startswith("transfers_") and name.endswith(".indptr.npy"):
+                profile = name[len("transfers_"):-len(".indptr.npy")]
+                neighbours[profile] = Neighbours(*(
+                    np.load(os.path.join(directory, matrix_file(profile, array)), mmap_mode=mmap_mode)
+                    for array in Neighbours._fields
+                ))
+        return cls(stops, neighbours)
+
+    def nbytes(self):
+        """Total size of the transfer arrays of every profile."""
+        return sum(array.nbytes for neighbours in self.neighbours.values() for array in neighbours)
+
+    def walk_seconds(self, from_stop, to_stop, profile="default"):
+        """Walking time between two stops.
+
+        Returns:
+            float: Seconds, ``inf`` if they are not connected within the build
+                limit, or None if either stop or the profile is not in the matrix.
+        """
+        if from_stop == to_stop:
+            return 0.0
+        row, column = self.index.get(from_stop), self.index.get(to_stop)
+        neighbours = self.neighbours.get(profile)
+        if row is None or column is None or neighbours is None:
+            return None
+        start, end = neighbours.indptr[row], neighbours.indptr[row + 1]
+        columns = neighbours.columns[start:end]
+        i = int(np.searchsorted(columns, column))
+        if i < len(columns) and columns[i] == column:
+            return float(neighbours.seconds[start + i])
+        return float("inf")
+
+    def usable(self, trip_pattern, profile="default"):
+        """Check that every transfer in an Entur trip pattern can be walked in time.
+
+        A transfer is the walk from where one transit leg ends to where the
+        next one starts, whatever foot legs Entur placed in between. Transfers
+        between stops missing from the matrix are assumed to work.
+        """
+        transit_legs = [leg for leg in trip_pattern["legs"] if leg["mode"].lower() != "foot"]
+        for arriving, departing in zip(transit_legs, transit_legs[1:]):
+            from_stop = ((arriving.get("toPlace") or {}).get("quay") or {}).get("id")
+            to_stop = ((departing.get("fromPlace") or {}).get("quay") or {}).get("id")
+            walk = self.walk_seconds(from_stop, to_stop, profile)
+            if walk is None:
+                continue
+            available = (datetime.fromisoformat(departing["expectedStartTime"])
+                         - datetime.fromisoformat(arriving["expectedEndTime"])).total_seconds()
+            if walk + TRANSFER_SLACK_SECONDS > available:
+                return False
+        return True
+
+    def best_pattern(self, trip_patterns, profile="default"):
+        """Return the first trip pattern whose transfers are all usable.
+
+        The pattern is returned as a copy with ``transfers_usable`` set. When
+        no pattern is usable, the first one is returned with
+        ``transfers_usable`` False. The user still gets Entur's best
+        suggestion, and the UI can warn that its transfers may be too tight.
+        """
+        for trip_pattern in trip_patterns:
+            if self.usable(trip_pattern, profile):
+                return dict(trip_pattern, transfers_usable=True)
+        return dict(trip_patterns[0], transfers_usable=False)
+
+
+@functools.lru_cache(maxsize=None)
+def get_transfer_matrix():
+    """Return the transfer matrix at TRANSFER_MATRIX_PATH, or None if it is not set."""
+    if not TRANSFER_MATRIX_PATH:
+        return None
+    return TransferMatrix.load(TRANSFER_MATRIX_PATH)
+
+
+def handicap_profile(handicap):
+    """Map the ``handicap`` extracted from the question to an accessibility profile.
+
+    The names match ``local_routing.ACCESSIBILITY_PROFILES``. A wheelchair is
+    assumed to be manual unless the user says it is electric.
+    """
+    text = (handicap or "").lower()
+    names = []
+    if "wheelchair" in text or "rullestol" in text:
+        electric = "electric" in text or "elektrisk" in text or "elrullestol" in text
+        names.append("electric_wheelchair" if electric else "manual_wheelchair")
+    if any(word in text for word in ("eyesight", "vision", "visually", "blind", "svaksynt")):
+        names.append("low_vision")
+    return "_".join(names) or "default"
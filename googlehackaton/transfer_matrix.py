@@ -0,0 +1,67 @@
+"""Offline builder for the accessible stop-to-stop transfer matrix.
+
+For every accessibility profile, each stop runs one search bounded by the
+transfer time limit over the footway network (see ``isochrone.stop_times``).
+Only the stops reached within the limit are kept, as one row of a sparse
+CSR matrix of walking seconds (``src.transfers.Neighbours``). The arrays are
+saved next to the stop list and memory-mapped by
+``src.transfers.TransferMatrix`` at run time.
+
+The stop file is a JSON list of ``[stop_id, lat, lon]``. The ids must be the
+Entur quay ids returned in trip patterns, e.g. ``NSR:Quay:7203``.
+
+Usage:
+    python transfer_matrix.py build footway_network/ stops.json transfers/ [max_minutes]
+"""
+import json
+import sys
+import time
+
+import numpy as np
+
+from isochrone import snap_stops, stop_times
+from local_routing import ACCESSIBILITY_PROFILES, FootwayNetwork
+from src.transfers import Neighbours, TransferMatrix
+
+
+def build(network, stops, max_minutes=10, profiles=None):
+    """Compute walking seconds between all stop pairs within ``max_minutes``.
+
+    Args:
+        network: The FootwayNetwork to search.
+        stops: List of (stop_id, lat, lon).
+        max_minutes: Longest transfer walk to record, longer ones are ``inf``.
+        profiles: Profile names to build, all of ACCESSIBILITY_PROFILES by default.
+
+    Returns:
+        TransferMatrix: The matrix for every profile.
+    """
+    neighbours = {}
+    for profile in profiles or ACCESSIBILITY_PROFILES:
+        stop_snap = snap_stops(network, stops, profile)
+        indptr = np.zeros(len(stops) + 1, dtype=np.int64)
+        columns, seconds = [np.empty(0, dtype=np.int32)], [np.empty(0, dtype=np.float32)]
+        for row, (_, lat, lon) in enumerate(stops):
+            times = stop_times(network, lon, lat, max_minutes, stops, profile, stop_snap=stop_snap)
+            reached = np.flatnonzero(np.isfinite(times))
+            columns.append(reached.astype(np.int32))
+            seconds.append(times[reached].astype(np.float32))
+            indptr[row + 1] = indptr[row] + len(reached)
+        neighbours[profile] = Neighbours(indptr, np.concatenate(columns), np.concatenate(seconds))
+    return TransferMatrix(stops, neighbours)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (5, 6) or sys.argv[1] != "build":
+        print(__doc__)
+        sys.exit(1)
+    network = FootwayNetwork.open(sys.argv[2])
+    with open(sys.argv[3]) as f:
+        stops = [tuple(stop) for stop in json.load(f)]
+    max_minutes = float(sys.argv[5]) if len(sys.argv) == 6 else 10
+    start = time.perf_counter()
+    matrix = build(network, stops, max_minutes)
+    matrix.save(sys.argv[4])
+    pairs = sum(len(neighbours.columns) for neighbours in matrix.neighbours.values())
+    print(f"Saved {pairs} transfers between {len(stops)} stops for {len(matrix.neighbours)} profiles "
+          f"({matrix.nbytes() / 1e6:.1f} MB) to {sys.argv[4]} in {time.perf_counter() - start:.1f} s")
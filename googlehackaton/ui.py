@@ -1,19 +1,11 @@
 import streamlit as st
-import asyncio
-import folium
-from streamlit_folium import folium_static
 from datetime import datetime
-import pytz
-from src.agent import TripAgent
-import time
-import requests
-from shapely.geometry import LineString, Point
-from shapely.ops import substring
-from pyproj import Transformer
-from walking_path import get_astar_path, trim_segment_to_point
-
-# One-off transformer, UTM32 → WGS84
-TRANSFORMER_25832_to_4326 = Transformer.from_crs("EPSG:25832", "EPSG:4326", always_xy=True)
+from src.runtime import get_runtime
+
+# folium, the routing modules and the agent (LangGraph and Vertex AI) are
+# imported where they are first used, so the first page renders without
+# waiting for them.
+
 # Set page title and layout
 st.set_page_config(page_title="Trip Planner", layout="wide")
 st.title("Trip Planner")
@@ -25,10 +17,6 @@ if 'chat_history' not in st.session_state:
 if 'trip_data' not in st.session_state:
     st.session_state.trip_data = None
 
-if 'trip_agent' not in st.session_state:
-    st.session_state.trip_agent = TripAgent()
-    st.session_state.app = st.session_state.trip_agent.create_graph()
-
 if 'processing' not in st.session_state:
     st.session_state.processing = False
     
@@ -41,57 +29,97 @@ if 'wheelchair_user' not in st.session_state:
 if 'visually_impaired' not in st.session_state:
     st.session_state.visually_impaired = False
 
+# Create the agent on the first question, not on the first page load
+def get_trip_agent():
+    if 'trip_agent' not in st.session_state:
+        from src.agent import TripAgent
+        # The compiled graph is shared by every session in the process
+        st.session_state.trip_agent = TripAgent()
+    return st.session_state.trip_agent
+
+# Draw a folium map in the map column
+def render_map(trip_map):
+    from streamlit_folium import folium_static
+    with map_placeholder:
+        folium_static(trip_map, width=500, height=500)
+
 # Save user input to session state without causing rerun
 def set_user_input():
     st.session_state.user_query = st.session_state.widget_input
     st.session_state.processing = True
     st.session_state.chat_history.append({"role": "user", "content": st.session_state.widget_input})
 
+# Start and end markers shared by the progress map and the route map
+def add_endpoint_markers(trip_map, trip_data):
+    import folium
+    folium.Marker(
+        [trip_data['origin_lat'], trip_data['origin_long']],
+        popup=trip_data['origin'],
+        icon=folium.Icon(color="green", icon="play", prefix="fa")
+    ).add_to(trip_map)
+    folium.Marker(
+        [trip_data['destination_lat'], trip_data['destination_long']],
+        popup=trip_data['destination'],
+        icon=folium.Icon(color="red", icon="stop", prefix="fa")
+    ).add_to(trip_map)
+
+# Map with only origin and destination, shown while the trip is being planned
+def create_marker_map(state):
+    if 'origin_lat' not in state or 'destination_lat' not in state:
+        return None
+    import folium
+    center_lat = (state['origin_lat'] + state['destination_lat']) / 2
+    center_lon = (state['origin_long'] + state['destination_long']) / 2
+    trip_map = folium.Map(location=[center_lat, center_lon], zoom_start=12)
+    add_endpoint_markers(trip_map, state)
+    return trip_map
+
+# Popup shown for a footway segment, with every image along it
+def segment_popup(gatetype, image_urls):
+    images = "<br>".join(f'<img src="{image_url}" width="250">' for image_url in image_urls)
+    return f"<b>{gatetype}</b><br>{images or '<i>No image</i>'}"
+
 # Function to create map with route
-def create_route_map(trip_data):
+def create_route_map(trip_data, compact=True, detail_zoom=15, profile="default"):
     """
     Draws a Folium map of the whole itinerary.
     • Transit legs use simple straight polylines (your original logic).
     • Foot legs call the A* wheelchair/vision friendly service and plot
       the returned geometry segment-by-segment.
+    • In compact mode, consecutive footway segments with the same gatetype
+      are merged, simplified to what is visible at ``detail_zoom`` and drawn
+      as one GeoJSON layer instead of a PolyLine and popup per segment.
+    • ``profile`` selects which footways the walking legs may use (local
+      routing engine only, see ``walking_path.routing_profile``).
     """
     if not trip_data or 'trip' not in trip_data:
         return None
+    import folium
+    from route_geometry import SegmentArrays, zoom_tolerance
+    from walking_path import get_astar_paths, walking_legs
 
     # --- base map & markers --------------------------------------------------
     center_lat = (trip_data['origin_lat'] + trip_data['destination_lat']) / 2
     center_lon = (trip_data['origin_long'] + trip_data['destination_long']) / 2
     trip_map = folium.Map(location=[center_lat, center_lon], zoom_start=12)
-
-    folium.Marker(
-        [trip_data['origin_lat'], trip_data['origin_long']],
-        popup=trip_data['origin'],
-        icon=folium.Icon(color="green", icon="play", prefix="fa")
-    ).add_to(trip_map)
-    folium.Marker(
-        [trip_data['destination_lat'], trip_data['destination_long']],
-        popup=trip_data['destination'],
-        icon=folium.Icon(color="red", icon="stop", prefix="fa")
-    ).add_to(trip_map)
+    add_endpoint_markers(trip_map, trip_data)
 
     # --- colour palette (transit legs keep original behaviour) ---------------
     colours = {"foot": "blue", "metro": "red", "bus": "green",
                "tram": "orange", "train": "purple"}
 
+    # Route every walking leg in one batch before drawing
+    walking_routes = iter(get_astar_paths(walking_legs(trip_data['trip']), profile))
+    walking_features = []
+    tolerance = zoom_tolerance(detail_zoom, center_lat)
+
     # ------------------------------------------------------------------------
     for leg_idx, leg in enumerate(trip_data['trip']['legs']):
         mode = leg['mode'].lower()
 
         # ---------- 1.  WALKING LEG  ----------------------------------------
         if mode == "foot":
-            # Query A* service
-            route_data = get_astar_path(
-                start_lon=leg['fromPlace']['longitude'],
-                start_lat=leg['fromPlace']['latitude'],
-                end_lon=leg['toPlace']['longitude'],
-                end_lat=leg['toPlace']['latitude']
-            )
-            print(route_data)
+            route_data = next(walking_routes)
 
             if not route_data:
                 # fall back to straight line if service fails
@@ -107,32 +135,26 @@ def create_route_map(trip_data):
                                 ).add_to(trip_map)
                 continue
 
-            # Assemble detailed geometry
-            for seg_no, segment in enumerate(route_data):
-                coords_utm = segment['geom_geojson']['coordinates']
-                line_utm = LineString(coords_utm)
-
-                # Trim first and last segment so they snap exactly to the OTP coords
-                if seg_no == 0:
-                    start_utm_pt = Point(TRANSFORMER_25832_to_4326.transform(
-                        leg['fromPlace']['longitude'], leg['fromPlace']['latitude']))
-                    line_utm = trim_segment_to_point(line_utm, start_utm_pt, trim_start=True)
-                elif seg_no == len(route_data) - 1:
-                    end_utm_pt = Point(TRANSFORMER_25832_to_4326.transform(
-                        leg['toPlace']['longitude'], leg['toPlace']['latitude']))
-                    line_utm = trim_segment_to_point(line_utm, end_utm_pt, trim_start=False)
-
-                # Re-project every vertex: (x,y) → (lat,lon)
-                coords_latlon = [TRANSFORMER_25832_to_4326.transform(x, y)[::-1]
-                                 for x, y in line_utm.coords]
-
-                gatetype   = segment.get('gatetype', 'N/A')
-                image_url  = segment.get('bildefil1')
-                popup_html = (f"<b>{gatetype}</b><br>"
-                              f"{f'<img src=\"{image_url}\" width=\"250\">' if image_url else '<i>No image</i>'}")
+            # Assemble detailed geometry in contiguous arrays, trim the first
+            # and last segment so they snap exactly to the OTP coords, and
+            # re-project every vertex in one call: (x,y) → (lat,lon)
+            segments = SegmentArrays.from_segments(route_data).trim_ends(
+                (leg['fromPlace']['longitude'], leg['fromPlace']['latitude']),
+                (leg['toPlace']['longitude'], leg['toPlace']['latitude']))
+
+            if compact:
+                segments = segments.merge_by_gatetype().simplify(tolerance)
+                popups = [{"popup": segment_popup(gatetype, image_urls)}
+                          for gatetype, image_urls in zip(segments.gatetypes, segments.all_images)]
+                walking_features += segments.to_geojson(popups)["features"]
+                continue
+
+            for seg_no, coords_latlon in enumerate(segments.latlon_segments()):
+                gatetype   = segments.gatetypes[seg_no]
+                popup_html = segment_popup(gatetype, segments.all_images[seg_no])
 
                 folium.PolyLine(
-                    coords_latlon,
+                    coords_latlon.tolist(),
                     color=colours["foot"],
                     weight=4,
                     opacity=0.8,
@@ -164,6 +186,16 @@ def create_route_map(trip_data):
                 popup=f"{mode.capitalize()}: {leg['fromPlace']['name']} → {leg['toPlace']['name']}"
             ).add_to(trip_map)
 
+    # ---------- 3.  ALL WALKING GEOMETRY AS ONE LAYER (compact mode) ---------
+    if walking_features:
+        folium.GeoJson(
+            {"type": "FeatureCollection", "features": walking_features},
+            name="Walking",
+            style_function=lambda feature: {"color": colours["foot"], "weight": 4, "opacity": 0.8},
+            tooltip=folium.GeoJsonTooltip(fields=["gatetype"], labels=False),
+            popup=folium.GeoJsonPopup(fields=["popup"], labels=False, max_width=300),
+        ).add_to(trip_map)
+
     return trip_map
 
 # Function to format trip details as a readable message
@@ -180,6 +212,8 @@ def format_trip_details(trip_data):
     message += f"* From: {trip_data['origin']}\n"
     message += f"* To: {trip_data['destination']}\n"
     message += f"* Total duration: {total_duration_mins} minutes\n\n"
+    if trip.get('transfers_usable') is False:
+        message += "*None of the suggested routes has transfers that can be made in time with your accessibility needs. This is the best route available.*\n\n"
     
     message += "**Route:**\n\n"
     
@@ -214,10 +248,15 @@ with col2:
     
     # Display map if we have trip data
     if st.session_state.trip_data is not None:
-        trip_map = create_route_map(st.session_state.trip_data)
+        from walking_path import accessibility_profile, routing_profile
+        profile = accessibility_profile(wheelchair=st.session_state.wheelchair_user,
+                                        low_vision=st.session_state.visually_impaired)
+        trip_map = create_route_map(st.session_state.trip_data, profile=profile)
         if trip_map:
-            with map_placeholder:
-                folium_static(trip_map, width=500, height=500)
+            render_map(trip_map)
+        if routing_profile(profile) != profile:
+            st.caption("Walking paths use the routing service's wheelchair profile. "
+                       "The accessibility toggles only change them with the local routing engine (ROUTING_ENGINE=local).")
 
 # Display chat history in the left column
 with col1:
@@ -246,9 +285,31 @@ with col1:
     # Input for new messages
     st.chat_input("Hvor vil du reise?", key="widget_input", on_submit=set_user_input, disabled=st.session_state.processing)
 
+# Show each step of the agent as soon as its node finishes
+def show_progress(node_name, state, status):
+    if node_name == "extract_data":
+        status.write(f"From **{state.get('origin')}** to **{state.get('destination')}**")
+    elif node_name == "get_coordinates":
+        status.write("Found the start and end points")
+        marker_map = create_marker_map(state)
+        if marker_map:
+            render_map(marker_map)
+    elif node_name == "plan_trip_entur":
+        status.write("Found a route, drawing the walking paths...")
+        status.markdown(format_trip_details(state))
+
+# All sessions submit their runs to one long-lived background event loop
+def stream_trip(question, status):
+    state = dict(question)
+    runtime = get_runtime()
+    for node_name, delta in runtime.iterate(get_trip_agent().astream(question)):
+        state.update(delta)
+        show_progress(node_name, state, status)
+    return state
+
 # Handle trip planning in the background
 if st.session_state.processing and st.session_state.user_query:
-    with st.spinner("Planning your trip..."):
+    with st.status("Planning your trip...") as status:
         # Create question dictionary with accessibility preferences
         user_query = st.session_state.user_query
         handicap_info = []
@@ -263,10 +324,7 @@ if st.session_state.processing and st.session_state.user_query:
             
         question = {"question": user_query}
         
-        # Run the async function using a loop
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        trip_data = loop.run_until_complete(st.session_state.app.ainvoke(question))
+        trip_data = stream_trip(question, status)
         
         # Store the trip data in session state
         st.session_state.trip_data = trip_data
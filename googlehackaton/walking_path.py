@@ -1,15 +1,64 @@
+import json
+import os
 import requests
-import folium
-from shapely.geometry import LineString, Point
-from shapely.ops import substring
-from pyproj import Transformer
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src.cache import TTLCache
+from agent_common.client_policy import policy
 
 SUPABASE_URL = 'https://mdokcoeymtjwssaldfpw.supabase.co'
 SUPABASE_KEY = 'KEY'
 
+# "remote" routes through the Supabase RPC, "local" through an in-process
+# FootwayNetwork. The remote engine falls back to the local one when the
+# service fails and a network is configured.
+ROUTING_ENGINE = os.environ.get("ROUTING_ENGINE", "remote")
+# The Supabase RPC routes for wheelchairs only, so remote routes are
+# computed, cached and served under this profile whichever one was asked for
+REMOTE_PROFILE = "manual_wheelchair"
+# GeoJSON/GeoPackage export, or a directory written by FootwayNetwork.save
+FOOTWAY_NETWORK_PATH = os.environ.get("FOOTWAY_NETWORK_PATH")
+
+# Pooled connections to Supabase, shared by serial and batched calls
+HTTP = requests.Session()
+
+# Routes are cached by endpoints rounded to this many decimals (5 ≈ 1 m) and
+# the accessibility profile. Set ROUTE_CACHE_PATH to share them on disk
+# across sessions and processes.
+ROUTE_CACHE_DECIMALS = int(os.environ.get("ROUTE_CACHE_DECIMALS", 5))
+ROUTE_CACHE = TTLCache(
+    maxsize=int(os.environ.get("ROUTE_CACHE_SIZE", 1024)),
+    path=os.environ.get("ROUTE_CACHE_PATH"),
+)
+
+_local_network = None
+_local_network_lock = threading.Lock()
+
+
+def get_local_network():
+    """Return the in-process footway network, loading it on first use.
+
+    Returns None if FOOTWAY_NETWORK_PATH is not set.
+    """
+    global _local_network
+    if _local_network is not None or not FOOTWAY_NETWORK_PATH:
+        return _local_network
+    # Sessions route from several threads; load the network only once
+    with _local_network_lock:
+        if _local_network is None:
+            from local_routing import FootwayNetwork
+            from routing_index import LandmarkIndex
+            network = FootwayNetwork.open(FOOTWAY_NETWORK_PATH)
+            if os.path.isdir(FOOTWAY_NETWORK_PATH):
+                network.landmarks = LandmarkIndex.load(FOOTWAY_NETWORK_PATH)
+            # Published only once complete, so no thread sees it without landmarks
+            _local_network = network
+    return _local_network
+
 
 def trim_segment_to_point(line, point, trim_start=True):
     """Trim a LineString from or to a given point"""
+    from shapely.ops import substring
     proj = line.project(point, normalized=True)
     if trim_start:
         return substring(line, proj, 1.0, normalized=True)
@@ -17,9 +66,62 @@ def trim_segment_to_point(line, point, trim_start=True):
         return substring(line, 0.0, proj, normalized=True)
     
 
+def accessibility_profile(wheelchair=False, electric=False, low_vision=False):
+    """Map the user's accessibility needs to a key of ACCESSIBILITY_PROFILES.
+
+    Args:
+        wheelchair: The user travels in a wheelchair.
+        electric: The wheelchair is electric rather than manual.
+        low_vision: The user is visually impaired.
+    """
+    names = []
+    if wheelchair:
+        names.append("electric_wheelchair" if electric else "manual_wheelchair")
+    if low_vision:
+        names.append("low_vision")
+    return "_".join(names) or "default"
+
+
+def routing_profile(profile="default", engine=None):
+    """Return the profile routes are actually computed with for ``engine``.
+
+    The local engine honours every profile. The remote engine always routes
+    with REMOTE_PROFILE.
+    """
+    return profile if (engine or ROUTING_ENGINE) == "local" else REMOTE_PROFILE
+
+
+def route_cache_key(leg, profile="default"):
+    """Build the ROUTE_CACHE key for a (start_lon, start_lat, end_lon, end_lat) leg."""
+    return (
+        [round(value, ROUTE_CACHE_DECIMALS) for value in leg],
+        profile,
+    )
+
+
 def get_astar_path(start_lon, start_lat, end_lon, end_lat,
-                   elrull_ok=["Tilgjengelig", "Delvis tilgjengelig"],
-                   syn_ok=["Tilgjengelig", "Delvis tilgjengelig"]):
+                   profile="default",
+                   engine=None):
+    """Route one walking leg, returning cached segments when available."""
+    profile = routing_profile(profile, engine)
+    key = route_cache_key((start_lon, start_lat, end_lon, end_lat), profile)
+    route = ROUTE_CACHE.get(key)
+    if route is None:
+        route = _fetch_astar_path(start_lon, start_lat, end_lon, end_lat, profile, engine)
+        if route:
+            ROUTE_CACHE.set(key, route)
+    return route
+
+
+def _fetch_astar_path(start_lon, start_lat, end_lon, end_lat, profile="default", engine=None):
+    engine = engine or ROUTING_ENGINE
+    if engine == "local":
+        network = get_local_network()
+        if network is None:
+            print("Error: ROUTING_ENGINE is local but FOOTWAY_NETWORK_PATH is not set")
+            return []
+        return network.route(start_lon, start_lat, end_lon, end_lat, profile)
+
     url = f"{SUPABASE_URL}/rest/v1/rpc/find_astar_path_rullestol"
 
     headers = {
@@ -37,11 +139,114 @@ def get_astar_path(start_lon, start_lat, end_lon, end_lat,
     }
     print("Payload:", payload)
 
-    response = requests.post(url, headers=headers, json=payload)
-    print("Response:", response.status_code, response.text)
+    try:
+        response = policy("supabase").call(HTTP.post, url, headers=headers, json=payload)
+        print("Response:", response.status_code, response.text)
+        if response.status_code == 200:
+            return response.json()
+        print("Error:", response.status_code, response.text)
+    except requests.RequestException as e:
+        print("Error:", e)
+
+    if get_local_network() is not None:
+        print("Falling back to the local routing engine")
+        return get_local_network().route(start_lon, start_lat, end_lon, end_lat, profile)
+    return []
+
+
+def walking_legs(trip):
+    """Return the (start_lon, start_lat, end_lon, end_lat) of every foot leg in a trip pattern."""
+    return [
+        (leg['fromPlace']['longitude'], leg['fromPlace']['latitude'],
+         leg['toPlace']['longitude'], leg['toPlace']['latitude'])
+        for leg in trip['legs'] if leg['mode'].lower() == "foot"
+    ]
+
+
+def get_astar_paths(legs, profile="default", engine=None, max_workers=8):
+    """Route many walking legs at once, e.g. every foot leg of one or more trips.
+
+    The local engine snaps all endpoints in a single spatial index lookup and
+    then solves the legs in-process. The remote engine has no batch RPC, so
+    the legs are sent concurrently over the pooled session.
+
+    Locally, the profile selects precomputed edge weights, so every profile
+    is served by the same loaded graph. The remote RPC has a single
+    wheelchair profile, so remote routes (and their local fallback) use
+    REMOTE_PROFILE and are cached once for every requested profile.
+
+    Args:
+        legs: Iterable of (start_lon, start_lat, end_lon, end_lat) tuples.
+        profile: Key of ``local_routing.ACCESSIBILITY_PROFILES``, see
+            ``accessibility_profile``. Only honoured by the local engine.
+        engine: "local" or "remote", defaults to ROUTING_ENGINE.
+        max_workers: Maximum concurrent RPC calls for the remote engine.
 
-    if response.status_code == 200:
-        return response.json()
+    Returns:
+        list: One segment list per leg, in input order (empty where routing failed).
+    """
+    legs = list(legs)
+    if not legs:
+        return []
+    engine = engine or ROUTING_ENGINE
+    profile = routing_profile(profile, engine)
+    # Legs that round to the same cache key are routed once
+    keys = [json.dumps(route_cache_key(leg, profile)) for leg in legs]
+    by_key = {}
+    for key, leg in zip(keys, legs):
+        if key not in by_key:
+            by_key[key] = (leg, ROUTE_CACHE.get(json.loads(key)))
+    missing = [key for key, (_, route) in by_key.items() if route is None]
+    unique_legs = [by_key[key][0] for key in missing]
+    if not unique_legs:
+        return [by_key[key][1] for key in keys]
+
+    network = get_local_network() if engine == "local" else None
+    if engine == "local" and network is None:
+        print("Error: ROUTING_ENGINE is local but FOOTWAY_NETWORK_PATH is not set")
+        return [[] for _ in legs]
+
+    if network is not None:
+        lons = [lon for leg in unique_legs for lon in (leg[0], leg[2])]
+        lats = [lat for leg in unique_legs for lat in (leg[1], leg[3])]
+        snap = network.snap_lonlat(lons, lats, profile)
+        for i, edge in enumerate(snap["edge"].tolist()):
+            if edge < 0:
+                # route_snapped returns no route for this leg
+                print(f"Error: could not snap ({lons[i]}, {lats[i]}) onto the footway network")
+        weights = network.profile_weights(profile)
+        routes = [
+            network.route_snapped(snap["edge"][2 * i], snap["fraction"][2 * i],
+                                  snap["edge"][2 * i + 1], snap["fraction"][2 * i + 1], weights)
+            for i in range(len(unique_legs))
+        ]
     else:
-        print("Error:", response.status_code, response.text)
-        return []
\ No newline at end of file
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(unique_legs))) as pool:
+            routes = list(pool.map(lambda leg: _fetch_astar_path(*leg, profile, engine), unique_legs))
+
+    for key, leg, route in zip(missing, unique_legs, routes):
+        by_key[key] = (leg, route)
+        if route:
+            ROUTE_CACHE.set(json.loads(key), route)
+    return [by_key[key][1] for key in keys]
+
+
+def get_isochrone(lon, lat, minutes, profile="default", stops=None):
+    """Reachability from one point with a single search over the local network.
+
+    Args:
+        lon, lat: Origin in WGS84.
+        minutes: Time budget.
+        profile: Key of ``local_routing.ACCESSIBILITY_PROFILES``.
+        stops: Optional (stop_id, lat, lon) transit stops to time.
+
+    Returns:
+        isochrone.Isochrone, or None if no local network is configured (the
+            remote RPC only routes point to point).
+    """
+    network = get_local_network()
+    if network is None:
+        print("Error: isochrones need FOOTWAY_NETWORK_PATH to be set")
+        return None
+    from isochrone import isochrone
+    return isochrone(network, lon, lat, minutes, profile, stops=stops)